@@ -0,0 +1,37 @@
+"""add export_jobs
+
+Revision ID: 0a9d4e7b3f21
+Revises: f2c7d5e8a940
+Create Date: 2026-10-19 16:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0a9d4e7b3f21'
+down_revision = 'f2c7d5e8a940'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "export_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("report", sa.String(32), nullable=False),
+        sa.Column("params", sa.Text(), nullable=False),
+        sa.Column("params_hash", sa.String(40), nullable=False),
+        sa.Column("status", sa.String(16), server_default="queued", nullable=False),
+        sa.Column("file_path", sa.String(255)),
+        sa.Column("filename", sa.String(255)),
+        sa.Column("size", sa.Integer()),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+    )
+    op.create_index("ix_export_jobs_params_hash", "export_jobs", ["params_hash"])
+
+def downgrade():
+    op.drop_index("ix_export_jobs_params_hash", table_name="export_jobs")
+    op.drop_table("export_jobs")
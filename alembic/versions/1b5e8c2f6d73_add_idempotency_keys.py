@@ -0,0 +1,35 @@
+"""add idempotency_keys
+
+Revision ID: 1b5e8c2f6d73
+Revises: 0a9d4e7b3f21
+Create Date: 2026-10-19 17:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '1b5e8c2f6d73'
+down_revision = '0a9d4e7b3f21'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("key", sa.String(128), nullable=False),
+        sa.Column("endpoint", sa.String(128), nullable=False),
+        sa.Column("request_hash", sa.String(64), nullable=False),
+        sa.Column("response_code", sa.Integer()),
+        sa.Column("response_body", sa.Text()),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ux_idempotency_keys_key_endpoint", "idempotency_keys", ["key", "endpoint"], unique=True)
+    op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+def downgrade():
+    op.drop_index("ix_idempotency_keys_expires_at", table_name="idempotency_keys")
+    op.drop_index("ux_idempotency_keys_key_endpoint", table_name="idempotency_keys")
+    op.drop_table("idempotency_keys")
@@ -0,0 +1,20 @@
+"""index payments.reference for import duplicate checks
+
+Revision ID: 2c6f9a1d4e85
+Revises: 1b5e8c2f6d73
+Create Date: 2026-10-19 18:00:00.000000
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2c6f9a1d4e85'
+down_revision = '1b5e8c2f6d73'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_payments_reference", "payments", ["reference"])
+
+def downgrade():
+    op.drop_index("ix_payments_reference", table_name="payments")
@@ -1,5 +1,11 @@
 from alembic import op
 
+# revision identifiers, used by Alembic.
+revision = "33c507d88e4d"
+down_revision = "871653bfd1ed"
+branch_labels = None
+depends_on = None
+
 # no autogenerate here; do it defensively for Postgres
 def upgrade() -> None:
     op.execute("ALTER TABLE payments ADD COLUMN IF NOT EXISTS reference VARCHAR(120)")
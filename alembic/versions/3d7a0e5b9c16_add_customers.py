@@ -0,0 +1,105 @@
+"""add customers and orders.customer_id, backfilled from order phones
+
+Revision ID: 3d7a0e5b9c16
+Revises: 2c6f9a1d4e85
+Create Date: 2026-10-19 19:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3d7a0e5b9c16'
+down_revision = '2c6f9a1d4e85'
+branch_labels = None
+depends_on = None
+
+BATCH = 2000
+DEFAULT_CC = "60"
+
+def _normalize(raw):
+    # Frozen copy of app.utils.normalize_phone as of this revision
+    if not raw:
+        return None
+    s = str(raw).strip()
+    digits = "".join(ch for ch in s if ch.isdigit())
+    if s.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = DEFAULT_CC + digits[1:]
+    elif digits.startswith(DEFAULT_CC) and len(digits) >= 10:
+        pass
+    else:
+        digits = DEFAULT_CC + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+def upgrade():
+    op.create_table(
+        "customers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("phone_e164", sa.String(20), nullable=False),
+        sa.Column("name", sa.String(200)),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+    )
+    op.create_index("ix_customers_phone_e164", "customers", ["phone_e164"], unique=True)
+    with op.batch_alter_table("orders") as batch:
+        batch.add_column(sa.Column("customer_id", sa.Integer(), nullable=True))
+        batch.create_foreign_key("fk_orders_customer_id", "customers", ["customer_id"], ["id"])
+    op.create_index("ix_orders_customer_id", "orders", ["customer_id"])
+
+    # Backfill root orders in id-keyset batches: one read, one IN lookup, one bulk insert, one executemany per batch
+    bind = op.get_bind()
+    orders = sa.table("orders", sa.column("id"), sa.column("phone"), sa.column("customer_name"),
+                      sa.column("parent_order_id"), sa.column("customer_id"))
+    customers = sa.table("customers", sa.column("id"), sa.column("phone_e164"), sa.column("name"))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(orders.c.id, orders.c.phone, orders.c.customer_name)
+            .where(orders.c.id > last_id, orders.c.parent_order_id.is_(None), orders.c.phone.is_not(None))
+            .order_by(orders.c.id).limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        by_phone = {}
+        for r in rows:
+            e164 = _normalize(r.phone)
+            if e164:
+                by_phone.setdefault(e164, []).append(r)
+        if not by_phone:
+            continue
+        known = dict(bind.execute(
+            sa.select(customers.c.phone_e164, customers.c.id).where(customers.c.phone_e164.in_(list(by_phone)))
+        ).all())
+        new = [{"phone_e164": e, "name": rs[-1].customer_name} for e, rs in by_phone.items() if e not in known]
+        if new:
+            bind.execute(customers.insert(), new)
+            known.update(bind.execute(
+                sa.select(customers.c.phone_e164, customers.c.id).where(customers.c.phone_e164.in_([n["phone_e164"] for n in new]))
+            ).all())
+        bind.execute(
+            orders.update().where(orders.c.id == sa.bindparam("oid")).values(customer_id=sa.bindparam("cid")),
+            [{"oid": r.id, "cid": known[e]} for e, rs in by_phone.items() for r in rs],
+        )
+
+    # Adjustment children belong to their parent's customer
+    parent = orders.alias("parent")
+    bind.execute(
+        orders.update()
+        .where(orders.c.parent_order_id.is_not(None), orders.c.customer_id.is_(None))
+        .values(customer_id=sa.select(parent.c.customer_id).where(parent.c.id == orders.c.parent_order_id).scalar_subquery())
+    )
+
+def downgrade():
+    op.drop_index("ix_orders_customer_id", table_name="orders")
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_constraint("fk_orders_customer_id", type_="foreignkey")
+        batch.drop_column("customer_id")
+    op.drop_index("ix_customers_phone_e164", table_name="customers")
+    op.drop_table("customers")
@@ -0,0 +1,44 @@
+"""add daily_sales, daily_collections and daily_book rollups
+
+Revision ID: 4e8b1f6c2a37
+Revises: 3d7a0e5b9c16
+Create Date: 2026-10-19 20:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '4e8b1f6c2a37'
+down_revision = '3d7a0e5b9c16'
+branch_labels = None
+depends_on = None
+
+# Backfill with `python scripts/rebuild_rollups.py` after upgrading (it recomputes from orders and payments)
+
+def upgrade():
+    op.create_table(
+        'daily_sales',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('order_type', sa.String(length=32), primary_key=True),
+        sa.Column('orders', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Numeric(14, 2), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'daily_collections',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('method', sa.String(length=32), primary_key=True),
+        sa.Column('payments', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('amount', sa.Numeric(14, 2), nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'daily_book',
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('active_rentals_delta', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('instalment_book_delta', sa.Numeric(14, 2), nullable=False, server_default='0'),
+    )
+
+def downgrade():
+    op.drop_table('daily_book')
+    op.drop_table('daily_collections')
+    op.drop_table('daily_sales')
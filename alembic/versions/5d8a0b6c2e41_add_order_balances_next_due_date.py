@@ -0,0 +1,24 @@
+"""add order_balances.next_due_date
+
+Revision ID: 5d8a0b6c2e41
+Revises: 9c1e4f2a7b3d
+Create Date: 2026-10-19 10:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5d8a0b6c2e41'
+down_revision = '9c1e4f2a7b3d'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("order_balances", sa.Column("next_due_date", sa.Date(), nullable=True))
+    op.create_index("ix_order_balances_next_due_date", "order_balances", ["next_due_date"])
+    # Due dates follow the no-prorate month rule in Python; populate with `python scripts/rebuild_ledger.py`
+
+def downgrade():
+    op.drop_index("ix_order_balances_next_due_date", table_name="order_balances")
+    op.drop_column("order_balances", "next_due_date")
@@ -0,0 +1,39 @@
+"""add order_balances ledger
+
+Revision ID: 9c1e4f2a7b3d
+Revises: 33c507d88e4d
+Create Date: 2026-10-19 09:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9c1e4f2a7b3d'
+down_revision = '33c507d88e4d'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "order_balances",
+        sa.Column("order_id", sa.Integer(), sa.ForeignKey("orders.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("payments_total", sa.Numeric(12, 2), server_default="0", nullable=False),
+        sa.Column("adjustments_total", sa.Numeric(12, 2), server_default="0", nullable=False),
+        sa.Column("rental_start_date", sa.DateTime()),
+        sa.Column("instalment_start_date", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+    )
+    # Backfill from a full recomputation; `python scripts/rebuild_ledger.py --verify` re-checks it later
+    op.execute("""
+        INSERT INTO order_balances (order_id, payments_total, adjustments_total, rental_start_date, instalment_start_date)
+        SELECT o.id,
+               COALESCE((SELECT SUM(p.amount) FROM payments p WHERE p.order_id = o.id AND COALESCE(p.voided, FALSE) = FALSE), 0),
+               COALESCE((SELECT SUM(c.total) FROM orders c WHERE c.parent_order_id = o.id), 0),
+               o.rental_start_date,
+               o.instalment_start_date
+        FROM orders o
+    """)
+
+def downgrade():
+    op.drop_table("order_balances")
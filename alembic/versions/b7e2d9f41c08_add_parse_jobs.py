@@ -0,0 +1,37 @@
+"""add parse_jobs queue
+
+Revision ID: b7e2d9f41c08
+Revises: 5d8a0b6c2e41
+Create Date: 2026-10-19 11:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d9f41c08'
+down_revision = '5d8a0b6c2e41'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "parse_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("sha256", sa.String(64), nullable=False),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(16), server_default="queued", nullable=False),
+        sa.Column("attempts", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("error", sa.Text()),
+        sa.Column("message_id", sa.Integer(), sa.ForeignKey("messages.id", ondelete="SET NULL")),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+    )
+    op.create_index("ix_parse_jobs_sha256", "parse_jobs", ["sha256"])
+    op.create_index("ix_parse_jobs_status", "parse_jobs", ["status"])
+
+def downgrade():
+    op.drop_index("ix_parse_jobs_status", table_name="parse_jobs")
+    op.drop_index("ix_parse_jobs_sha256", table_name="parse_jobs")
+    op.drop_table("parse_jobs")
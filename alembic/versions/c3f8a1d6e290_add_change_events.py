@@ -0,0 +1,31 @@
+"""add change_events feed
+
+Revision ID: c3f8a1d6e290
+Revises: b7e2d9f41c08
+Create Date: 2026-10-19 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a1d6e290'
+down_revision = 'b7e2d9f41c08'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "change_events",
+        sa.Column("seq", sa.Integer(), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("CURRENT_TIMESTAMP"), nullable=False),
+        sa.Column("action", sa.String(32), nullable=False),
+        sa.Column("order_id", sa.Integer()),
+        sa.Column("payment_id", sa.Integer()),
+        sa.Column("data", sa.Text()),
+    )
+    op.create_index("ix_change_events_order_id", "change_events", ["order_id"])
+
+def downgrade():
+    op.drop_index("ix_change_events_order_id", table_name="change_events")
+    op.drop_table("change_events")
@@ -0,0 +1,21 @@
+"""add orders.version row version
+
+Revision ID: d41b7c9e8a15
+Revises: c3f8a1d6e290
+Create Date: 2026-10-19 13:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7c9e8a15'
+down_revision = 'c3f8a1d6e290'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("orders", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+def downgrade():
+    op.drop_column("orders", "version")
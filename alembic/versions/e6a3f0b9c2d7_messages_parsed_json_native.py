@@ -0,0 +1,38 @@
+"""messages.parsed_json as native JSON with expression indexes on extracted fields
+
+Revision ID: e6a3f0b9c2d7
+Revises: d41b7c9e8a15
+Create Date: 2026-10-19 14:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e6a3f0b9c2d7'
+down_revision = 'd41b7c9e8a15'
+branch_labels = None
+depends_on = None
+
+# Must match app.models.parsed_field() as compiled per dialect, or the planner will not use the index
+FIELDS = ("phone", "order_code")
+
+def _expr(dialect: str, key: str) -> str:
+    if dialect == "postgresql":
+        return f"(CAST(parsed_json ->> '{key}' AS VARCHAR))"
+    return f"JSON_EXTRACT(parsed_json, '$.\"{key}\"')"
+
+def upgrade():
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        cols = {c["name"]: c for c in sa.inspect(bind).get_columns("messages")}
+        if "JSONB" not in str(cols["parsed_json"]["type"]).upper():
+            # Databases created from the ORM (create_all) got TEXT here
+            op.execute("ALTER TABLE messages ALTER COLUMN parsed_json TYPE JSONB USING parsed_json::jsonb")
+    for key in FIELDS:
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_messages_parsed_{key} ON messages ({_expr(dialect, key)})")
+
+def downgrade():
+    for key in FIELDS:
+        op.execute(f"DROP INDEX IF EXISTS ix_messages_parsed_{key}")
@@ -0,0 +1,30 @@
+"""message retention columns (compressed payload, archive location)
+
+Revision ID: f2c7d5e8a940
+Revises: e6a3f0b9c2d7
+Create Date: 2026-10-19 15:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7d5e8a940'
+down_revision = 'e6a3f0b9c2d7'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table("messages") as batch:
+        batch.add_column(sa.Column("payload_z", sa.LargeBinary(), nullable=True))
+        batch.add_column(sa.Column("compacted_at", sa.DateTime(), nullable=True))
+        batch.add_column(sa.Column("archived_at", sa.DateTime(), nullable=True))
+        batch.add_column(sa.Column("archive_path", sa.String(255), nullable=True))
+        batch.alter_column("text", existing_type=sa.Text(), nullable=True)
+
+def downgrade():
+    with op.batch_alter_table("messages") as batch:
+        batch.drop_column("archive_path")
+        batch.drop_column("archived_at")
+        batch.drop_column("compacted_at")
+        batch.drop_column("payload_z")
@@ -0,0 +1,137 @@
+"""Async variants of the read-heavy routes, registered ahead of the sync ones when ASYNC_DB=1.
+
+Queries run on the async engine so a request waiting on the database no longer holds a threadpool
+thread; CPU-bound work (PDF rendering, XLSX writing) is pushed to the threadpool explicitly.
+"""
+from typing import Callable, List, Optional
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+import hashlib
+
+from .config import get_settings
+from .db import get_async_read_db
+from .cache import cache
+from .models import Order, Payment, OrderStatus, OrderType
+from .schemas import OrderOut
+from .pdf import invoice_pdf, receipt_pdf, instalment_agreement_pdf, TEMPLATE_VERSION as PDF_TEMPLATE
+from .utils import to_xlsx_bytes, XLSX_MEDIA_TYPE
+from . import ledger, changes, reports
+from .etags import make_etag, not_modified
+
+settings = get_settings()
+
+def _render_and_store(etag: str, render: Callable, *args) -> bytes:
+    pdf = render(*args)
+    cache.set(f"pdf:{etag}", pdf, settings.pdf_cache_ttl_seconds)
+    return pdf
+
+def build_router(order_to_out: Callable, order_to_compact: Callable) -> APIRouter:
+    router = APIRouter()
+
+    async def _order_version(db: AsyncSession, order_id: int) -> int:
+        version = (await db.execute(select(Order.version).where(Order.id == order_id))).scalar_one_or_none()
+        if version is None:
+            raise HTTPException(404, "Order not found")
+        return version
+
+    async def _load_order(db: AsyncSession, order_id: int) -> Order:
+        o = (await db.execute(
+            select(Order).options(selectinload(Order.items), selectinload(Order.payments)).where(Order.id == order_id)
+        )).scalar_one_or_none()
+        if not o:
+            raise HTTPException(404, "Order not found")
+        return o
+
+    @router.get("/orders", response_model=List[OrderOut])
+    async def list_orders_async(
+        request: Request,
+        response: Response,
+        status: Optional[str] = None,
+        q: Optional[str] = None,
+        view: str = Query("full", pattern="^(full|compact)$"),
+        include: Optional[str] = None,
+        db: AsyncSession = Depends(get_async_read_db),
+    ):
+        include_set = {x.strip() for x in (include or "").split(",")} & {"items", "payments"}
+        key = f"{status}|{q}|{view}|{','.join(sorted(include_set))}"
+        etag = make_etag("l", await db.run_sync(changes.latest_seq), hashlib.sha1(key.encode()).hexdigest()[:12])
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        response.headers["ETag"] = etag
+
+        loads = {"items", "payments"} if view == "full" else include_set
+        stmt = select(Order).options(*(selectinload(getattr(Order, rel)) for rel in sorted(loads)))
+        if status:
+            try:
+                stmt = stmt.where(Order.status == OrderStatus(status))
+            except Exception:
+                pass
+        if q:
+            like = f"%{q}%"
+            stmt = stmt.where((Order.code.ilike(like)) | (Order.customer_name.ilike(like)) | (Order.phone.ilike(like)))
+        rows = (await db.execute(stmt.order_by(Order.id.desc()).limit(2000))).scalars().all()
+        bals = await db.run_sync(lambda s: ledger.get_balances(s, rows))
+        outstanding = ledger.outstanding_many(rows, bals, datetime.now(timezone.utc))
+        if view == "compact":
+            return ORJSONResponse([order_to_compact(o, out, include_set) for o, out in zip(rows, outstanding)], headers={"ETag": etag})
+        return [order_to_out(o, None, out) for o, out in zip(rows, outstanding)]
+
+    @router.get("/orders/{order_id}/invoice.pdf")
+    async def invoice_async(order_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+        etag = make_etag("inv", PDF_TEMPLATE, order_id, await _order_version(db, order_id))
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        pdf = await run_in_threadpool(cache.get, f"pdf:{etag}")
+        if pdf is None:
+            o = await _load_order(db, order_id)
+            pdf = await run_in_threadpool(_render_and_store, etag, invoice_pdf, o)
+        return Response(content=pdf, media_type="application/pdf", headers={"ETag": etag})
+
+    @router.get("/payments/{payment_id}/receipt.pdf")
+    async def receipt_async(payment_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+        row = (await db.execute(
+            select(Payment.order_id, Order.version).join(Order, Order.id == Payment.order_id).where(Payment.id == payment_id)
+        )).first()
+        if row is None:
+            raise HTTPException(404, "Payment not found")
+        etag = make_etag("rcpt", PDF_TEMPLATE, payment_id, row.version)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        pdf = await run_in_threadpool(cache.get, f"pdf:{etag}")
+        if pdf is None:
+            p = await db.get(Payment, payment_id)
+            o = await db.get(Order, p.order_id)
+            pdf = await run_in_threadpool(_render_and_store, etag, receipt_pdf, o, p)
+        return Response(content=pdf, media_type="application/pdf", headers={"ETag": etag})
+
+    @router.get("/orders/{order_id}/instalment-agreement.pdf")
+    async def instalment_agreement_async(order_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+        etag = make_etag("agr", PDF_TEMPLATE, order_id, await _order_version(db, order_id))
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        o = await _load_order(db, order_id)
+        if o.order_type != OrderType.INSTALMENT:
+            raise HTTPException(400, "Not an instalment order")
+        pdf = await run_in_threadpool(cache.get, f"pdf:{etag}")
+        if pdf is None:
+            pdf = await run_in_threadpool(_render_and_store, etag, instalment_agreement_pdf, o)
+        return Response(content=pdf, media_type="application/pdf", headers={"ETag": etag})
+
+    @router.get("/export/cash.xlsx")
+    async def export_cash_async(start: str, end: str, db: AsyncSession = Depends(get_async_read_db)):
+        start_dt = datetime.fromisoformat(start)
+        end_dt = datetime.fromisoformat(end)
+        df = await db.run_sync(lambda s: reports.cash_frame(s, start_dt, end_dt))
+        content = await run_in_threadpool(to_xlsx_bytes, df, "cash")
+        return Response(content=content, media_type=XLSX_MEDIA_TYPE)
+
+    return router
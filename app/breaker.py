@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Optional
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: after `threshold` failures in a row it opens and rejects calls for `reset_seconds`,
+    then lets a single probe through (half-open). The probe's outcome closes it again or restarts the open period."""
+
+    def __init__(self, name: str, threshold: int, reset_seconds: float):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+        self.successes = 0
+        self.total_failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = "half_open"
+        return self._state
+
+    def is_open(self) -> bool:
+        return self.state == "open"
+
+    def admits(self) -> bool:
+        """Whether before_call would let a call through now: closed, or half-open with no probe in flight yet."""
+        with self._lock:
+            state = self._current_state()
+            return state == "closed" or (state == "half_open" and not self._probing)
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 when calls are allowed now)."""
+        with self._lock:
+            if self._current_state() != "open":
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} circuit open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self._failures = 0
+            self._probing = False
+            self._state = "closed"
+
+    def record_failure(self, error: BaseException) -> None:
+        with self._lock:
+            self.total_failures += 1
+            self._failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:300]
+            if self._probing or (self._state == "closed" and self._failures >= self.threshold):
+                self._state, self._opened_at = "open", time.monotonic()
+                self.trips += 1
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._failures,
+                "threshold": self.threshold,
+                "reset_seconds": self.reset_seconds,
+                "retry_after": round(max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at)), 3) if state == "open" else 0.0,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "successes": self.successes,
+                "failures": self.total_failures,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,146 @@
+"""Byte cache shared by all workers on a host (gunicorn forks several), selected by CACHE_BACKEND:
+
+  sqlite  (default) one WAL-mode SQLite file under CACHE_DIR; safe across processes
+  disk    one file per key under CACHE_DIR, written atomically
+  memory  per-process dict; only for single-worker/dev runs
+  none    caching disabled
+
+Values are bytes with an optional TTL. Keys should carry their own version (e.g. an ETag) so entries never go stale.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from .config import get_settings
+
+settings = get_settings()
+
+class NullCache:
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        pass
+
+    def get_or_set(self, key: str, fn: Callable[[], bytes], ttl: Optional[float] = None) -> bytes:
+        value = self.get(key)
+        if value is None:
+            value = fn()
+            self.set(key, value, ttl)
+        return value
+
+class MemoryCache(NullCache):
+    def __init__(self, max_entries: int = 512):
+        self._lock = threading.Lock()
+        self._data: OrderedDict = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            value, expires = hit
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+class DiskCache(NullCache):
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        h = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, h[:2], h)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires = float(f.readline() or 0)
+                value = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        if expires and expires < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(f"{time.time() + ttl if ttl else 0}\n".encode())
+            f.write(value)
+        os.replace(tmp, path)  # atomic: readers in other workers never see a partial file
+
+class SqliteCache(NullCache):
+    PRUNE_EVERY = 200
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread and per process: connections must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._conn().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.OperationalError:
+            return None  # locked/busy: treat as a miss rather than failing the request
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        try:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                         (key, value, time.time() + ttl if ttl else None))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        except sqlite3.OperationalError:
+            pass
+
+def build_cache(backend: str, cache_dir: str) -> NullCache:
+    backend = (backend or "none").lower()
+    if backend == "sqlite":
+        return SqliteCache(os.path.join(cache_dir, "cache.sqlite3"))
+    if backend == "disk":
+        return DiskCache(os.path.join(cache_dir, "blobs"))
+    if backend == "memory":
+        return MemoryCache()
+    return NullCache()
+
+cache = build_cache(settings.cache_backend, settings.cache_dir)
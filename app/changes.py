@@ -0,0 +1,152 @@
+import asyncio
+import json
+import select as _select
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import event, select, text, func, insert, update
+from sqlalchemy.orm import Session
+
+from .models import ChangeEvent, Order
+
+CHANNEL = "orderops_changes"
+# Postgres sequences are not commit-ordered: hold back events after a gap this long for the earlier tx to commit
+GAP_GRACE = timedelta(seconds=2)
+
+class Broadcaster:
+    """Wakes SSE streams in this process. Fed by local commits and, on Postgres, by LISTEN/NOTIFY."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: set = set()
+
+    def subscribe(self) -> asyncio.Event:
+        ev = asyncio.Event()
+        with self._lock:
+            # notify() runs on threadpool/listener threads, so remember the loop to hand the wakeup over safely
+            self._subscribers.add((ev, asyncio.get_running_loop()))
+        return ev
+
+    def unsubscribe(self, ev: asyncio.Event) -> None:
+        with self._lock:
+            self._subscribers = {(e, loop) for e, loop in self._subscribers if e is not ev}
+
+    def notify(self) -> None:
+        with self._lock:
+            subs = list(self._subscribers)
+        for ev, loop in subs:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+broadcaster = Broadcaster()
+
+def bump_version(db: Session, order_id: Optional[int]) -> None:
+    """Bump the row version of the order and every ancestor (an adjustment child's change alters its parent's view)."""
+    seen = set()
+    while order_id is not None and order_id not in seen:
+        seen.add(order_id)
+        o = db.get(Order, order_id)
+        if o is None:
+            return
+        o.version = Order.version + 1  # evaluated in SQL at flush, safe under concurrent writers
+        o.updated_at = datetime.utcnow()
+        order_id = o.parent_order_id
+
+def record(db: Session, action: str, order_id: Optional[int], payment_id: Optional[int] = None, **data) -> None:
+    """Add a change event to the current transaction and bump the order's version; subscribers are woken once it commits."""
+    bump_version(db, order_id)
+    db.add(ChangeEvent(action=action, order_id=order_id, payment_id=payment_id, data=json.dumps(data, default=str) if data else None))
+    if db.bind.dialect.name == "postgresql":
+        # Delivered to other workers' listeners only when (and if) this transaction commits
+        db.execute(text("SELECT pg_notify(:ch, '')"), {"ch": CHANNEL})
+    db.info["changes_pending"] = True
+
+def record_many(db: Session, action: str, rows: Iterable[Tuple[int, Optional[int], dict]]) -> None:
+    """record() for a batch of (order_id, payment_id, data): one version bump per order and ancestor, one bulk
+    insert and one NOTIFY, instead of a round trip per row."""
+    rows = list(rows)
+    if not rows:
+        return
+    ids, frontier = set(), {oid for oid, _, _ in rows}
+    while frontier:
+        ids |= frontier
+        parents = db.execute(
+            select(Order.parent_order_id).where(Order.id.in_(frontier), Order.parent_order_id.is_not(None))
+        ).scalars()
+        frontier = set(parents) - ids
+    now = datetime.utcnow()
+    db.execute(update(Order).where(Order.id.in_(ids)).values(version=Order.version + 1, updated_at=now))
+    db.execute(insert(ChangeEvent), [
+        {"action": action, "order_id": oid, "payment_id": pid, "data": json.dumps(data, default=str) if data else None, "created_at": now}
+        for oid, pid, data in rows
+    ])
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("SELECT pg_notify(:ch, '')"), {"ch": CHANNEL})
+    db.info["changes_pending"] = True
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    if session.info.pop("changes_pending", False):
+        broadcaster.notify()
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("changes_pending", None)
+
+def to_dict(ev: ChangeEvent) -> dict:
+    return {
+        "seq": ev.seq,
+        "at": ev.created_at.isoformat() if ev.created_at else None,
+        "action": ev.action,
+        "order_id": ev.order_id,
+        "payment_id": ev.payment_id,
+        "data": json.loads(ev.data) if ev.data else {},
+    }
+
+def latest_seq(db: Session) -> int:
+    return int(db.execute(select(func.coalesce(func.max(ChangeEvent.seq), 0))).scalar_one())
+
+def fetch_since(db: Session, since: int, limit: int = 500) -> List[dict]:
+    rows = db.execute(
+        select(ChangeEvent).where(ChangeEvent.seq > since).order_by(ChangeEvent.seq).limit(limit)
+    ).scalars().all()
+    out = []
+    expected = since + 1
+    now = datetime.utcnow()
+    for ev in rows:
+        if ev.seq != expected and ev.created_at and now - ev.created_at < GAP_GRACE:
+            break  # an earlier seq may still be committing; pick it up on the next poll
+        out.append(to_dict(ev))
+        expected = ev.seq + 1
+    return out
+
+def start_pg_listener(engine, stop: threading.Event) -> None:
+    """Background thread: LISTEN on the channel and wake local streams for commits made by other workers."""
+    def run():
+        while not stop.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                conn = raw.driver_connection
+                conn.set_session(autocommit=True)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                while not stop.is_set():
+                    if _select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        broadcaster.notify()
+            except Exception as e:
+                print(f"change listener warn: {e}")
+                stop.wait(5)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()
+                    except Exception:
+                        pass
+    threading.Thread(target=run, name="change-listener", daemon=True).start()
@@ -6,9 +6,57 @@ import os
 class Settings(BaseSettings):
     openai_api_key: str = Field(default="", alias="OPENAI_API_KEY")
     database_url: str = Field(default="", alias="DATABASE_URL")
+    # Optional read replica for lists, exports and PDFs; a client that just wrote reads the primary for this long
+    read_database_url: str = Field(default="", alias="READ_DATABASE_URL")
+    read_your_writes_seconds: int = Field(default=10, alias="READ_YOUR_WRITES_SECONDS")
     cors_origins: str = Field(default="*", alias="CORS_ORIGINS")
     openai_model: str = Field(default="gpt-4o-mini", alias="OPENAI_MODEL")
+    openai_base_url: str = Field(default="", alias="OPENAI_BASE_URL")
+    # Latency budget per extraction (Responses call + chat fallback together); batches get their own
+    openai_timeout_seconds: float = Field(default=20, alias="OPENAI_TIMEOUT_SECONDS")
+    openai_batch_timeout_seconds: float = Field(default=45, alias="OPENAI_BATCH_TIMEOUT_SECONDS")
+    # LLM backend for /parse: openai | record (openai + save answers to LLM_FIXTURE_DIR) | replay (fixtures only, offline)
+    llm_backend: str = Field(default="openai", alias="LLM_BACKEND")
+    llm_fixture_dir: str = Field(default="./fixtures/llm", alias="LLM_FIXTURE_DIR")
+    llm_replay_latency_ms: int = Field(default=0, alias="LLM_REPLAY_LATENCY_MS")
+    # Circuit breaker: open after N consecutive upstream failures, probe again after the reset period
+    openai_breaker_threshold: int = Field(default=5, alias="OPENAI_BREAKER_THRESHOLD")
+    openai_breaker_reset_seconds: float = Field(default=30, alias="OPENAI_BREAKER_RESET_SECONDS")
     timezone_offset: str = Field(default="+08:00", alias="TIMEZONE_OFFSET")
+    # Country code for local-format phones when linking orders to customers
+    default_phone_country_code: str = Field(default="60", alias="DEFAULT_PHONE_COUNTRY_CODE")
+    # Opt-in async SQLAlchemy stack (asyncpg / aiosqlite) for the read-heavy routes
+    async_db: bool = Field(default=False, alias="ASYNC_DB")
+    # Response compression: bodies smaller than this are sent as-is
+    gzip_min_size: int = Field(default=1024, alias="GZIP_MIN_SIZE")
+    # Background /parse?async=1 queue: in-process worker threads (0 = run scripts/parse_worker.py instead)
+    parse_workers: int = Field(default=2, alias="PARSE_WORKERS")
+    parse_job_timeout_seconds: int = Field(default=300, alias="PARSE_JOB_TIMEOUT_SECONDS")
+    parse_job_max_attempts: int = Field(default=3, alias="PARSE_JOB_MAX_ATTEMPTS")
+    # Concurrent /parse calls arriving within this window share one LLM request of up to PARSE_BATCH_MAX_SIZE messages (0 = off)
+    parse_batch_window_ms: int = Field(default=25, alias="PARSE_BATCH_WINDOW_MS")
+    parse_batch_max_size: int = Field(default=8, alias="PARSE_BATCH_MAX_SIZE")
+    # Message retention (scripts/retention.py): compress payloads after N days, move them to ARCHIVE_DIR after M days
+    message_compact_after_days: int = Field(default=30, alias="MESSAGE_COMPACT_AFTER_DAYS")
+    message_archive_after_days: int = Field(default=365, alias="MESSAGE_ARCHIVE_AFTER_DAYS")
+    archive_dir: str = Field(default="./archive", alias="ARCHIVE_DIR")
+    # Cache shared by the workers of one host (app.cache): sqlite | disk | memory | none
+    cache_backend: str = Field(default="sqlite", alias="CACHE_BACKEND")
+    cache_dir: str = Field(default="./.cache", alias="CACHE_DIR")
+    pdf_cache_ttl_seconds: int = Field(default=86400, alias="PDF_CACHE_TTL_SECONDS")
+    # Export jobs (POST /exports): process pool size, output dir, how long a finished file is reused
+    export_workers: int = Field(default=2, alias="EXPORT_WORKERS")
+    export_dir: str = Field(default="./exports", alias="EXPORT_DIR")
+    export_reuse_seconds: int = Field(default=3600, alias="EXPORT_REUSE_SECONDS")
+    export_job_timeout_seconds: int = Field(default=900, alias="EXPORT_JOB_TIMEOUT_SECONDS")
+    # Idempotency-Key rows (POST /orders, POST /orders/{id}/payments) are kept this long
+    idempotency_ttl_hours: int = Field(default=24, alias="IDEMPOTENCY_TTL_HOURS")
+    # On-demand request profiling (X-Profile: <token>); empty = the middleware is not installed
+    profile_token: str = Field(default="", alias="PROFILE_TOKEN")
+    profile_dir: str = Field(default="./profiles", alias="PROFILE_DIR")
+    profile_interval_ms: float = Field(default=5, alias="PROFILE_INTERVAL_MS")
+    profile_keep: int = Field(default=200, alias="PROFILE_KEEP")
+    payment_import_max_rows: int = Field(default=20000, alias="PAYMENT_IMPORT_MAX_ROWS")
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import Customer
+from .utils import normalize_phone
+
+settings = get_settings()
+
+def normalize(phone: Optional[str]) -> Optional[str]:
+    return normalize_phone(phone, settings.default_phone_country_code)
+
+def get_by_phone(db: Session, phone: Optional[str]) -> Optional[Customer]:
+    e164 = normalize(phone)
+    if e164 is None:
+        return None
+    return db.execute(select(Customer).where(Customer.phone_e164 == e164)).scalar_one_or_none()
+
+def get_or_create(db: Session, phone: Optional[str], name: Optional[str] = None) -> Optional[Customer]:
+    """Customer for the phone (None when it doesn't normalize); keeps the latest non-empty name."""
+    e164 = normalize(phone)
+    if e164 is None:
+        return None
+    cust = db.execute(select(Customer).where(Customer.phone_e164 == e164)).scalar_one_or_none()
+    if cust is None:
+        try:
+            # Savepoint: a concurrent insert of the same phone must not roll back the caller's order
+            with db.begin_nested():
+                cust = Customer(phone_e164=e164, name=name)
+                db.add(cust)
+        except IntegrityError:
+            cust = db.execute(select(Customer).where(Customer.phone_e164 == e164)).scalar_one()
+    elif name and name != "Unknown" and cust.name != name:
+        cust.name, cust.updated_at = name, datetime.utcnow()
+    return cust
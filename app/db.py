@@ -1,5 +1,7 @@
+import time
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from starlette.requests import Request
 from .config import get_settings
 
 settings = get_settings()
@@ -18,3 +20,72 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# --- optional read replica (READ_DATABASE_URL); without one, reads go to the primary
+
+READ_DATABASE_URL = settings.read_database_url or ""
+# Set by ReadYourWritesMiddleware after a successful mutation; holds the write time (epoch seconds)
+RYW_COOKIE = "orderops_rw"
+
+if READ_DATABASE_URL:
+    read_connect_args = {"check_same_thread": False} if READ_DATABASE_URL.startswith("sqlite") else {}
+    read_engine = create_engine(READ_DATABASE_URL, echo=False, future=True, connect_args=read_connect_args)
+    if read_engine.dialect.name == "postgresql":
+        read_engine = read_engine.execution_options(postgresql_readonly=True)
+else:
+    read_engine = engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, future=True)
+
+def wants_primary(request) -> bool:
+    """Read-your-writes: this client wrote recently (cookie) or asked for the primary (X-Read-Primary: 1)."""
+    if read_engine is engine:
+        return True
+    if request.headers.get("x-read-primary", "").lower() in ("1", "true"):
+        return True
+    try:
+        return time.time() - float(request.cookies.get(RYW_COOKIE, 0)) < settings.read_your_writes_seconds
+    except ValueError:
+        return False
+
+def get_read_db(request: Request):
+    db = SessionLocal() if wants_primary(request) else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# --- optional async stack (ASYNC_DB=1)
+
+def async_url(url: str) -> str:
+    """Map the sync DATABASE_URL onto its async driver (asyncpg / aiosqlite)."""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            # asyncpg spells libpq's sslmode as ssl
+            return "postgresql+asyncpg://" + url[len(prefix):].replace("sslmode=", "ssl=")
+    if url.startswith("sqlite:///"):
+        return "sqlite+aiosqlite:///" + url[len("sqlite:///"):]
+    return url
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.async_db:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    async_engine = create_async_engine(async_url(DATABASE_URL), echo=False)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async_read_engine = async_engine
+AsyncReadSessionLocal = AsyncSessionLocal
+if settings.async_db and READ_DATABASE_URL:
+    async_read_engine = create_async_engine(async_url(READ_DATABASE_URL), echo=False)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, expire_on_commit=False, autoflush=False)
+
+async def get_async_read_db(request: Request):
+    factory = AsyncSessionLocal if wants_primary(request) else AsyncReadSessionLocal
+    async with factory() as db:
+        yield db
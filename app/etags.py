@@ -0,0 +1,19 @@
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import Request, Response
+
+def make_etag(*parts) -> str:
+    # Weak validator: the body is regenerated on each miss. The UTC day is included because
+    # outstanding estimates and document dates move with the calendar, not only with writes.
+    day = datetime.now(timezone.utc).strftime("%Y%m%d")
+    return 'W/"' + ".".join(str(p) for p in parts) + "." + day + '"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """A 304 response when If-None-Match matches, else None."""
+    inm = request.headers.get("if-none-match")
+    if not inm:
+        return None
+    tags = [t.strip() for t in inm.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -0,0 +1,123 @@
+"""Export jobs: reports are rendered in a process pool so pandas/openpyxl work never blocks a web worker.
+
+POST /exports records an ExportJob and submits run_export(job_id) to the pool; the child process opens its own
+database session, writes the file under EXPORT_DIR and marks the row done. Requests whose report, params and
+change-feed seq match a recent job get that job back instead of a new run.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .db import SessionLocal, ReadSessionLocal, engine, read_engine
+from .models import ExportJob
+from . import changes, reports
+
+settings = get_settings()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _init_child():
+    # Never reuse pooled connections inherited from the parent
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs threads (uvicorn, parse workers) can deadlock the child
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.export_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_child,
+            )
+        return _pool
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def job_to_dict(job: ExportJob) -> Dict:
+    return {
+        "id": job.id,
+        "report": job.report,
+        "params": json.loads(job.params),
+        "status": job.status,
+        "filename": job.filename,
+        "size": job.size,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def _reusable(db: Session, params_hash: str) -> Optional[ExportJob]:
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.export_job_timeout_seconds)
+    jobs = db.execute(
+        select(ExportJob).where(ExportJob.params_hash == params_hash).order_by(ExportJob.id.desc()).limit(5)
+    ).scalars().all()
+    for job in jobs:
+        if job.status in ("queued", "running") and job.created_at >= stale:
+            return job
+        if (job.status == "done" and job.finished_at and job.finished_at >= now - timedelta(seconds=settings.export_reuse_seconds)
+                and job.file_path and os.path.exists(job.file_path)):
+            return job
+    return None
+
+def enqueue(db: Session, report: str, params: Dict, data_seq: Optional[int] = None) -> ExportJob:
+    """Create (or reuse) an export job and submit it. Raises ValueError on an unknown report or bad params."""
+    params = reports.normalize_params(report, params or {})
+    canonical = json.dumps(params, sort_keys=True)
+    # The newest change seq versions the data and the params carry any valuation day (as_of), so a reused file is
+    # always identical to a fresh run
+    seq = changes.latest_seq(db) if data_seq is None else data_seq
+    params_hash = hashlib.sha1(f"{report}|{canonical}|{seq}".encode()).hexdigest()
+    job = _reusable(db, params_hash)
+    if job is not None:
+        return job
+    job = ExportJob(report=report, params=canonical, params_hash=params_hash, status="queued")
+    db.add(job); db.commit(); db.refresh(job)
+    get_pool().submit(run_export, job.id)
+    return job
+
+def run_export(job_id: int) -> None:
+    """Runs in a pool process. Job bookkeeping goes to the primary, report queries to the replica (if any)."""
+    db = SessionLocal()
+    read_db = ReadSessionLocal() if read_engine is not engine else db
+    try:
+        job = db.get(ExportJob, job_id)
+        if job is None or job.status != "queued":
+            return
+        job.status, job.started_at = "running", datetime.utcnow()
+        db.commit()
+        try:
+            content, filename = reports.build_report(read_db, job.report, json.loads(job.params))
+            os.makedirs(settings.export_dir, exist_ok=True)
+            path = os.path.join(settings.export_dir, f"{job.id}-{filename}")
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+            job.status, job.file_path, job.filename, job.size, job.error = "done", os.path.abspath(path), filename, len(content), None
+        except Exception as e:
+            db.rollback()
+            job.status, job.error = "error", str(e)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        if read_db is not db:
+            read_db.close()
+        db.close()
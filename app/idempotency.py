@@ -0,0 +1,88 @@
+"""Idempotency-Key support for the create endpoints (POST /orders, POST /orders/{id}/payments).
+
+The key row is inserted in the same transaction as the rows it protects and carries the response body, so either
+both commit or neither does. A retry is answered from that row with one lookup on the (key, endpoint) unique index,
+and nothing is written. A concurrent duplicate blocks on the unique index until the first request commits, then
+replays the result.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import IdempotencyKey
+
+settings = get_settings()
+
+MAX_KEY_LENGTH = 128
+# Expired rows are purged opportunistically every this many claims (indexed delete on expires_at)
+PURGE_EVERY = 100
+_claims = 0
+
+def request_hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def _replay(row: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(status_code=row.response_code, content=json.loads(row.response_body), headers={"Idempotent-Replayed": "true"})
+
+def _lookup(db: Session, key: str, endpoint: str, req_hash: str) -> Optional[JSONResponse]:
+    row = db.execute(
+        select(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.endpoint == endpoint)
+    ).scalar_one_or_none()
+    if row is None:
+        return None
+    if row.expires_at < datetime.utcnow():
+        db.delete(row)
+        db.flush()
+        return None
+    if row.request_hash != req_hash:
+        raise HTTPException(422, "Idempotency-Key was already used with a different request")
+    return _replay(row)
+
+def begin(db: Session, key: Optional[str], endpoint: str, payload: Any) -> Optional[JSONResponse]:
+    """Stored response for a replay, else None with the key claimed (flushed, uncommitted) in the current transaction."""
+    global _claims
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(400, f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters")
+    req_hash = request_hash(payload)
+    replay = _lookup(db, key, endpoint, req_hash)
+    if replay is not None:
+        return replay
+
+    now = datetime.utcnow()
+    row = IdempotencyKey(key=key, endpoint=endpoint, request_hash=req_hash, created_at=now,
+                         expires_at=now + timedelta(hours=settings.idempotency_ttl_hours))
+    db.add(row)
+    try:
+        db.flush()
+    except IntegrityError:
+        # Same key in flight on another connection: its transaction has committed by now (we waited on the index)
+        db.rollback()
+        replay = _lookup(db, key, endpoint, req_hash)
+        if replay is None:
+            raise HTTPException(409, "A request with this Idempotency-Key is still in progress")
+        return replay
+    db.info["idempotency_key"] = row
+
+    _claims += 1
+    if _claims % PURGE_EVERY == 0:
+        db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now))
+    return None
+
+def complete(db: Session, body: Any, status_code: int = 200) -> Any:
+    """Store the response on the claimed key (if any) before the caller's commit; returns the encoded body."""
+    content = jsonable_encoder(body)
+    row = db.info.pop("idempotency_key", None)
+    if row is not None:
+        row.response_code = status_code
+        row.response_body = json.dumps(content)
+    return content
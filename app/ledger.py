@@ -0,0 +1,288 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from sqlalchemy import select, update, func, bindparam
+from sqlalchemy.orm import Session
+
+from .models import Order, Payment, OrderBalance, OrderType, OrderStatus
+from .utils import months_elapsed_no_prorate, months_elapsed_no_prorate_many, due_date_for
+
+# Money comparisons in the verify pass tolerate float noise from Numeric -> float conversion
+TOLERANCE = 0.005
+
+def decimal_money(v) -> Decimal:
+    """Money rounded to cents as a Decimal for Numeric column arithmetic (app.utils.money is the JSON float form).
+    Decimal keeps the in-session evaluation of `col + delta` on loaded Numeric rows working."""
+    return Decimal(str(round(float(v or 0), 2)))
+
+def accrued_expected(order: Order, bal: OrderBalance, now: Optional[datetime] = None) -> float:
+    """Expected amount billed so far for the order itself (no adjustments, no payments)."""
+    now = now or datetime.now(timezone.utc)
+    expected = float(order.total or 0)
+    if order.order_type == OrderType.RENTAL:
+        # Include recurring from month 2 onwards
+        if bal.rental_start_date and float(order.rental_monthly_total or 0) > 0:
+            months = months_elapsed_no_prorate(bal.rental_start_date, now)
+            if months > 1:
+                expected += (months - 1) * float(order.rental_monthly_total)
+    elif order.order_type == OrderType.INSTALMENT:
+        if bal.instalment_start_date and order.instalment_months_total and order.instalment_monthly_amount:
+            months = months_elapsed_no_prorate(bal.instalment_start_date, now)
+            months = min(months, int(order.instalment_months_total))
+            expected = months * float(order.instalment_monthly_amount)
+    return expected
+
+def outstanding_from_balance(order: Order, bal: OrderBalance, now: Optional[datetime] = None) -> float:
+    expected = accrued_expected(order, bal, now) + float(bal.adjustments_total or 0)
+    return max(expected - float(bal.payments_total or 0), 0.0)
+
+def subtree_rollups(orders: Sequence[Order], bals: Dict[int, OrderBalance], now: Optional[datetime] = None) -> Dict[int, Dict]:
+    """Per-order totals over the order and all its loaded descendants.
+
+    Each node contributes only its own accrual and payments; a parent's adjustments_total is left out because
+    it already counts its direct children, which are summed here as nodes in their own right.
+    """
+    now = now or datetime.now(timezone.utc)
+    by_id = {o.id: o for o in orders}
+    out = {o.id: {"orders": 0, "billed": 0.0, "paid": 0.0} for o in orders}
+    for o in orders:
+        billed = accrued_expected(o, bals[o.id], now)
+        paid = float(bals[o.id].payments_total or 0)
+        node, seen = o, set()
+        while node is not None and node.id not in seen:  # add to every loaded ancestor (and itself)
+            seen.add(node.id)
+            acc = out[node.id]
+            acc["orders"] += 1
+            acc["billed"] += billed
+            acc["paid"] += paid
+            node = by_id.get(node.parent_order_id)
+    for acc in out.values():
+        acc["billed"], acc["paid"] = round(acc["billed"], 2), round(acc["paid"], 2)
+        acc["outstanding"] = round(max(acc["billed"] - acc["paid"], 0.0), 2)
+    return out
+
+def get_balances(db: Session, orders: Sequence[Order]) -> Dict[int, OrderBalance]:
+    """Ledger rows for many orders in one IN query (recomputing any that are missing)."""
+    ids = [o.id for o in orders]
+    bals = {b.order_id: b for b in db.execute(select(OrderBalance).where(OrderBalance.order_id.in_(ids))).scalars()} if ids else {}
+    for o in orders:
+        if o.id not in bals:
+            bals[o.id] = recompute_balance(db, o)
+    return bals
+
+def accrual_arrays(orders: Sequence[Order], bals: Dict[int, OrderBalance], now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """Vectorized accrued_expected over many orders; also returns the month counts used."""
+    now = now or datetime.now(timezone.utc)
+    total = np.array([float(o.total or 0) for o in orders], dtype=np.float64)
+    is_rental = np.array([o.order_type == OrderType.RENTAL for o in orders], dtype=bool)
+    is_inst = np.array([o.order_type == OrderType.INSTALMENT for o in orders], dtype=bool)
+    rental_monthly = np.array([float(o.rental_monthly_total or 0) for o in orders], dtype=np.float64)
+    inst_monthly = np.array([float(o.instalment_monthly_amount or 0) for o in orders], dtype=np.float64)
+    inst_total = np.array([int(o.instalment_months_total or 0) for o in orders], dtype=np.int64)
+    starts = [
+        bals[o.id].rental_start_date if o.order_type == OrderType.RENTAL
+        else bals[o.id].instalment_start_date if o.order_type == OrderType.INSTALMENT
+        else None
+        for o in orders
+    ]
+    months = months_elapsed_no_prorate_many(starts, now)
+
+    expected = total.copy()
+    rental = is_rental & (rental_monthly > 0)
+    expected[rental] += np.maximum(months[rental] - 1, 0) * rental_monthly[rental]
+    inst = is_inst & (inst_total > 0) & (inst_monthly > 0)
+    has_start = np.array([s is not None for s in starts], dtype=bool)
+    inst_months = np.minimum(months, inst_total)
+    expected[inst & has_start] = inst_months[inst & has_start] * inst_monthly[inst & has_start]
+    return {"months": months, "expected": expected}
+
+def outstanding_many(orders: Sequence[Order], bals: Dict[int, OrderBalance], now: Optional[datetime] = None) -> np.ndarray:
+    if not orders:
+        return np.zeros(0, dtype=np.float64)
+    expected = accrual_arrays(orders, bals, now)["expected"]
+    adjustments = np.array([float(bals[o.id].adjustments_total or 0) for o in orders], dtype=np.float64)
+    payments = np.array([float(bals[o.id].payments_total or 0) for o in orders], dtype=np.float64)
+    return np.maximum(expected + adjustments - payments, 0.0)
+
+def next_due_date(order: Order, bal: OrderBalance) -> Optional[date]:
+    """Next monthly due date not yet covered by payments, following the same rules as accrued_expected."""
+    if order.status != OrderStatus.ACTIVE:
+        return None
+    paid = float(bal.payments_total or 0) + 0.005  # absorb Numeric -> float noise before flooring
+    if order.order_type == OrderType.RENTAL:
+        monthly = float(order.rental_monthly_total or 0)
+        if not bal.rental_start_date or monthly <= 0:
+            return None
+        # order.total covers the first month; recurring charges start from month 2
+        covered = int(max(paid - float(order.total or 0), 0) // monthly)
+        return due_date_for(bal.rental_start_date, covered + 2)
+    if order.order_type == OrderType.INSTALMENT:
+        monthly = float(order.instalment_monthly_amount or 0)
+        months_total = int(order.instalment_months_total or 0)
+        if not bal.instalment_start_date or monthly <= 0 or months_total <= 0:
+            return None
+        covered = int(paid // monthly)
+        if covered >= months_total:
+            return None
+        return due_date_for(bal.instalment_start_date, covered + 1)
+    return None
+
+def recompute_balance(db: Session, order: Order) -> OrderBalance:
+    """Full recomputation from payments and child orders. Returns a transient (unsaved) row."""
+    payments_total = db.execute(
+        select(func.coalesce(func.sum(Payment.amount), 0)).where(Payment.order_id == order.id, Payment.voided == False)
+    ).scalar_one()
+    adjustments_total = db.execute(
+        select(func.coalesce(func.sum(Order.total), 0)).where(Order.parent_order_id == order.id)
+    ).scalar_one()
+    bal = OrderBalance(
+        order_id=order.id,
+        payments_total=float(payments_total or 0),
+        adjustments_total=float(adjustments_total or 0),
+        rental_start_date=order.rental_start_date,
+        instalment_start_date=order.instalment_start_date,
+    )
+    bal.next_due_date = next_due_date(order, bal)
+    return bal
+
+def get_balance(db: Session, order: Order) -> OrderBalance:
+    """Ledger row for the order; falls back to a transient recomputation for orders not yet backfilled."""
+    bal = db.get(OrderBalance, order.id)
+    if bal is None:
+        bal = recompute_balance(db, order)
+    return bal
+
+def init_balance(db: Session, order: Order) -> OrderBalance:
+    """Create the ledger row for a freshly flushed order (and its initial payments)."""
+    bal = recompute_balance(db, order)
+    db.add(bal)
+    return bal
+
+def _ensure_row(db: Session, order_id: int) -> bool:
+    if db.get(OrderBalance, order_id) is not None:
+        return True
+    order = db.get(Order, order_id)
+    if order is None:
+        return False
+    # Legacy order without a ledger row: seed it from a full recompute (already includes flushed changes)
+    db.flush()
+    init_balance(db, order)
+    return False
+
+def apply_payment(db: Session, order_id: int, amount: float) -> None:
+    """Add (or with a negative amount, remove) a payment from the order's ledger row."""
+    if not _ensure_row(db, order_id):
+        return
+    db.execute(
+        update(OrderBalance)
+        .where(OrderBalance.order_id == order_id)
+        .values(payments_total=OrderBalance.payments_total + decimal_money(amount), updated_at=datetime.utcnow())
+    )
+    bal = db.get(OrderBalance, order_id)
+    bal.next_due_date = next_due_date(db.get(Order, order_id), bal)
+
+def apply_payments_many(db: Session, orders: Sequence[Order], deltas: Dict[int, float]) -> None:
+    """apply_payment for many orders at once: one IN read, one executemany UPDATE, one re-read for the due dates."""
+    ids = [o.id for o in orders if deltas.get(o.id)]
+    if not ids:
+        return
+    existing = set(db.execute(select(OrderBalance.order_id).where(OrderBalance.order_id.in_(ids))).scalars())
+    db.flush()
+    for o in orders:
+        if o.id in ids and o.id not in existing:
+            init_balance(db, o)  # seeded from a recompute that already includes the flushed payments
+    if not existing:
+        return
+    t = OrderBalance.__table__
+    db.execute(
+        t.update().where(t.c.order_id == bindparam("oid"))
+        .values(payments_total=t.c.payments_total + bindparam("delta"), updated_at=datetime.utcnow()),
+        [{"oid": oid, "delta": decimal_money(deltas[oid])} for oid in existing],
+    )
+    bals = {b.order_id: b for b in db.execute(
+        select(OrderBalance).where(OrderBalance.order_id.in_(existing)).execution_options(populate_existing=True)
+    ).scalars()}
+    for o in orders:
+        if o.id in bals:
+            bals[o.id].next_due_date = next_due_date(o, bals[o.id])
+
+def apply_adjustment(db: Session, parent_id: Optional[int], amount: float) -> None:
+    """Add a child order's total to its parent's adjustments."""
+    if parent_id is None or not amount:
+        return
+    if not _ensure_row(db, parent_id):
+        return
+    db.execute(
+        update(OrderBalance)
+        .where(OrderBalance.order_id == parent_id)
+        .values(adjustments_total=OrderBalance.adjustments_total + decimal_money(amount), updated_at=datetime.utcnow())
+    )
+
+def sync_terms(db: Session, order: Order) -> None:
+    """Refresh accrual anchors and the due date after the order's own fields (terms, status) changed."""
+    bal = db.get(OrderBalance, order.id)
+    if bal is None:
+        db.flush()
+        init_balance(db, order)
+        return
+    bal.rental_start_date = order.rental_start_date
+    bal.instalment_start_date = order.instalment_start_date
+    bal.next_due_date = next_due_date(order, bal)
+
+def rebuild_ledger(db: Session, fix: bool = True, batch_size: int = 500) -> List[Dict]:
+    """Compare every ledger row with a full recomputation.
+
+    Returns one dict per mismatching (or missing) row. With fix=True the rows are rewritten and committed.
+    """
+    mismatches: List[Dict] = []
+    last_id = 0
+    while True:
+        orders = db.execute(
+            select(Order).where(Order.id > last_id).order_by(Order.id).limit(batch_size)
+        ).scalars().all()
+        if not orders:
+            break
+        ids = [o.id for o in orders]
+        rows = {b.order_id: b for b in db.execute(select(OrderBalance).where(OrderBalance.order_id.in_(ids))).scalars()}
+        pays = dict(db.execute(
+            select(Payment.order_id, func.sum(Payment.amount))
+            .where(Payment.order_id.in_(ids), Payment.voided == False)
+            .group_by(Payment.order_id)
+        ).all())
+        adjs = dict(db.execute(
+            select(Order.parent_order_id, func.sum(Order.total))
+            .where(Order.parent_order_id.in_(ids))
+            .group_by(Order.parent_order_id)
+        ).all())
+        for o in orders:
+            want = {
+                "payments_total": float(pays.get(o.id) or 0),
+                "adjustments_total": float(adjs.get(o.id) or 0),
+                "rental_start_date": o.rental_start_date,
+                "instalment_start_date": o.instalment_start_date,
+            }
+            want["next_due_date"] = next_due_date(o, OrderBalance(**want))
+            bal = rows.get(o.id)
+            if bal is None:
+                mismatches.append({"order_id": o.id, "code": o.code, "missing": True})
+                if fix:
+                    db.add(OrderBalance(order_id=o.id, **want))
+                continue
+            diff = {}
+            for k, v in want.items():
+                have = getattr(bal, k)
+                if k.endswith("_total"):
+                    if abs(float(have or 0) - v) > TOLERANCE:
+                        diff[k] = {"ledger": float(have or 0), "actual": v}
+                elif have != v:
+                    diff[k] = {"ledger": have, "actual": v}
+            if diff:
+                mismatches.append({"order_id": o.id, "code": o.code, "diff": diff})
+                if fix:
+                    for k, v in want.items():
+                        setattr(bal, k, v)
+        if fix:
+            db.commit()
+        last_id = ids[-1]
+    return mismatches
@@ -1,24 +1,37 @@
-from fastapi import FastAPI, Depends, HTTPException, Body, Response
+from fastapi import FastAPI, Depends, HTTPException, Body, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse, FileResponse
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import select, func, update
 from typing import List, Optional
-from datetime import datetime, timezone
-import hashlib, json, io
-import pandas as pd
+from datetime import date, datetime, timezone
+import hashlib, hmac, json, math, os, time, asyncio, threading
 
 from .config import get_settings
-from .db import Base, engine, get_db
-from .models import Order, OrderItem, Payment, Message, OrderType, EventType, OrderStatus, PaymentMethod
-from .schemas import ParsedOrder, ManualOrderCreate, OrderOut, PaymentCreate, OrderItemOut, PaymentOut
-from .parsing import parse_message
-from .products import map_product
-from .utils import months_elapsed_no_prorate
-from .pdf import invoice_pdf, receipt_pdf, instalment_agreement_pdf
+from .db import Base, engine, get_db, get_read_db, SessionLocal, READ_DATABASE_URL, RYW_COOKIE
+from .models import Order, OrderItem, Payment, Message, ExportJob, Customer, OrderType, EventType, OrderStatus, PaymentMethod
+from .schemas import ParsedOrder, ManualOrderCreate, OrderOut, PaymentCreate, OrderItemOut, PaymentOut, ReceivableOut, ParseJobOut, MessageOut, ExportRequest, ExportJobOut, CustomerOut, CustomerOrdersOut, OrderTreeOut
+from .parsing import parse_text, normalize_parsed, is_degraded
+from .message_store import save_parsed, find_messages
+from .utils import to_xlsx_bytes, money, XLSX_MEDIA_TYPE
+from .middleware import CompressionMiddleware, ReadYourWritesMiddleware, ProfileMiddleware
+from .pdf import invoice_pdf, receipt_pdf, instalment_agreement_pdf, TEMPLATE_VERSION as PDF_TEMPLATE
+from . import ledger, rollups, parsing, parse_jobs, changes, retention, reports, exports, idempotency, payment_import, customers, profiling
+from .etags import make_etag, not_modified
+from .schema_state import schema_state
+from .cache import cache
 
 settings = get_settings()
 app = FastAPI(title="Order Intake Suite", version="1.0")
 
+# Compression (size threshold; streaming endpoints excluded)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.gzip_min_size)
+
+# Read replica: clients that just wrote keep reading the primary for a few seconds
+if READ_DATABASE_URL:
+    app.add_middleware(ReadYourWritesMiddleware, cookie_name=RYW_COOKIE, max_age=settings.read_your_writes_seconds)
+
 # CORS
 origins = ["*"] if settings.cors_origins == "*" else [o.strip() for o in settings.cors_origins.split(",")]
 app.add_middleware(
@@ -29,6 +42,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# On-demand profiling, outermost so the profile covers the whole middleware stack
+if settings.profile_token:
+    profiling.install()
+    app.add_middleware(ProfileMiddleware, token=settings.profile_token, directory=settings.profile_dir,
+                       interval_ms=settings.profile_interval_ms, keep=settings.profile_keep)
+
 # DB init (dev convenience)
 
 def now_utc():
@@ -48,36 +67,16 @@ def generate_order_code(db: Session) -> str:
     return f"{prefix}{n:03d}"
 
 def compute_outstanding(order: Order, db: Session) -> float:
-    payments_sum = float(db.execute(
-        select(func.coalesce(func.sum(Payment.amount), 0)).where(Payment.order_id == order.id, Payment.voided == False)
-    ).scalar_one() or 0.0)
-
-    expected = float(order.total or 0)
-
-    if order.order_type == OrderType.RENTAL:
-        # Include recurring from month 2 onwards
-        if order.rental_start_date and float(order.rental_monthly_total) > 0:
-            months = months_elapsed_no_prorate(order.rental_start_date, now_utc())
-            if months > 1:
-                expected += (months - 1) * float(order.rental_monthly_total)
-    elif order.order_type == OrderType.INSTALMENT:
-        if order.instalment_start_date and order.instalment_months_total and order.instalment_monthly_amount:
-            months = months_elapsed_no_prorate(order.instalment_start_date, now_utc())
-            months = min(months, int(order.instalment_months_total))
-            expected = months * float(order.instalment_monthly_amount)
-
-    # Adjustments from child orders
-    children = db.execute(select(Order).where(Order.parent_order_id == order.id)).scalars().all()
-    for ch in children:
-        expected += float(ch.total or 0)
-
-    return max(expected - payments_sum, 0.0)
-
-def order_to_out(order: Order, db: Session) -> OrderOut:
+    # O(1): one ledger row read (identity-map cached) plus the accrual date math
+    bal = ledger.get_balance(db, order)
+    return ledger.outstanding_from_balance(order, bal, now_utc())
+
+def order_to_out(order: Order, db: Session, outstanding: Optional[float] = None) -> OrderOut:
     return OrderOut(
         id=order.id,
         code=order.code,
         parent_order_id=order.parent_order_id,
+        customer_id=order.customer_id,
         created_at=order.created_at,
         order_type=order.order_type.value,
         event_type=order.event_type.value,
@@ -103,53 +102,139 @@ def order_to_out(order: Order, db: Session) -> OrderOut:
         notes=order.notes,
         items=[OrderItemOut.model_validate(it) for it in order.items],
         payments=[PaymentOut.model_validate(p) for p in order.payments],
-        outstanding_estimate=compute_outstanding(order, db),
+        outstanding_estimate=compute_outstanding(order, db) if outstanding is None else float(outstanding),
     )
 
+COMPACT_INCLUDES = {"items", "payments"}
+
+def order_to_compact(order: Order, outstanding: float, include: set) -> dict:
+    """Trimmed list row: money rounded to cents, nested collections only when asked for."""
+    out = {
+        "id": order.id,
+        "code": order.code,
+        "parent_order_id": order.parent_order_id,
+        "created_at": order.created_at,
+        "order_type": order.order_type.value,
+        "status": order.status.value,
+        "customer_name": order.customer_name,
+        "phone": order.phone,
+        "address": order.address,
+        "total": money(order.total),
+        "paid_initial": money(order.paid_initial),
+        "to_collect_initial": money(order.to_collect_initial),
+        "rental_monthly_total": money(order.rental_monthly_total),
+        "instalment_months_total": int(order.instalment_months_total or 0),
+        "instalment_monthly_amount": money(order.instalment_monthly_amount),
+        "outstanding_estimate": money(outstanding),
+    }
+    if "items" in include:
+        out["items"] = [
+            {"id": it.id, "sku": it.sku, "name": it.name, "qty": float(it.qty or 0), "unit_price": money(it.unit_price),
+             "line_total": money(it.line_total), "item_type": it.item_type}
+            for it in order.items
+        ]
+    if "payments" in include:
+        out["payments"] = [
+            {"id": p.id, "created_at": p.created_at, "amount": money(p.amount), "method": p.method.value,
+             "reference": p.reference, "voided": bool(p.voided)}
+            for p in order.payments
+        ]
+    return out
+
+# Async read routes take precedence over the sync ones below when enabled
+if settings.async_db:
+    from .async_api import build_router
+    app.include_router(build_router(order_to_out, order_to_compact))
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
-@app.post("/parse", response_model=ParsedOrder)
-def parse(text: str = Body(..., media_type="text/plain"), db: Session = Depends(get_db)):
+@app.post("/parse", response_model=ParsedOrder, responses={202: {"model": ParseJobOut}})
+def parse(text: str = Body(..., media_type="text/plain"), run_async: bool = Query(False, alias="async"), db: Session = Depends(get_db)):
+    if run_async:
+        job = parse_jobs.enqueue(db, text)
+        return JSONResponse(status_code=202, content=parse_jobs.job_result(db, job))
+
     sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
     msg = db.query(Message).filter(Message.sha256 == sha).first()
-    if msg and msg.parsed_json:
+    if msg and msg.parsed_json is not None:
         try:
-            return json.loads(msg.parsed_json)
-        except Exception:
-            pass
-
-    parsed = parse_message(text)
-
-    # --- sanitize items (safe defaults) ---
-    items = parsed.get("items", []) or []
-    for item in items:
-        if item.get("text") is None:
-            item["text"] = item.get("name") or ""
-        if item.get("item_type") is None:
-            item["item_type"] = "OUTRIGHT"
-        if item.get("line_total") is None and item.get("qty") is not None and item.get("unit_price") is not None:
-            try:
-                item["line_total"] = float(item["qty"]) * float(item["unit_price"])
-            except Exception:
-                pass
-    parsed["items"] = items
-
-    # Map SKUs
-    for item in parsed.get("items", []):
-        mapped = map_product(item.get("text", "") or item.get("name", ""))
-        if not item.get("sku") and mapped.get("sku"):
-            item["sku"] = mapped["sku"]
-        if not item.get("name") and mapped.get("name"):
-            item["name"] = mapped["name"]
+            return retention.load_parsed(msg)
+        except FileNotFoundError:
+            pass  # archive file gone: a cache miss, re-parse and store the row hot again
+
+    parsed = normalize_parsed(parse_text(text))
+    if is_degraded(parsed):
+        # Not cached, so the next call for this text reaches the LLM again; fail fast while the breaker is open
+        retry = parsing.breaker.retry_after()
+        if retry > 0:
+            return JSONResponse(status_code=503, content=parsed, headers={"Retry-After": str(math.ceil(retry))})
+        return parsed
 
     # Persist message + parsed
-    m = Message(sha256=sha, text=text, parsed_json=json.dumps(parsed))
-    db.add(m); db.commit()
+    save_parsed(db, sha, text, parsed)
     return parsed
 
-def create_order_from_parsed(parsed: ParsedOrder, db: Session) -> Order:
+@app.get("/health/openai")
+def openai_health():
+    """Circuit breaker state and counters for the LLM dependency."""
+    return parsing.breaker.snapshot()
+
+@app.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|folded)$"), token: Optional[str] = Query(None),
+                x_profile: Optional[str] = Header(None)):
+    """A stored request profile (see PROFILE_TOKEN); format=folded gives the stacks for flamegraph.pl / speedscope."""
+    given = (x_profile or token or "").encode()
+    if not settings.profile_token or not hmac.compare_digest(given, settings.profile_token.encode()):
+        raise HTTPException(404, "Not found")
+    report = profiling.load(profile_id, settings.profile_dir)
+    if report is None:
+        raise HTTPException(404, "Profile not found")
+    if format == "folded":
+        return Response(report["folded"] + "\n", media_type="text/plain",
+                        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'})
+    return JSONResponse(report, headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.json"'})
+
+@app.get("/parse/jobs/{job_id}", response_model=ParseJobOut)
+async def parse_job_status(job_id: int, wait: float = Query(0, ge=0, le=30)):
+    """Poll a parse job; with wait>0, long-poll until it finishes or the wait elapses."""
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            job = await run_in_threadpool(parse_jobs.get_job, job_id)
+        except FileNotFoundError as e:
+            raise HTTPException(410, str(e))
+        if job is None:
+            raise HTTPException(404, "Job not found")
+        if job["status"] in ("done", "error") or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(0.25)
+
+@app.get("/messages", response_model=List[MessageOut])
+def list_messages(phone: Optional[str] = None, order_code: Optional[str] = None, limit: int = Query(200, ge=1, le=2000), db: Session = Depends(get_read_db)):
+    if not phone and not order_code:
+        raise HTTPException(400, "phone or order_code required")
+    # Archived rows carry only the indexed fields here; fetch /messages/{sha256} for the full payload
+    return [
+        MessageOut(id=m.id, sha256=m.sha256, order_id=m.order_id, created_at=m.created_at, archived=m.archived_at is not None,
+                   parsed=m.parsed_json if m.archived_at is not None else retention.load_parsed(m))
+        for m in find_messages(db, phone=phone, order_code=order_code, limit=limit)
+    ]
+
+@app.get("/messages/{sha256}", response_model=MessageOut)
+def get_message(sha256: str, db: Session = Depends(get_db)):
+    m = db.query(Message).filter(Message.sha256 == sha256).first()
+    if not m:
+        raise HTTPException(404, "Message not found")
+    try:
+        text, parsed = retention.load_payload(m)
+    except FileNotFoundError as e:
+        raise HTTPException(410, str(e))
+    return MessageOut(id=m.id, sha256=m.sha256, order_id=m.order_id, created_at=m.created_at,
+                      archived=m.archived_at is not None, text=text, parsed=parsed)
+
+def create_order_from_parsed(parsed: ParsedOrder, db: Session, commit: bool = True) -> Order:
     # Coerce defaults
     order_code = parsed.order_code or generate_order_code(db)
     event_type = EventType(parsed.event_type or "DELIVERY")
@@ -161,11 +246,13 @@ def create_order_from_parsed(parsed: ParsedOrder, db: Session) -> Order:
     elif "INSTALMENT" in types:
         otype = OrderType.INSTALMENT
 
+    customer = customers.get_or_create(db, parsed.phone, parsed.customer_name)
     order = Order(
         code=order_code,
         order_type=otype,
         event_type=event_type,
         status=OrderStatus.ACTIVE,
+        customer_id=customer.id if customer else None,
         customer_name=parsed.customer_name or "Unknown",
         phone=parsed.phone,
         address=parsed.address,
@@ -215,22 +302,60 @@ def create_order_from_parsed(parsed: ParsedOrder, db: Session) -> Order:
     order.instalment_months_total = int(instalment_months or 0)
     order.instalment_monthly_amount = float(instalment_monthly or 0)
 
-    db.add(order); db.commit(); db.refresh(order)
+    db.add(order); db.flush()
 
     # Auto-create initial payment record if paid_initial > 0
     if order.paid_initial and order.paid_initial > 0:
         p = Payment(order_id=order.id, amount=order.paid_initial, method=PaymentMethod.CASH, reference="init")
-        db.add(p); db.commit()
+        db.add(p); db.flush()
+        rollups.payments_changed(db, [(p.created_at, p.method, p.amount)])
+
+    ledger.init_balance(db, order)
+    rollups.order_added(db, order)
+    changes.record(db, "order.created", order.id, code=order.code, order_type=order.order_type.value, total=float(order.total or 0))
+    if commit:
+        db.commit()
+    else:
+        db.flush()
+    db.refresh(order)
     return order
 
 @app.post("/orders", response_model=OrderOut)
-def create_order(payload: ManualOrderCreate, db: Session = Depends(get_db)):
-    parsed = payload.parsed
-    order = create_order_from_parsed(parsed, db)
-    return order_to_out(order, db)
+def create_order(payload: ManualOrderCreate, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    replay = idempotency.begin(db, idempotency_key, "POST /orders", payload)
+    if replay is not None:
+        return replay
+    order = create_order_from_parsed(payload.parsed, db, commit=False)
+    out = idempotency.complete(db, order_to_out(order, db))
+    db.commit()
+    return out
+
+def order_version(db: Session, order_id: int) -> int:
+    """Indexed PK lookup of the row version only; 404 when the order doesn't exist."""
+    version = db.execute(select(Order.version).where(Order.id == order_id)).scalar_one_or_none()
+    if version is None:
+        raise HTTPException(404, "Order not found")
+    return version
 
 @app.get("/orders", response_model=List[OrderOut])
-def list_orders(status: Optional[str] = None, q: Optional[str] = None, db: Session = Depends(get_db)):
+def list_orders(
+    request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    q: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|compact)$"),
+    include: Optional[str] = Query(None, description="compact view only: comma list of items,payments"),
+    db: Session = Depends(get_read_db),
+):
+    include_set = {x.strip() for x in (include or "").split(",")} & COMPACT_INCLUDES
+    # Every write to orders/payments appends a change event, so the newest seq versions the whole list
+    key = f"{status}|{q}|{view}|{','.join(sorted(include_set))}"
+    etag = make_etag("l", changes.latest_seq(db), hashlib.sha1(key.encode()).hexdigest()[:12])
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
     query = db.query(Order)
     if status:
         try:
@@ -241,38 +366,195 @@ def list_orders(status: Optional[str] = None, q: Optional[str] = None, db: Sessi
         like = f"%{q}%"
         query = query.filter((Order.code.ilike(like)) | (Order.customer_name.ilike(like)) | (Order.phone.ilike(like)))
     query = query.order_by(Order.id.desc()).limit(2000)
+    # Collections load in one IN query each (and only when they will be sent) instead of two lazy loads per order
+    loads = COMPACT_INCLUDES if view == "full" else include_set
+    query = query.options(*(selectinload(getattr(Order, rel)) for rel in sorted(loads)))
     rows = query.all()
-    return [order_to_out(o, db) for o in rows]
+    # One IN query for the ledger rows, then vectorized accrual math over the whole page
+    outstanding = ledger.outstanding_many(rows, ledger.get_balances(db, rows), now_utc())
+    if view == "compact":
+        return ORJSONResponse([order_to_compact(o, out, include_set) for o, out in zip(rows, outstanding)], headers={"ETag": etag})
+    return [order_to_out(o, db, out) for o, out in zip(rows, outstanding)]
+
+@app.get("/orders/{order_id}", response_model=OrderTreeOut)
+def get_order(order_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    # Descendant changes bump this order's version too (changes.bump_version walks ancestors)
+    etag = make_etag("o", order_id, order_version(db, order_id))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    # Fixed query count at any depth: one recursive CTE for the subtree, items/payments/ledger rows by IN.
+    # UNION (not UNION ALL) drops ids already reached, so a parent_order_id cycle in old data still terminates.
+    tree = select(Order.id).where(Order.id == order_id).cte("order_tree", recursive=True)
+    tree = tree.union(select(Order.id).where(Order.parent_order_id == tree.c.id))
+    rows = db.execute(
+        select(Order).where(Order.id.in_(select(tree.c.id)))
+        .options(selectinload(Order.items), selectinload(Order.payments))
+        .order_by(Order.id)
+    ).scalars().all()
+    bals = ledger.get_balances(db, rows)
+    now = now_utc()
+    outstanding = dict(zip((o.id for o in rows), ledger.outstanding_many(rows, bals, now)))
+    subtree = ledger.subtree_rollups(rows, bals, now)
+    children = {}
+    for o in rows:
+        children.setdefault(o.parent_order_id, []).append(o)
+
+    seen = set()
+
+    def node(o: Order) -> OrderTreeOut:
+        seen.add(o.id)
+        return OrderTreeOut(
+            **order_to_out(o, db, outstanding[o.id]).model_dump(),
+            payments_total=money(bals[o.id].payments_total),
+            adjustments_total=money(bals[o.id].adjustments_total),
+            rollup=subtree[o.id],
+            children=[node(c) for c in children.get(o.id, []) if c.id not in seen],
+        )
+    return node(next(o for o in rows if o.id == order_id))
+
+@app.get("/customers", response_model=List[CustomerOut])
+def find_customers(phone: str, db: Session = Depends(get_read_db)):
+    cust = customers.get_by_phone(db, phone)
+    return [CustomerOut.model_validate(cust)] if cust else []
+
+@app.get("/customers/{customer_id}/orders", response_model=CustomerOrdersOut)
+def customer_orders(customer_id: int, db: Session = Depends(get_read_db)):
+    # Constant query count: customer by PK, orders on ix_orders_customer_id, items/payments/ledger rows by IN
+    cust = db.get(Customer, customer_id)
+    if not cust:
+        raise HTTPException(404, "Customer not found")
+    rows = db.execute(
+        select(Order).options(selectinload(Order.items), selectinload(Order.payments))
+        .where(Order.customer_id == customer_id).order_by(Order.id.desc())
+    ).scalars().all()
+    outstanding = ledger.outstanding_many(rows, ledger.get_balances(db, rows), now_utc())
+    return CustomerOrdersOut(
+        customer=CustomerOut.model_validate(cust),
+        orders=[order_to_out(o, db, out) for o, out in zip(rows, outstanding)],
+        order_count=len(rows),
+        outstanding_total=money(sum(out for o, out in zip(rows, outstanding) if o.parent_order_id is None)),
+    )
+
+def check_parent(db: Session, order_id: int, parent_id: int) -> None:
+    """400 unless parent_id is an existing order outside order_id's own subtree (no parent_order_id cycles)."""
+    node, seen = db.get(Order, parent_id), set()
+    if node is None:
+        raise HTTPException(400, f"parent_order_id {parent_id} does not exist")
+    while node is not None and node.id not in seen:
+        if node.id == order_id:
+            raise HTTPException(400, "parent_order_id would make the order its own ancestor")
+        seen.add(node.id)
+        node = db.get(Order, node.parent_order_id) if node.parent_order_id is not None else None
 
 @app.patch("/orders/{order_id}", response_model=OrderOut)
 def edit_order(order_id: int, payload: dict, db: Session = Depends(get_db)):
     o = db.get(Order, order_id)
     if not o:
         raise HTTPException(404, "Order not found")
+    old_parent_id, old_total = o.parent_order_id, float(o.total or 0)
+    if payload.get("parent_order_id") is not None and payload["parent_order_id"] != old_parent_id:
+        check_parent(db, o.id, payload["parent_order_id"])
+    before = rollups.facts(o)
     for k, v in payload.items():
         if hasattr(o, k):
             setattr(o, k, v)
     o.updated_at = now_utc()
+    if "phone" in payload and "customer_id" not in payload and o.parent_order_id is None:
+        # Relink the order and its adjustment children to the customer for the new phone
+        customer = customers.get_or_create(db, o.phone, o.customer_name)
+        o.customer_id = customer.id if customer else None
+        db.execute(update(Order).where(Order.parent_order_id == o.id).values(customer_id=o.customer_id))
+    db.flush()
+    # Keep the parent's adjustment totals in step when a child's total or parent link changes
+    new_total = float(o.total or 0)
+    if o.parent_order_id != old_parent_id:
+        ledger.apply_adjustment(db, old_parent_id, -old_total)
+        ledger.apply_adjustment(db, o.parent_order_id, new_total)
+    elif new_total != old_total:
+        ledger.apply_adjustment(db, o.parent_order_id, new_total - old_total)
+    ledger.sync_terms(db, o)
+    rollups.order_changed(db, before, o)
+    changes.record(db, "order.updated", o.id, code=o.code, fields=sorted(k for k in payload if hasattr(o, k)))
     db.commit(); db.refresh(o)
     return order_to_out(o, db)
 
 @app.post("/orders/{order_id}/payments", response_model=PaymentOut)
-def add_payment(order_id: int, data: PaymentCreate, db: Session = Depends(get_db)):
+def add_payment(order_id: int, data: PaymentCreate, db: Session = Depends(get_db), idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    replay = idempotency.begin(db, idempotency_key, f"POST /orders/{order_id}/payments", data)
+    if replay is not None:
+        return replay
     o = db.get(Order, order_id)
     if not o:
         raise HTTPException(404, "Order not found")
     p = Payment(order_id=order_id, amount=data.amount, method=PaymentMethod(data.method), reference=data.reference, notes=data.notes)
-    db.add(p); db.commit(); db.refresh(p)
-    return PaymentOut.model_validate(p)
+    db.add(p); db.flush()
+    ledger.apply_payment(db, order_id, data.amount)
+    rollups.payments_changed(db, [(p.created_at, p.method, p.amount)])
+    changes.record(db, "payment.created", order_id, p.id, amount=float(data.amount), method=p.method.value)
+    db.flush(); db.refresh(p)
+    out = idempotency.complete(db, PaymentOut.model_validate(p))
+    db.commit()
+    return out
+
+@app.post("/payments/import")
+async def import_payments(
+    request: Request,
+    dry_run: bool = False,
+    method: str = Query("TRANSFER", description="method for rows that leave it blank"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """Bulk-import payments from CSV (text/csv) or JSON (a list, or {"rows": [...]}) in one transaction."""
+    raw = await request.body()
+    ctype = request.headers.get("content-type", "")
+    try:
+        if "json" in ctype:
+            body = json.loads(raw or b"[]")
+            rows = body.get("rows", []) if isinstance(body, dict) else body
+            if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+                raise ValueError("expected a list of objects")
+        else:
+            rows = payment_import.parse_csv(raw)
+        default_method = PaymentMethod(method.upper())
+    except ValueError as e:
+        raise HTTPException(400, f"Unreadable import: {e}")
+    if len(rows) > settings.payment_import_max_rows:
+        raise HTTPException(413, f"At most {settings.payment_import_max_rows} rows per import")
+
+    def run():
+        db = SessionLocal()
+        try:
+            replay = idempotency.begin(db, idempotency_key, "POST /payments/import",
+                                       {"body": hashlib.sha256(raw).hexdigest(), "dry_run": dry_run, "method": method})
+            if replay is not None:
+                return replay
+            result = payment_import.import_payments(db, rows, default_method, dry_run=dry_run)
+            if dry_run:
+                db.rollback()
+                return result
+            out = idempotency.complete(db, result)
+            db.commit()
+            return out
+        finally:
+            db.close()
+    return await run_in_threadpool(run)
 
 @app.post("/payments/{payment_id}/void", response_model=PaymentOut)
 def void_payment(payment_id: int, reason: str = Body(""), db: Session = Depends(get_db)):
     p = db.get(Payment, payment_id)
     if not p:
         raise HTTPException(404, "Payment not found")
+    was_voided = bool(p.voided)
     p.voided = True
     p.void_reason = reason or "voided"
     p.voided_at = now_utc()
+    db.flush()
+    if not was_voided:
+        ledger.apply_payment(db, p.order_id, -float(p.amount))
+        rollups.payments_changed(db, [(p.created_at, p.method, p.amount)], sign=-1)
+        changes.record(db, "payment.voided", p.order_id, p.id, amount=float(p.amount))
     db.commit(); db.refresh(p)
     return PaymentOut.model_validate(p)
 
@@ -283,6 +565,7 @@ def _create_adjustment_child(parent: Order, suffix: str, total: float, notes: st
         order_type=OrderType.ADJUSTMENT,
         event_type=EventType.ADJUSTMENT,
         status=parent.status,
+        customer_id=parent.customer_id,
         customer_name=parent.customer_name,
         phone=parent.phone,
         address=parent.address,
@@ -291,7 +574,12 @@ def _create_adjustment_child(parent: Order, suffix: str, total: float, notes: st
         penalty_amount=0, buyback_amount=0,
         total=total, notes=notes
     )
-    db.add(child); db.commit(); db.refresh(child)
+    db.add(child); db.flush()
+    ledger.init_balance(db, child)
+    ledger.apply_adjustment(db, parent.id, total)
+    rollups.order_added(db, child)
+    # No commit: the caller's parent update, ledger terms, rollups and change record go in the same transaction
+    db.flush()
     return child
 
 @app.post("/orders/{order_id}/cancel_instalment", response_model=OrderOut)
@@ -311,7 +599,11 @@ def cancel_instalment(order_id: int, penalty_amount: float = Body(..., embed=Tru
     # Create adjustment: -balance + penalty + return fee
     total = -balance + penalty_amount + return_delivery_fee
     child = _create_adjustment_child(o, "-I", total, f"Instalment cancel: -balance {balance:.2f} + penalty {penalty_amount:.2f} + return fee {return_delivery_fee:.2f}", db)
+    before = rollups.facts(o)
     o.status = OrderStatus.CANCELLED
+    ledger.sync_terms(db, o)
+    rollups.order_changed(db, before, o)
+    changes.record(db, "order.adjusted", o.id, child_id=child.id, child_code=child.code, total=float(child.total or 0), status=o.status.value)
     db.commit(); db.refresh(o)
     return order_to_out(child, db)
 
@@ -323,7 +615,11 @@ def return_rental(order_id: int, return_delivery_fee: float = Body(..., embed=Tr
     if o.order_type != OrderType.RENTAL:
         raise HTTPException(400, "Not a rental order")
     child = _create_adjustment_child(o, "-R", return_delivery_fee, f"Rental return collection fee", db)
+    before = rollups.facts(o)
     o.status = OrderStatus.RETURNED
+    ledger.sync_terms(db, o)
+    rollups.order_changed(db, before, o)
+    changes.record(db, "order.adjusted", o.id, child_id=child.id, child_code=child.code, total=float(child.total or 0), status=o.status.value)
     db.commit(); db.refresh(o)
     return order_to_out(child, db)
 
@@ -335,84 +631,182 @@ def buyback(order_id: int, buyback_amount: float = Body(..., embed=True), return
     # Convention: buyback_amount as negative number (credit to customer). Here we follow: negative credit + return fee (positive).
     total = float(buyback_amount) + float(return_delivery_fee)
     child = _create_adjustment_child(o, "-B", total, f"Buyback + return fee", db)
+    before = rollups.facts(o)
     o.status = OrderStatus.CANCELLED if o.order_type == OrderType.OUTRIGHT else o.status
+    ledger.sync_terms(db, o)
+    rollups.order_changed(db, before, o)
+    changes.record(db, "order.adjusted", o.id, child_id=child.id, child_code=child.code, total=float(child.total or 0), status=o.status.value)
     db.commit(); db.refresh(o)
     return order_to_out(child, db)
 
+@app.get("/receivables/due", response_model=List[ReceivableOut])
+def receivables_due(date_from: date = Query(..., alias="from"), date_to: date = Query(..., alias="to"), db: Session = Depends(get_read_db)):
+    return [ReceivableOut(**r) for r in reports.receivables_rows(db, date_from, date_to, now_utc())]
+
+@app.get("/dashboard")
+def dashboard(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    interval: str = Query("day", pattern="^(day|month)$"),
+    db: Session = Depends(get_read_db),
+):
+    """Revenue by order type, collections by method, active rentals and instalment book; reads the daily rollups only."""
+    if date_to < date_from:
+        raise HTTPException(400, "'to' is before 'from'")
+    return ORJSONResponse(rollups.dashboard(db, date_from, date_to, interval))
+
+@app.get("/changes")
+def list_changes(since: int = 0, limit: int = Query(500, ge=1, le=5000), db: Session = Depends(get_db)):
+    return changes.fetch_since(db, since, limit)
+
+@app.get("/changes/stream")
+async def change_stream(request: Request, since: Optional[int] = None):
+    """Server-sent events; resume with ?since=<seq> or the Last-Event-ID header after reconnecting."""
+    last_id = request.headers.get("last-event-id")
+    if since is None and last_id and last_id.isdigit():
+        since = int(last_id)
+
+    def _db_call(fn, *args):
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    async def events():
+        cursor = since if since is not None else await run_in_threadpool(_db_call, changes.latest_seq)
+        wakeup = changes.broadcaster.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                wakeup.clear()
+                batch = await run_in_threadpool(_db_call, changes.fetch_since, cursor)
+                for ev in batch:
+                    cursor = ev["seq"]
+                    yield f"id: {ev['seq']}\nevent: change\ndata: {json.dumps(ev)}\n\n"
+                if batch:
+                    continue
+                try:
+                    # Woken by a local commit or a NOTIFY from another worker; the timeout doubles as keepalive/gap re-check
+                    await asyncio.wait_for(wakeup.wait(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            changes.broadcaster.unsubscribe(wakeup)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/orders/{order_id}/invoice.pdf")
-def invoice(order_id: int, db: Session = Depends(get_db)):
-    o = db.get(Order, order_id)
-    if not o:
-        raise HTTPException(404, "Order not found")
-    pdf = invoice_pdf(o)
-    return Response(content=pdf, media_type="application/pdf")
+def invoice(order_id: int, request: Request, db: Session = Depends(get_read_db)):
+    etag = make_etag("inv", PDF_TEMPLATE, order_id, order_version(db, order_id))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    # Rendered once per ETag across all workers
+    pdf = cache.get_or_set(f"pdf:{etag}", lambda: invoice_pdf(db.get(Order, order_id)), settings.pdf_cache_ttl_seconds)
+    return Response(content=pdf, media_type="application/pdf", headers={"ETag": etag})
 
 @app.get("/payments/{payment_id}/receipt.pdf")
-def receipt(payment_id: int, db: Session = Depends(get_db)):
-    p = db.get(Payment, payment_id)
-    if not p:
+def receipt(payment_id: int, request: Request, db: Session = Depends(get_read_db)):
+    row = db.execute(
+        select(Payment.order_id, Order.version).join(Order, Order.id == Payment.order_id).where(Payment.id == payment_id)
+    ).first()
+    if row is None:
         raise HTTPException(404, "Payment not found")
-    o = db.get(Order, p.order_id)
-    pdf = receipt_pdf(o, p)
-    return Response(content=pdf, media_type="application/pdf")
+    etag = make_etag("rcpt", PDF_TEMPLATE, payment_id, row.version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    pdf = cache.get_or_set(
+        f"pdf:{etag}", lambda: receipt_pdf(db.get(Order, row.order_id), db.get(Payment, payment_id)), settings.pdf_cache_ttl_seconds
+    )
+    return Response(content=pdf, media_type="application/pdf", headers={"ETag": etag})
 
 @app.get("/orders/{order_id}/instalment-agreement.pdf")
-def instalment_agreement(order_id: int, db: Session = Depends(get_db)):
+def instalment_agreement(order_id: int, request: Request, db: Session = Depends(get_read_db)):
+    etag = make_etag("agr", PDF_TEMPLATE, order_id, order_version(db, order_id))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     o = db.get(Order, order_id)
-    if not o:
-        raise HTTPException(404, "Order not found")
     if o.order_type != OrderType.INSTALMENT:
         raise HTTPException(400, "Not an instalment order")
-    pdf = instalment_agreement_pdf(o)
-    return Response(content=pdf, media_type="application/pdf")
+    pdf = cache.get_or_set(f"pdf:{etag}", lambda: instalment_agreement_pdf(o), settings.pdf_cache_ttl_seconds)
+    return Response(content=pdf, media_type="application/pdf", headers={"ETag": etag})
 
 @app.get("/export/cash.xlsx")
-def export_cash(start: str, end: str, db: Session = Depends(get_db)):
-    start_dt = datetime.fromisoformat(start)
-    end_dt = datetime.fromisoformat(end)
-    rows = db.query(Payment).filter(Payment.created_at >= start_dt, Payment.created_at <= end_dt).all()
-
-    data = []
-    for p in rows:
-        if p.voided:
-            continue
-        o = db.get(Order, p.order_id)
-        data.append({
-            "date": p.created_at.date().isoformat(),
-            "order_code": o.code if o else "",
-            "customer_name": o.customer_name if o else "",
-            "amount": float(p.amount),
-            "method": p.method.value,
-            "reference": p.reference or "",
-            "parent_order": o.parent_order_id or "",
-        })
-    df = pd.DataFrame(data)
-    bio = io.BytesIO()
-    with pd.ExcelWriter(bio, engine="openpyxl") as writer:
-        df.to_excel(writer, sheet_name="cash", index=False)
-    bio.seek(0)
-    return Response(content=bio.read(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-
-
-# --- ensure DB schema minimal compatibility (no-op if already migrated)
-@app.on_event("startup")
-def bootstrap_schema():
+def export_cash(start: str, end: str, db: Session = Depends(get_read_db)):
+    df = reports.cash_frame(db, datetime.fromisoformat(start), datetime.fromisoformat(end))
+    return Response(content=to_xlsx_bytes(df, "cash"), media_type=XLSX_MEDIA_TYPE)
+
+@app.get("/export/accruals.xlsx")
+def export_accruals(as_of: Optional[str] = None, db: Session = Depends(get_read_db)):
+    """Accrued (no-prorate) billing vs payments for every ACTIVE rental/instalment as of a date."""
+    df = reports.accruals_frame(db, datetime.fromisoformat(as_of) if as_of else now_utc())
+    return Response(content=to_xlsx_bytes(df, "accruals"), media_type=XLSX_MEDIA_TYPE)
+
+# --- export jobs: large reports render in a process pool (app.exports) instead of the request worker
+@app.post("/exports", response_model=ExportJobOut, status_code=202)
+def create_export(payload: ExportRequest, response: Response, db: Session = Depends(get_db), read_db: Session = Depends(get_read_db)):
     try:
-        # local imports to avoid hard module deps at import time
-        from sqlalchemy import inspect, text
-        from .db import engine
-        with engine.begin() as conn:
-            insp = inspect(conn)
-            try:
-                cols = {c["name"] for c in insp.get_columns("orders")}
-            except Exception:
-                cols = set()
-            # add orders.code if missing
-            if "code" not in cols:
-                conn.execute(text('ALTER TABLE orders ADD COLUMN code VARCHAR(50)'))
-                # non-unique index is fine; unique can be added later when data is clean
-                conn.execute(text('CREATE INDEX IF NOT EXISTS ix_orders_code ON orders(code)'))
-    except Exception as e:
-        # don’t crash app if DB lacks perms; just log
-        print(f"bootstrap_schema warn: {e}")
+        # Version the job by the seq of the database the report will be read from
+        job = exports.enqueue(db, payload.report, payload.params, data_seq=changes.latest_seq(read_db))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if job.status == "done":
+        response.status_code = 200
+    response.headers["Location"] = f"/exports/{job.id}"
+    return exports.job_to_dict(job)
+
+@app.get("/exports/{export_id}", response_model=ExportJobOut, responses={200: {"content": {XLSX_MEDIA_TYPE: {}}}, 202: {"model": ExportJobOut}})
+def get_export(export_id: int, db: Session = Depends(get_db)):
+    job = db.get(ExportJob, export_id)
+    if not job:
+        raise HTTPException(404, "Export not found")
+    if job.status == "done":
+        if not job.file_path or not os.path.exists(job.file_path):
+            raise HTTPException(410, "Export file no longer available; request it again")
+        return FileResponse(job.file_path, media_type=XLSX_MEDIA_TYPE, filename=job.filename)
+    return JSONResponse(status_code=500 if job.status == "error" else 202, content=exports.job_to_dict(job))
+
+@app.on_event("startup")
+def start_parse_workers():
+    if settings.parse_workers > 0:
+        app.state.parse_workers_stop = parse_jobs.start_workers(settings.parse_workers)
+
+@app.on_event("shutdown")
+def stop_parse_workers():
+    stop = getattr(app.state, "parse_workers_stop", None)
+    if stop is not None:
+        stop.set()
+
+@app.on_event("shutdown")
+def stop_export_pool():
+    exports.shutdown_pool()
+
+@app.on_event("startup")
+def start_change_listener():
+    if engine.dialect.name == "postgresql":
+        app.state.change_listener_stop = threading.Event()
+        changes.start_pg_listener(engine, app.state.change_listener_stop)
+
+@app.on_event("shutdown")
+def stop_change_listener():
+    stop = getattr(app.state, "change_listener_stop", None)
+    if stop is not None:
+        stop.set()
+
+# --- schema check: workers never migrate; `python scripts/migrate.py` runs once per deploy
+@app.on_event("startup")
+def check_schema_version():
+    app.state.schema = schema_state(engine)
+    if not app.state.schema["ready"]:
+        print(f"schema warn: database at {app.state.schema['current']}, build expects {app.state.schema['expected']}")
+
+@app.get("/ready")
+def ready(response: Response):
+    state = schema_state(engine)
+    app.state.schema = state
+    if not state["ready"]:
+        response.status_code = 503
+    return state
@@ -1,8 +1,9 @@
 import hashlib
+from typing import List, Optional
 import sqlalchemy as sa
 from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert
-from app.models import Message
+from app.models import Message, parsed_field
 
 def sha256_text(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
@@ -34,4 +35,28 @@ def upsert_message(db, sha: str, text: str, parsed_dict):
             msg.text = text
         db.commit()
         db.refresh(msg)
-    return msg
\ No newline at end of file
+    return msg
+
+def save_parsed(db, sha: str, text: str, parsed_dict) -> Message:
+    """Portable (Postgres/SQLite) store of a parse result: backfills an existing row or inserts a new one. Commits."""
+    msg = get_message_by_sha(db, sha)
+    if msg is None:
+        msg = Message(sha256=sha, text=text)
+        db.add(msg)
+    if msg.archived_at is not None or msg.compacted_at is not None:
+        # Re-parsed because its archived payload is gone: the row is hot again
+        msg.text, msg.payload_z, msg.compacted_at, msg.archived_at, msg.archive_path = text, None, None, None, None
+    msg.parsed_json = parsed_dict
+    if not msg.text:
+        msg.text = text
+    db.commit()
+    return msg
+
+def find_messages(db, phone: Optional[str] = None, order_code: Optional[str] = None, limit: int = 200) -> List[Message]:
+    """Historical messages by extracted field; filters run in SQL on the parsed_json expression indexes."""
+    stmt = select(Message)
+    if phone:
+        stmt = stmt.where(parsed_field("phone") == phone)
+    if order_code:
+        stmt = stmt.where(parsed_field("order_code") == order_code)
+    return db.execute(stmt.order_by(Message.id.desc()).limit(limit)).scalars().all()
@@ -0,0 +1,98 @@
+import hmac
+import time
+from urllib.parse import parse_qsl, urlencode
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import profiling
+
+# Streaming endpoints must not be gzipped: the compressor buffers small SSE events instead of flushing them
+NO_COMPRESS_PREFIXES = ("/changes/stream",)
+
+class CompressionMiddleware:
+    """GZip responses above a size threshold (when the client accepts it), except streaming endpoints."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 5) -> None:
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=compresslevel)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith(NO_COMPRESS_PREFIXES):
+            await self.app(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
+
+class ReadYourWritesMiddleware:
+    """After a successful mutating request, set a short-lived cookie that pins the client's reads to the primary
+    (see app.db.get_read_db) until the replica has had time to catch up."""
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, app: ASGIApp, cookie_name: str, max_age: int) -> None:
+        self.app = app
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in self.SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = MutableHeaders(scope=message)
+                headers.append("set-cookie", f"{self.cookie_name}={time.time():.3f}; Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=Lax")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+class ProfileMiddleware:
+    """Profile one request on demand: `X-Profile: <PROFILE_TOKEN>` (or `?_profile=<PROFILE_TOKEN>`) runs it under
+    app.profiling and answers with X-Profile-Id / X-Profile-Url headers. Every other request only pays for the
+    header lookup; without PROFILE_TOKEN the middleware is not installed at all."""
+
+    QUERY_FLAG = "_profile"
+
+    def __init__(self, app: ASGIApp, token: str, directory: str, interval_ms: float = 5, keep: int = 200) -> None:
+        self.app = app
+        self.token = token.encode()
+        self.directory = directory
+        self.interval = interval_ms / 1000.0
+        self.keep = keep
+
+    def _triggered(self, scope: Scope) -> bool:
+        for key, value in scope["headers"]:
+            if key == b"x-profile":
+                return hmac.compare_digest(value, self.token)
+        qs = scope.get("query_string", b"")
+        if b"_profile=" in qs:
+            values = [v for k, v in parse_qsl(qs.decode("latin-1")) if k == self.QUERY_FLAG]
+            return any(hmac.compare_digest(v.encode("latin-1"), self.token) for v in values)
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/debug/profiles") or not self._triggered(scope):
+            await self.app(scope, receive, send)
+            return
+
+        query = urlencode([(k, v) for k, v in parse_qsl(scope.get("query_string", b"").decode("latin-1")) if k != self.QUERY_FLAG])
+        run = profiling.Profile(scope["method"], scope["path"], query, self.interval)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                run.status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("x-profile-id", run.id)
+                headers.append("x-profile-url", f"/debug/profiles/{run.id}")
+            await send(message)
+
+        ctx = profiling.current.set(run)
+        run.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            run.stop()
+            profiling.current.reset(ctx)
+            await run_in_threadpool(profiling.save, run, self.directory, self.keep)
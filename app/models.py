@@ -1,8 +1,9 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Enum, ForeignKey, Numeric, Text, Boolean
+    Column, Integer, String, Date, DateTime, Enum, ForeignKey, Numeric, Text, Boolean, JSON, Index, LargeBinary
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from datetime import datetime
+from datetime import date, datetime
 import enum
 from .db import Base
 
@@ -33,6 +34,16 @@ class PaymentMethod(str, enum.Enum):
     CARD = "CARD"
     OTHER = "OTHER"
 
+class Customer(Base):
+    """One row per normalized phone (E.164); orders link here instead of matching free-text name/phone."""
+    __tablename__ = "customers"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    phone_e164: Mapped[str] = mapped_column(String(20), unique=True, index=True)
+    name: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
 class Order(Base):
     __tablename__ = "orders"
 
@@ -41,11 +52,14 @@ class Order(Base):
     parent_order_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("orders.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Bumped on any change to the order, its items, payments or adjustment children (see changes.record); drives ETags
+    version: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
 
     order_type: Mapped[OrderType] = mapped_column(Enum(OrderType), default=OrderType.OUTRIGHT, index=True)
     event_type: Mapped[EventType] = mapped_column(Enum(EventType), default=EventType.DELIVERY, index=True)
     status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), default=OrderStatus.ACTIVE, index=True)
 
+    customer_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("customers.id"), nullable=True, index=True)
     customer_name: Mapped[str] = mapped_column(String(200))
     phone: Mapped[str | None] = mapped_column(String(64), nullable=True)
     address: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -99,7 +113,7 @@ class Payment(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     amount: Mapped[float] = mapped_column(Numeric(12, 2))
     method: Mapped[PaymentMethod] = mapped_column(Enum(PaymentMethod), default=PaymentMethod.CASH)
-    reference: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    reference: Mapped[str | None] = mapped_column(String(128), nullable=True, index=True)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     voided: Mapped[bool] = mapped_column(Boolean, default=False)
     void_reason: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -112,8 +126,122 @@ class Message(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     sha256: Mapped[str] = mapped_column(String(64), unique=True, index=True)
-    text: Mapped[str] = mapped_column(Text)
-    parsed_json: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # NULL once compacted/archived by app.retention; parsed_json then keeps only the indexed fields
+    text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    parsed_json: Mapped[dict | None] = mapped_column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     order_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("orders.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    payload_z: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    compacted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    archive_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+def parsed_field(key: str):
+    """parsed_json ->> key as text. The key is rendered inline so queries match the expression indexes below."""
+    expr = Message.parsed_json[key].as_string()
+    expr.right.literal_execute = True
+    return expr
+
+Index("ix_messages_parsed_phone", parsed_field("phone"))
+Index("ix_messages_parsed_order_code", parsed_field("order_code"))
+
+class ParseJob(Base):
+    """Queued LLM parse; drained by app.parse_jobs workers (in-process or scripts/parse_worker.py)."""
+    __tablename__ = "parse_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), index=True)
+    text: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(16), default="queued", index=True)  # queued | running | done | error
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    message_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("messages.id"), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
+class ExportJob(Base):
+    """Report export run in the app.exports process pool; identical recent requests reuse the same row/file."""
+    __tablename__ = "export_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    report: Mapped[str] = mapped_column(String(32))
+    params: Mapped[str] = mapped_column(Text)  # canonical JSON
+    # sha1 of report + params + change-feed seq at enqueue: equal hashes mean identical output
+    params_hash: Mapped[str] = mapped_column(String(40), index=True)
+    status: Mapped[str] = mapped_column(String(16), default="queued")  # queued | running | done | error
+    file_path: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    filename: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    size: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class IdempotencyKey(Base):
+    """Stored response for an Idempotency-Key, written in the same transaction as the request's own rows."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (Index("ux_idempotency_keys_key_endpoint", "key", "endpoint", unique=True),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    key: Mapped[str] = mapped_column(String(128))
+    endpoint: Mapped[str] = mapped_column(String(128))
+    request_hash: Mapped[str] = mapped_column(String(64))
+    response_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    response_body: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+class ChangeEvent(Base):
+    """Append-only change feed for orders/payments; seq is the resume cursor for /changes/stream."""
+    __tablename__ = "change_events"
+
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    action: Mapped[str] = mapped_column(String(32))  # order.created | order.updated | order.adjusted | payment.created | payment.voided | orders.imported
+    order_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+    payment_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    data: Mapped[str | None] = mapped_column(Text, nullable=True)  # small JSON payload
+
+class OrderBalance(Base):
+    """Materialized per-order ledger, maintained incrementally by app.ledger."""
+    __tablename__ = "order_balances"
+
+    order_id: Mapped[int] = mapped_column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), primary_key=True)
+    payments_total: Mapped[float] = mapped_column(Numeric(12, 2), default=0)  # non-void payments
+    adjustments_total: Mapped[float] = mapped_column(Numeric(12, 2), default=0)  # sum of direct child totals
+    # Accrual anchors (copied from the order so reads never need to touch payments/children)
+    rental_start_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    instalment_start_date: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Next unpaid monthly due date for ACTIVE rentals/instalments (NULL when nothing is due)
+    next_due_date: Mapped[date | None] = mapped_column(Date, nullable=True, index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# --- daily rollups for GET /dashboard, maintained incrementally by app.rollups (scripts/rebuild_rollups.py backfills)
+
+class DailySales(Base):
+    """Orders booked per day (orders.created_at) and order type; revenue is the sum of order totals."""
+    __tablename__ = "daily_sales"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    order_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    orders: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(Numeric(14, 2), default=0)
+
+class DailyCollections(Base):
+    """Non-void payments per day (payments.created_at) and method."""
+    __tablename__ = "daily_collections"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    method: Mapped[str] = mapped_column(String(32), primary_key=True)
+    payments: Mapped[int] = mapped_column(Integer, default=0)
+    amount: Mapped[float] = mapped_column(Numeric(14, 2), default=0)
+
+class DailyBook(Base):
+    """Day-over-day change in the active rental count and the instalment book (contract value of ACTIVE
+    instalment orders); the level on a day is the running sum up to it."""
+    __tablename__ = "daily_book"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    active_rentals_delta: Mapped[int] = mapped_column(Integer, default=0)
+    instalment_book_delta: Mapped[float] = mapped_column(Numeric(14, 2), default=0)
@@ -0,0 +1,140 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .db import SessionLocal
+from .models import ParseJob, Message
+from .retention import load_parsed, has_payload
+from .message_store import sha256_text, get_message_by_sha, save_parsed
+from .parsing import parse_text, normalize_parsed, is_degraded, breaker
+
+settings = get_settings()
+
+# Claims on SQLite are serialized in-process (no SKIP LOCKED); the conditional UPDATE keeps them safe across processes too
+_claim_lock = threading.Lock()
+# Wakes in-process workers as soon as a job is enqueued instead of waiting for the next poll
+_wakeup = threading.Event()
+
+def enqueue(db: Session, text: str) -> ParseJob:
+    sha = sha256_text(text)
+    # Identical text already waiting or running: hand back that job instead of parsing twice
+    job = db.execute(
+        select(ParseJob).where(ParseJob.sha256 == sha, ParseJob.status.in_(["queued", "running"])).order_by(ParseJob.id)
+    ).scalars().first()
+    if job is not None:
+        return job
+    job = ParseJob(sha256=sha, text=text, status="queued")
+    msg = get_message_by_sha(db, sha)
+    if msg is not None and msg.parsed_json is not None and has_payload(msg):
+        # Cache hit: complete immediately, no LLM call
+        job.status, job.message_id, job.finished_at = "done", msg.id, datetime.utcnow()
+    db.add(job); db.commit(); db.refresh(job)
+    if job.status == "queued":
+        _wakeup.set()
+    return job
+
+def _claimable():
+    stale = datetime.utcnow() - timedelta(seconds=settings.parse_job_timeout_seconds)
+    return or_(
+        ParseJob.status == "queued",
+        # A worker died mid-job: let another one retry it
+        and_(ParseJob.status == "running", ParseJob.started_at < stale),
+    )
+
+def claim_next(db: Session) -> Optional[ParseJob]:
+    if db.bind.dialect.name == "postgresql":
+        job = db.execute(
+            select(ParseJob).where(_claimable()).order_by(ParseJob.id).limit(1).with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+        if job is None:
+            db.rollback()
+            return None
+        job.status, job.started_at, job.attempts = "running", datetime.utcnow(), (job.attempts or 0) + 1
+        db.commit()
+        return job
+
+    with _claim_lock:
+        job_id = db.execute(select(ParseJob.id).where(_claimable()).order_by(ParseJob.id).limit(1)).scalar_one_or_none()
+        if job_id is None:
+            db.rollback()
+            return None
+        res = db.execute(
+            update(ParseJob)
+            .where(ParseJob.id == job_id, _claimable())
+            .values(status="running", started_at=datetime.utcnow(), attempts=ParseJob.attempts + 1)
+        )
+        db.commit()
+    if res.rowcount != 1:
+        return None  # claimed by another process between the select and the update
+    return db.get(ParseJob, job_id)
+
+def process(db: Session, job: ParseJob) -> None:
+    try:
+        msg = get_message_by_sha(db, job.sha256)
+        if msg is None or msg.parsed_json is None or not has_payload(msg):
+            parsed = normalize_parsed(parse_text(job.text))
+            if is_degraded(parsed):
+                raise RuntimeError(parsed["notes"])
+            msg = save_parsed(db, job.sha256, job.text, parsed)
+        job.status, job.message_id, job.error = "done", msg.id, None
+    except Exception as e:
+        db.rollback()
+        job.status = "queued" if job.attempts < settings.parse_job_max_attempts else "error"
+        job.error = str(e)
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+def work_once() -> bool:
+    """Claim and run one job. Returns False when the queue is empty."""
+    db = SessionLocal()
+    try:
+        job = claim_next(db)
+        if job is None:
+            return False
+        process(db, job)
+        return True
+    finally:
+        db.close()
+
+def _worker_loop(stop: threading.Event, poll_seconds: float):
+    while not stop.is_set():
+        # Upstream is down, or a half-open probe is already in flight: leave jobs queued (attempts untouched)
+        # until the breaker would admit the call, instead of claiming them only to fail with CircuitOpenError
+        if not breaker.admits():
+            stop.wait(breaker.retry_after() or poll_seconds)
+            continue
+        try:
+            busy = work_once()
+        except Exception as e:
+            print(f"parse worker warn: {e}")
+            busy = False
+        if not busy:
+            _wakeup.wait(poll_seconds)
+            _wakeup.clear()
+
+def start_workers(n: int, poll_seconds: float = 1.0) -> threading.Event:
+    """Start n daemon worker threads (bounded concurrency towards the LLM). Set the returned event to stop them."""
+    stop = threading.Event()
+    for i in range(n):
+        threading.Thread(target=_worker_loop, args=(stop, poll_seconds), name=f"parse-worker-{i}", daemon=True).start()
+    return stop
+
+def job_result(db: Session, job: ParseJob) -> dict:
+    out = {"id": job.id, "status": job.status, "attempts": job.attempts, "error": job.error, "result": None}
+    if job.status == "done" and job.message_id:
+        msg = db.get(Message, job.message_id)
+        if msg is not None and msg.parsed_json is not None:
+            out["result"] = load_parsed(msg)
+    return out
+
+def get_job(job_id: int) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        job = db.get(ParseJob, job_id)
+        return job_result(db, job) if job is not None else None
+    finally:
+        db.close()
@@ -1,7 +1,18 @@
-﻿from typing import Dict, Any, List
+﻿from typing import Dict, Any, List, Optional, Callable, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from .config import get_settings
+from .products import map_product
+from .breaker import CircuitBreaker, CircuitOpenError
 from openai import OpenAI
+import openai
+import abc
+import copy
+import hashlib
 import json
+import os
+import queue
+import threading
+import time
 
 settings = get_settings()
 
@@ -70,57 +81,330 @@ Rules:
 - If exact SKU is unknown, set sku null and keep the text in 'text' and 'name'.
 - Use numbers only (no 'RM' string)."""
 
-def parse_message(text: str) -> Dict[str, Any]:
-    client = OpenAI(api_key=settings.openai_api_key)
-    model = settings.openai_model or "gpt-4o-mini"
+# Upstream trouble (timeouts, connection errors, 429 and 5xx): counted by the breaker, never retried on the fallback path
+UPSTREAM_ERRORS = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError, TimeoutError)
+PARSE_ERROR_PREFIX = "parse_error: "
 
-    prompt = [
-        {
-            "role": "system",
-            "content": SYSTEM_PROMPT
-        },
-        {
-            "role": "user",
-            "content": text
-        }
-    ]
+breaker = CircuitBreaker("openai", settings.openai_breaker_threshold, settings.openai_breaker_reset_seconds)
 
-    try:
+class LLMBackend(abc.ABC):
+    """Turns one extraction prompt into the model's raw JSON text. Selected with LLM_BACKEND (see build_backend)."""
+
+    name = "base"
+
+    def __init__(self):
+        self.calls = 0
+
+    @abc.abstractmethod
+    def complete(self, model: str, prompt: List[Dict[str, str]], schema: Dict[str, Any], budget: float) -> str:
+        """The model's raw JSON text for `prompt`, within `budget` seconds."""
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def _client(self) -> OpenAI:
+        # The SDK's own retries would multiply the latency budget; the breaker decides when to try again
+        return OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None,
+                      timeout=settings.openai_timeout_seconds, max_retries=0)
+
+    def complete(self, model, prompt, schema, budget):
+        self.calls += 1
+        client = self._client()
+        deadline = time.monotonic() + budget
         # Prefer Responses API with JSON Schema if available
-        response = None
         try:
             response = client.responses.create(
                 model=model,
                 input=prompt,
                 response_format={
                     "type": "json_schema",
-                    "json_schema": OMS_SCHEMA
-                }
+                    "json_schema": schema
+                },
+                timeout=budget,
             )
-            content = response.output[0].content[0].text  # type: ignore
+            return response.output[0].content[0].text  # type: ignore
+        except UPSTREAM_ERRORS:
+            raise
         except Exception:
-            # Fallback to chat.completions with "JSON" mode (best-effort)
+            # Fallback to chat.completions with "JSON" mode (best-effort), on whatever is left of the budget
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"latency budget of {budget:g}s exhausted")
             chat = client.chat.completions.create(
                 model=model,
                 messages=prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                timeout=remaining,
             )
-            content = chat.choices[0].message.content  # type: ignore
+            return chat.choices[0].message.content  # type: ignore
+
+class FixtureStore:
+    """Recorded request/response pairs, one JSON file per request under LLM_FIXTURE_DIR. The key covers the model,
+    the full prompt and the schema name, so editing SYSTEM_PROMPT invalidates old recordings."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def key(model: str, prompt: List[Dict[str, str]], schema: Dict[str, Any]) -> str:
+        raw = json.dumps({"model": model, "messages": prompt, "schema": schema["name"]}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, f"{key}.json"), encoding="utf-8") as f:
+                return json.load(f)["content"]
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, model: str, prompt: List[Dict[str, str]], schema: Dict[str, Any], content: str) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f"{key}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"key": key, "model": model, "schema": schema["name"], "input": prompt[-1]["content"],
+                       "content": content}, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
+
+class RecordingBackend(LLMBackend):
+    """Passes calls to `inner` and saves every answer to the fixture store."""
+
+    name = "record"
+
+    def __init__(self, inner: LLMBackend, store: FixtureStore):
+        super().__init__()
+        self.inner, self.store = inner, store
+
+    def complete(self, model, prompt, schema, budget):
+        self.calls += 1
+        content = self.inner.complete(model, prompt, schema, budget)
+        self.store.put(FixtureStore.key(model, prompt, schema), model, prompt, schema, content)
+        return content
+
+class ReplayBackend(LLMBackend):
+    """Answers from the fixture store after `latency` seconds, with no network. A batch request with no recording of
+    its own is assembled from the single-message recordings, so replay stays deterministic under micro-batching."""
+
+    name = "replay"
+
+    def __init__(self, store: FixtureStore, latency: float = 0.0):
+        super().__init__()
+        self.store, self.latency = store, latency
+
+    def complete(self, model, prompt, schema, budget):
+        self.calls += 1
+        if self.latency > budget:
+            time.sleep(budget)
+            raise TimeoutError(f"replay latency {self.latency:g}s over the {budget:g}s budget")
+        time.sleep(self.latency)
+        content = self.store.get(FixtureStore.key(model, prompt, schema))
+        if content is None and schema["name"] == BATCH_SCHEMA["name"]:
+            results = []
+            for m in json.loads(prompt[-1]["content"]):
+                single = self.store.get(FixtureStore.key(model, _single_prompt(m["text"]), OMS_SCHEMA))
+                if single is not None:
+                    results.append({"index": m["index"], "order": json.loads(single)})
+            content = json.dumps({"results": results}, ensure_ascii=False)
+        if content is None:
+            raise LookupError(f"no recorded LLM response for {prompt[-1]['content'][:60]!r}")
+        return content
+
+def build_backend() -> LLMBackend:
+    kind = (settings.llm_backend or "openai").lower()
+    store = FixtureStore(settings.llm_fixture_dir)
+    if kind == "replay":
+        return ReplayBackend(store, settings.llm_replay_latency_ms / 1000.0)
+    if kind == "record":
+        return RecordingBackend(OpenAIBackend(), store)
+    return OpenAIBackend()
+
+backend = build_backend()
+
+def _complete(model: str, prompt: List[Dict[str, str]], schema: Dict[str, Any], budget: float) -> Any:
+    """One extraction call through the configured backend within `budget` seconds, including the chat fallback.
+    Raises CircuitOpenError without calling out while the breaker is open."""
+    breaker.before_call()
+    try:
+        content = backend.complete(model, prompt, schema, budget)
+    except UPSTREAM_ERRORS as e:
+        breaker.record_failure(e)
+        raise
+    except Exception:
+        # Anything else (a 4xx, a bad request shape) still means the upstream answered
+        breaker.record_success()
+        raise
+    breaker.record_success()
+    return json.loads(content)
+
+def degraded(error: BaseException) -> Dict[str, Any]:
+    """Best-effort minimal object returned when extraction fails; never cached (see is_degraded)."""
+    return {"event_type": "DELIVERY", "items": [], "notes": f"{PARSE_ERROR_PREFIX}{error}"}
+
+def is_degraded(parsed: Dict[str, Any]) -> bool:
+    return str(parsed.get("notes") or "").startswith(PARSE_ERROR_PREFIX) and not parsed.get("items")
+
+def _fix_items(data: Dict[str, Any]) -> Dict[str, Any]:
+    # --- normalize when fallback path doesn't enforce schema
+    items = data.get("items")
+    if not isinstance(items, list):
+        items = []
+    for it in items:
+        if not it.get("text"):
+            it["text"] = it.get("name") or ""
+    data["items"] = items
+    return data
+
+def _single_prompt(text: str) -> List[Dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": text
+        }
+    ]
+
+def parse_message(text: str) -> Dict[str, Any]:
+    model = settings.openai_model or "gpt-4o-mini"
+    try:
+        return _fix_items(_complete(model, _single_prompt(text), OMS_SCHEMA, settings.openai_timeout_seconds))
+    except Exception as e:
+        return degraded(e)
+
+# Batched extraction: one request carries N messages, so the prompt and schema are paid once per batch
+BATCH_SCHEMA = {
+    "name": "oms_batch_schema",
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "order": OMS_SCHEMA["schema"]
+                    },
+                    "required": ["index", "order"]
+                }
+            }
+        },
+        "required": ["results"]
+    }
+}
 
-        data = json.loads(content)
+BATCH_PROMPT = SYSTEM_PROMPT + """
+Batch mode: the user message is a JSON array of {"index": n, "text": "..."} WhatsApp messages.
+Parse every message independently and return {"results": [{"index": n, "order": {...}}, ...]} with exactly one result per index."""
 
-        # --- normalize when fallback path doesn''t enforce schema
-        items = data.get("items")
-        if not isinstance(items, list):
-            items = []
-        for it in items:
-            if not it.get("text"):
-                it["text"] = it.get("name") or ""
-        data["items"] = items
+def _valid_order(order: Any) -> bool:
+    return isinstance(order, dict) and isinstance(order.get("event_type"), str) and isinstance(order.get("items"), list)
 
-        return data
+def parse_messages_batch(texts: List[str]) -> List[Dict[str, Any]]:
+    """Parse several messages in one LLM request. Results come back in input order; any message the batch answer
+    leaves out or garbles is retried on its own with parse_message. If the upstream is down (or the breaker open),
+    every message comes back degraded at once rather than being retried one by one."""
+    if len(texts) <= 1:
+        return [parse_message(t) for t in texts]
+    model = settings.openai_model or "gpt-4o-mini"
+    prompt = [
+        {"role": "system", "content": BATCH_PROMPT},
+        {"role": "user", "content": json.dumps([{"index": i, "text": t} for i, t in enumerate(texts)], ensure_ascii=False)},
+    ]
+    out: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    try:
+        results = _complete(model, prompt, BATCH_SCHEMA, settings.openai_batch_timeout_seconds).get("results")
+        for r in results if isinstance(results, list) else []:
+            idx = r.get("index") if isinstance(r, dict) else None
+            if isinstance(idx, int) and 0 <= idx < len(texts) and out[idx] is None and _valid_order(r.get("order")):
+                out[idx] = _fix_items(r["order"])
+    except (CircuitOpenError,) + UPSTREAM_ERRORS as e:
+        return [degraded(e) for _ in texts]
     except Exception as e:
-        # Return a best-effort minimal object
-        return {"event_type": "DELIVERY", "items": [], "notes": f"parse_error: {e}"}
+        print(f"batch parse warn: {e}")
+    return [o if o is not None else parse_message(texts[i]) for i, o in enumerate(out)]
+
+class MicroBatcher:
+    """Collects concurrent parse() calls for up to `window` seconds (or `max_size` messages) and sends them as one
+    parse_messages_batch request. Identical texts in a window share a slot. Callers block until their result is in."""
+
+    def __init__(self, fn: Callable[[List[str]], List[Any]], window: float, max_size: int, max_inflight: int = 4):
+        self.fn, self.window, self.max_size = fn, window, max(1, max_size)
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="parse-batch")
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, text: str) -> Future:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="parse-batcher", daemon=True)
+                self._thread.start()
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def parse(self, text: str) -> Any:
+        return self.submit(text).result()
+
+    def _collect(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # The LLM call runs on the pool so the next window opens while this batch is in flight
+            self._pool.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[str, Future]]) -> None:
+        texts = list(dict.fromkeys(t for t, _ in batch))
+        try:
+            by_text = dict(zip(texts, self.fn(texts)))
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+            return
+        for t, fut in batch:
+            # Each caller gets its own copy: normalize_parsed mutates the dict in place
+            fut.set_result(copy.deepcopy(by_text[t]))
+
+batcher = MicroBatcher(parse_messages_batch, settings.parse_batch_window_ms / 1000.0, settings.parse_batch_max_size)
+
+def parse_text(text: str) -> Dict[str, Any]:
+    """Parse one message, going through the micro-batcher when PARSE_BATCH_WINDOW_MS is set."""
+    if settings.parse_batch_window_ms <= 0 or settings.parse_batch_max_size <= 1:
+        return parse_message(text)
+    return batcher.parse(text)
 
+def normalize_parsed(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """Safe item defaults plus SKU mapping, applied to every LLM result before it is stored."""
+    items = parsed.get("items", []) or []
+    for item in items:
+        if item.get("text") is None:
+            item["text"] = item.get("name") or ""
+        if item.get("item_type") is None:
+            item["item_type"] = "OUTRIGHT"
+        if item.get("line_total") is None and item.get("qty") is not None and item.get("unit_price") is not None:
+            try:
+                item["line_total"] = float(item["qty"]) * float(item["unit_price"])
+            except Exception:
+                pass
+    parsed["items"] = items
 
+    # Map SKUs
+    for item in parsed.get("items", []):
+        mapped = map_product(item.get("text", "") or item.get("name", ""))
+        if not item.get("sku") and mapped.get("sku"):
+            item["sku"] = mapped["sku"]
+        if not item.get("name") and mapped.get("name"):
+            item["name"] = mapped["name"]
+    return parsed
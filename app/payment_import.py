@@ -0,0 +1,110 @@
+"""Bulk payment import for bank-statement / TNG settlement reconciliation (POST /payments/import).
+
+Rows come from CSV (header: order_code, amount, method, reference, notes, date) or a JSON list of the same keys.
+Everything is checked up front with set-based queries (one IN for order codes, one IN for existing references),
+then the valid rows go in with one bulk INSERT, one batched ledger update and one batch of change events.
+"""
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+
+from .models import Order, Payment, PaymentMethod
+from . import ledger, changes, rollups
+
+FIELDS = ("order_code", "amount", "method", "reference", "notes", "date")
+
+def parse_csv(raw: bytes) -> List[Dict]:
+    text = raw.decode("utf-8-sig")  # Excel exports carry a BOM
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames is None:
+        return []
+    reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames]
+    return [{k: (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k in FIELDS} for row in reader]
+
+def parse_amount(v) -> Decimal:
+    """A positive amount with at most 2 decimals ("RM 1,200.50" -> Decimal("1200.50")); ValueError otherwise."""
+    s = str(v if v is not None else "").replace(",", "").strip()
+    if s.upper().startswith("RM"):
+        s = s[2:].strip()
+    try:
+        d = Decimal(s)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {v!r}")
+    if not d.is_finite() or d <= 0:
+        raise ValueError(f"amount must be positive, got {v!r}")
+    if d != d.quantize(Decimal("0.01")):
+        raise ValueError(f"amount has more than 2 decimals: {v!r}")
+    return d
+
+def parse_method(v, default: PaymentMethod) -> PaymentMethod:
+    """PaymentMethod from a case-insensitive name; `default` when blank, ValueError when unknown."""
+    if v is None or str(v).strip() == "":
+        return default
+    try:
+        return PaymentMethod(str(v).strip().upper())
+    except ValueError:
+        raise ValueError(f"unknown method {v!r}; expected one of {', '.join(m.value for m in PaymentMethod)}")
+
+def import_payments(db: Session, rows: List[Dict], default_method: PaymentMethod = PaymentMethod.TRANSFER,
+                    dry_run: bool = False) -> Dict:
+    """Validate and insert rows in the caller's transaction (the caller commits). Returns the per-row report."""
+    report: List[Dict] = [{"row": i + 1, "order_code": (r.get("order_code") or None), "reference": (r.get("reference") or None)}
+                          for i, r in enumerate(rows)]
+
+    codes = {str(r.get("order_code")).strip() for r in rows if r.get("order_code")}
+    orders = {o.code: o for o in db.execute(select(Order).where(Order.code.in_(codes))).scalars()} if codes else {}
+    refs = {str(r.get("reference")).strip() for r in rows if r.get("reference")}
+    seen_refs = set(db.execute(
+        select(Payment.reference).where(Payment.reference.in_(refs), Payment.voided == False)
+    ).scalars()) if refs else set()
+
+    now = datetime.utcnow()
+    valid = []  # (report entry, payment values)
+    for entry, r in zip(report, rows):
+        try:
+            code = entry["order_code"] = str(r.get("order_code") or "").strip() or None
+            if not code:
+                raise ValueError("order_code is required")
+            order = orders.get(code)
+            if order is None:
+                raise ValueError(f"unknown order_code {code!r}")
+            amount = parse_amount(r.get("amount"))
+            method = parse_method(r.get("method"), default_method)
+            ref = entry["reference"] = str(r.get("reference") or "").strip() or None
+            created_at = datetime.fromisoformat(str(r["date"]).strip()) if r.get("date") else now
+        except ValueError as e:
+            entry.update(status="error", error=str(e))
+            continue
+        if ref is not None and ref in seen_refs:
+            entry.update(status="duplicate", error="reference already recorded")
+            continue
+        if ref is not None:
+            seen_refs.add(ref)  # also catches repeats within this file
+        entry.update(status="ok", amount=float(amount), method=method.value)
+        valid.append((entry, {"order_id": order.id, "amount": amount, "method": method, "reference": ref,
+                              "notes": (r.get("notes") or None), "created_at": created_at, "voided": False}))
+
+    if valid and not dry_run:
+        ids = db.execute(
+            insert(Payment).returning(Payment.id, sort_by_parameter_order=True), [v for _, v in valid]
+        ).scalars().all()
+        deltas: Dict[int, float] = {}
+        for (entry, v), pid in zip(valid, ids):
+            entry.update(status="imported", payment_id=pid)
+            deltas[v["order_id"]] = deltas.get(v["order_id"], 0.0) + float(v["amount"])
+        touched = [o for o in orders.values() if o.id in deltas]
+        ledger.apply_payments_many(db, touched, deltas)
+        rollups.payments_changed(db, [(v["created_at"], v["method"], v["amount"]) for _, v in valid])
+        changes.record_many(db, "payment.created", [
+            (v["order_id"], pid, {"amount": float(v["amount"]), "method": v["method"].value, "source": "import"})
+            for (_, v), pid in zip(valid, ids)
+        ])
+
+    counts: Dict[str, int] = {}
+    for entry in report:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return {"dry_run": dry_run, "total": len(rows), "counts": counts, "rows": report}
@@ -1,89 +1,203 @@
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.lib.units import mm
 from io import BytesIO
-from typing import List
+from typing import Callable, Iterable, List, Tuple
 from .models import Order, OrderItem, Payment
 from datetime import datetime
 
-def _header(c, title: str):
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(20*mm, 280*mm, title)
-    c.setFont("Helvetica", 10)
-    c.drawString(20*mm, 274*mm, "Katil-Hospital.my | AA Alive Sdn Bhd (MDA-registered)")
-    c.drawString(20*mm, 269*mm, "Tel/WhatsApp: +6011 2868 6592 | contact@evin2u.com")
+# Streams are already zlib-compressed; ASCII85 on top only makes them 25% bigger and costs most of the save time
+rl_config.useA85 = 0
 
-def _label_value(c, x, y, label, value):
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(x, y, label)
-    c.setFont("Helvetica", 10)
-    c.drawString(x, y-12, value or "")
+# Part of the PDF ETags (and so of the render cache keys): bump it whenever the layout changes
+TEMPLATE_VERSION = 2
 
-def invoice_pdf(order: Order) -> bytes:
-    bio = BytesIO()
-    c = canvas.Canvas(bio, pagesize=A4)
+LEFT, RIGHT = 20*mm, 190*mm
+TABLE_Y = 200*mm          # item column headings on the first invoice page
+NEXT_TABLE_Y = 250*mm     # ... and on continuation pages
+ROW_H = 7*mm
+BOTTOM = 25*mm            # lowest baseline for rows and totals; the page footer sits below it
+ITEM_COL_W = 95*mm
 
-    _header(c, "INVOICE" if float(order.total) >= 0 else "CREDIT NOTE")
+# --- static layers: each page type's fixed text is drawn once per PDF file into a form XObject, then placed with
+# doForm on every page of that type (continuation pages, and every document of a batch). A layer that appears only
+# once in the file is cheaper drawn inline, so single-page documents skip the XObject.
 
-    _label_value(c, 20*mm, 255*mm, "Invoice No:", order.code)
-    _label_value(c, 80*mm, 255*mm, "Date:", datetime.utcnow().strftime("%Y-%m-%d"))
-    _label_value(c, 20*mm, 240*mm, "Bill To:", order.customer_name)
-    _label_value(c, 20*mm, 228*mm, "Phone:", order.phone or "")
-    _label_value(c, 20*mm, 216*mm, "Address:", (order.address or "")[:90])
+def _form(c, name: str, *parts: Callable) -> None:
+    if not getattr(c, "_share_static", False):
+        for draw in parts:
+            draw(c)
+        return
+    forms = c.__dict__.setdefault("_static_forms", set())
+    if name not in forms:
+        c.beginForm(name)
+        for draw in parts:
+            draw(c)
+        c.endForm()
+        forms.add(name)
+    c.doForm(name)
 
-    y = 200*mm
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(20*mm, y, "Item")
-    c.drawString(120*mm, y, "Qty")
-    c.drawString(140*mm, y, "Unit")
-    c.drawString(165*mm, y, "Total")
+def _slug(title: str) -> str:
+    return "".join(ch for ch in title if ch.isalnum())
+
+def _letterhead(title: str) -> Callable:
+    def draw(c):
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(20*mm, 280*mm, title)
+        c.setFont("Helvetica", 10)
+        c.drawString(20*mm, 274*mm, "Katil-Hospital.my | AA Alive Sdn Bhd (MDA-registered)")
+        c.drawString(20*mm, 269*mm, "Tel/WhatsApp: +6011 2868 6592 | contact@evin2u.com")
+    return draw
+
+def _labels(pairs: List[Tuple[float, float, str]]) -> Callable:
+    def draw(c):
+        c.setFont("Helvetica-Bold", 9)
+        for x, y, label in pairs:
+            c.drawString(x, y, label)
+    return draw
+
+INVOICE_LABELS = _labels([(20*mm, 255*mm, "Invoice No:"), (80*mm, 255*mm, "Date:"), (20*mm, 240*mm, "Bill To:"),
+                          (20*mm, 228*mm, "Phone:"), (20*mm, 216*mm, "Address:")])
+RECEIPT_LABELS = _labels([(20*mm, 255*mm, "Receipt For Invoice:"), (80*mm, 255*mm, "Receipt Date:"), (20*mm, 240*mm, "Customer:"),
+                          (20*mm, 228*mm, "Method:"), (20*mm, 216*mm, "Reference:")])
+
+def _table_head(y: float) -> Callable:
+    def draw(c):
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(20*mm, y, "Item")
+        c.drawString(120*mm, y, "Qty")
+        c.drawString(140*mm, y, "Unit")
+        c.drawString(165*mm, y, "Total")
+        c.setLineWidth(0.5)
+        c.line(LEFT, y - 2*mm, RIGHT, y - 2*mm)
+    return draw
+
+AGREEMENT_TERMS = [
+    "No proration. Payments due monthly from start date. Late/failed payments may incur penalties.",
+    "If customer cancels instalment early, a penalty may be charged and return delivery fee applies.",
+    "Company is MDA-registered (AA Alive Sdn Bhd) and provides hospital beds, wheelchairs, and oxygen concentrators.",
+]
+
+def _agreement_terms(c):
+    c.setFont("Helvetica", 11)
+    for i, ln in enumerate(AGREEMENT_TERMS):
+        c.drawString(20*mm, 250*mm - (4 + i) * 8*mm, ln)
+
+# --- variable fields
+
+def _values(c, fields: Iterable[Tuple[float, float, str]]):
     c.setFont("Helvetica", 10)
-    y -= 8*mm
-    for it in order.items:
-        c.drawString(20*mm, y, f"{it.name} [{it.sku or '-'}]")
-        c.drawRightString(135*mm, y, f"{float(it.qty):.0f}")
-        c.drawRightString(160*mm, y, f"{float(it.unit_price):.2f}")
-        c.drawRightString(190*mm, y, f"{float(it.line_total):.2f}")
-        y -= 7*mm
-        if y < 60*mm:
+    for x, y, value in fields:
+        c.drawString(x, y - 12, value or "")
+
+def _fit(text: str, width: float, font: str = "Helvetica", size: int = 10) -> str:
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + "...", font, size) > width:
+        text = text[:-1]
+    return text + "..."
+
+def _footer(c, page: int, pages: int):
+    if pages > 1:
+        c.setFont("Helvetica", 8)
+        c.drawRightString(RIGHT, 12*mm, f"Page {page} of {pages}")
+
+def _totals(order: Order) -> List[Tuple[str, float]]:
+    lines = [("Subtotal:", order.subtotal), ("Discount:", order.discount), ("Delivery Fee:", order.delivery_fee)]
+    for label, value in (("Return Delivery Fee:", order.return_delivery_fee), ("Penalty:", order.penalty_amount),
+                         ("Buyback:", order.buyback_amount)):
+        if float(value) != 0:
+            lines.append((label, value))
+    return lines
+
+def _paginate(n_items: int, n_totals: int) -> List[Tuple[int, int]]:
+    """Item ranges per page. The totals block goes under the last rows, or on a page of its own if it does not fit."""
+    totals_h = 5*mm + 6*mm * n_totals
+    pages, start, top = [], 0, TABLE_Y - 8*mm
+    while True:
+        take = min(int((top - BOTTOM) // ROW_H) + 1, n_items - start)
+        pages.append((start, start + take))
+        start += take
+        if start >= n_items:
+            if top - take * ROW_H - totals_h < BOTTOM:
+                pages.append((start, start))
+            return pages
+        top = NEXT_TABLE_Y - 8*mm
+
+def _draw_invoice(c, order: Order, today: str):
+    title = "INVOICE" if float(order.total) >= 0 else "CREDIT NOTE"
+    items: List[OrderItem] = list(order.items)
+    totals = _totals(order)
+    pages = _paginate(len(items), len(totals))
+    if len(pages) > 2:
+        c._share_static = True  # the continuation layer repeats
+    y = 0.0
+    for page, (start, end) in enumerate(pages, 1):
+        if page > 1:
             c.showPage()
-            y = 260*mm
+        if page == 1:
+            _form(c, "invoice_" + _slug(title), _letterhead(title), INVOICE_LABELS, _table_head(TABLE_Y))
+            _values(c, [(20*mm, 255*mm, order.code), (80*mm, 255*mm, today), (20*mm, 240*mm, order.customer_name),
+                        (20*mm, 228*mm, order.phone or ""), (20*mm, 216*mm, (order.address or "")[:90])])
+            y = TABLE_Y
+        else:
+            c.setFont("Helvetica-Bold", 10)
+            c.drawString(20*mm, 258*mm, f"Invoice No: {order.code} (continued)")
+            y = NEXT_TABLE_Y
+            if end > start:
+                _form(c, "invoice_next_" + _slug(title), _letterhead(title), _table_head(NEXT_TABLE_Y))
+            else:
+                _form(c, "letterhead_" + _slug(title), _letterhead(title))
+        y -= 8*mm
+        # All rows of a page go into one text object instead of a BT/ET block per cell
+        t = c.beginText()
+        t.setFont("Helvetica", 10)
+        for it in items[start:end]:
+            t.setTextOrigin(20*mm, y); t.textOut(_fit(f"{it.name} [{it.sku or '-'}]", ITEM_COL_W))
+            for x, text in ((135*mm, f"{float(it.qty):.0f}"), (160*mm, f"{float(it.unit_price):.2f}"), (190*mm, f"{float(it.line_total):.2f}")):
+                t.setTextOrigin(x - stringWidth(text, "Helvetica", 10), y); t.textOut(text)
+            y -= ROW_H
+        c.drawText(t)
+        _footer(c, page, len(pages))
 
     # Totals
     y -= 5*mm
     c.setFont("Helvetica-Bold", 10)
-    c.drawRightString(160*mm, y, "Subtotal:")
-    c.drawRightString(190*mm, y, f"{float(order.subtotal):.2f}"); y -= 6*mm
-    c.drawRightString(160*mm, y, "Discount:")
-    c.drawRightString(190*mm, y, f"{float(order.discount):.2f}"); y -= 6*mm
-    c.drawRightString(160*mm, y, "Delivery Fee:")
-    c.drawRightString(190*mm, y, f"{float(order.delivery_fee):.2f}"); y -= 6*mm
-    if float(order.return_delivery_fee) != 0:
-        c.drawRightString(160*mm, y, "Return Delivery Fee:")
-        c.drawRightString(190*mm, y, f"{float(order.return_delivery_fee):.2f}"); y -= 6*mm
-    if float(order.penalty_amount) != 0:
-        c.drawRightString(160*mm, y, "Penalty:")
-        c.drawRightString(190*mm, y, f"{float(order.penalty_amount):.2f}"); y -= 6*mm
-    if float(order.buyback_amount) != 0:
-        c.drawRightString(160*mm, y, "Buyback:")
-        c.drawRightString(190*mm, y, f"{float(order.buyback_amount):.2f}"); y -= 6*mm
+    for label, value in totals:
+        c.drawRightString(160*mm, y, label)
+        c.drawRightString(190*mm, y, f"{float(value):.2f}"); y -= 6*mm
     c.setFont("Helvetica-Bold", 12)
     c.drawRightString(160*mm, y, "TOTAL:")
     c.drawRightString(190*mm, y, f"{float(order.total):.2f}")
-
     c.showPage()
+
+def invoice_pdf(order: Order) -> bytes:
+    bio = BytesIO()
+    c = canvas.Canvas(bio, pagesize=A4)
+    _draw_invoice(c, order, datetime.utcnow().strftime("%Y-%m-%d"))
+    c.save()
+    return bio.getvalue()
+
+def invoices_pdf(orders: Iterable[Order]) -> bytes:
+    """Many invoices in one PDF (for printing runs): the static layers are stored once and shared by every page."""
+    bio = BytesIO()
+    c = canvas.Canvas(bio, pagesize=A4)
+    c._share_static = True
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+    for order in orders:
+        _draw_invoice(c, order, today)
     c.save()
     return bio.getvalue()
 
 def receipt_pdf(order: Order, payment: Payment) -> bytes:
     bio = BytesIO()
     c = canvas.Canvas(bio, pagesize=A4)
-    _header(c, "RECEIPT")
-    _label_value(c, 20*mm, 255*mm, "Receipt For Invoice:", order.code)
-    _label_value(c, 80*mm, 255*mm, "Receipt Date:", payment.created_at.strftime("%Y-%m-%d"))
-    _label_value(c, 20*mm, 240*mm, "Customer:", order.customer_name)
-    _label_value(c, 20*mm, 228*mm, "Method:", str(payment.method))
-    _label_value(c, 20*mm, 216*mm, "Reference:", payment.reference or "-")
+    _form(c, "receipt", _letterhead("RECEIPT"), RECEIPT_LABELS)
+    _values(c, [(20*mm, 255*mm, order.code), (80*mm, 255*mm, payment.created_at.strftime("%Y-%m-%d")),
+                (20*mm, 240*mm, order.customer_name), (20*mm, 228*mm, str(payment.method)),
+                (20*mm, 216*mm, payment.reference or "-")])
     c.setFont("Helvetica-Bold", 14)
     c.drawRightString(190*mm, 200*mm, f"RECEIVED: {float(payment.amount):.2f}")
     c.showPage(); c.save()
@@ -92,7 +206,7 @@ def receipt_pdf(order: Order, payment: Payment) -> bytes:
 def instalment_agreement_pdf(order: Order) -> bytes:
     bio = BytesIO()
     c = canvas.Canvas(bio, pagesize=A4)
-    _header(c, "INSTALMENT AGREEMENT")
+    _form(c, "agreement", _letterhead("INSTALMENT AGREEMENT"), _agreement_terms)
     c.setFont("Helvetica", 11)
     y = 250*mm
     lines = [
@@ -100,9 +214,6 @@ def instalment_agreement_pdf(order: Order) -> bytes:
         f"Address: {order.address or '-'}",
         f"Agreement No: {order.code}",
         f"Tenure: {order.instalment_months_total} months  Monthly: {float(order.instalment_monthly_amount):.2f}",
-        "No proration. Payments due monthly from start date. Late/failed payments may incur penalties.",
-        "If customer cancels instalment early, a penalty may be charged and return delivery fee applies.",
-        "Company is MDA-registered (AA Alive Sdn Bhd) and provides hospital beds, wheelchairs, and oxygen concentrators.",
     ]
     for ln in lines:
         c.drawString(20*mm, y, ln); y -= 8*mm
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List, Dict
 from rapidfuzz import process, fuzz
 
@@ -41,24 +42,22 @@ CATALOG = [
     },
 ]
 
-def map_product(text: str, score_cutoff: int = 75) -> Dict:
-    choices = {c["name"]: c for c in CATALOG}
-    # Build alias mapping
-    alias_to_name = {}
-    for c in CATALOG:
-        for a in c["aliases"]:
-            alias_to_name[a] = c["name"]
+# Lookup tables are built once at import; with gunicorn --preload every worker shares them copy-on-write
+_CHOICES = {c["name"]: c for c in CATALOG}
+_ALIAS_TO_NAME = {a: c["name"] for c in CATALOG for a in c["aliases"]}
+_KEYS = list(_ALIAS_TO_NAME.keys()) + list(_CHOICES.keys())
 
+@lru_cache(maxsize=4096)
+def _match(text: str, score_cutoff: int):
     # Fuzzy match against aliases + names
-    key, score, _ = process.extractOne(
-        text,
-        list(alias_to_name.keys()) + list(choices.keys()),
-        scorer=fuzz.WRatio
-    ) if text else (None, 0, None)
+    key, score, _ = process.extractOne(text, _KEYS, scorer=fuzz.WRatio) if text else (None, 0, None)
 
     if key and score >= score_cutoff:
-        name = alias_to_name.get(key, key)
-        prod = choices[name]
+        name = _ALIAS_TO_NAME.get(key, key)
+        prod = _CHOICES[name]
         return {"sku": prod["sku"], "name": prod["name"], "category": prod["category"], "score": score}
 
     return {"sku": None, "name": text, "category": None, "score": score}
+
+def map_product(text: str, score_cutoff: int = 75) -> Dict:
+    return dict(_match(text, score_cutoff))
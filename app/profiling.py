@@ -0,0 +1,160 @@
+"""On-demand profiling of single requests (PROFILE_TOKEN, see ProfileMiddleware in app.middleware).
+
+A profiled request gets a sampling profiler over the threads it runs on (the event loop thread plus every
+threadpool thread that issues SQL for it) and a log of its SQL statements with timings. The result is written to
+PROFILE_DIR/<id>.json and served by GET /debug/profiles/{id}. Nothing here runs unless PROFILE_TOKEN is set.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_STATEMENTS = 2000
+MAX_DEPTH = 80
+PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+# Leaf frames of a thread that is parked (the event loop waiting on the threadpool, an idle pool worker)
+IDLE = {("selectors.py", "select"), ("threading.py", "wait")}
+
+current: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class Profile:
+    """Samples and SQL of one request. The sampler thread runs from start() to stop()."""
+
+    def __init__(self, method: str, path: str, query: str, interval: float):
+        self.id = uuid.uuid4().hex
+        self.method, self.path, self.query = method, path, query
+        self.interval = interval
+        self.threads: Set[int] = {threading.get_ident()}
+        self.stacks: Counter = Counter()
+        self.samples = self.idle = 0
+        self.statements: List[Dict] = []
+        self.dropped = 0
+        self.status: Optional[int] = None
+        self.started_at = datetime.utcnow()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-{self.id[:8]}", daemon=True)
+
+    def start(self) -> None:
+        self._t0 = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self._t0
+        self._done.set()
+        self._sampler.join()
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            for tid in list(self.threads):
+                frame = frames.get(tid)
+                if frame is None or tid == me:
+                    continue
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def sql(self, statement: str, params, ms: float) -> None:
+        if len(self.statements) >= MAX_STATEMENTS:
+            self.dropped += 1
+            return
+        self.statements.append({"sql": statement, "params": repr(params)[:300], "ms": round(ms, 3),
+                                "thread": threading.get_ident()})
+
+    def report(self) -> Dict:
+        self_counts, total_counts = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            self_counts[stack[-1]] += n
+            for fn in set(stack):
+                total_counts[fn] += n
+        by_sql: Dict[str, List[float]] = {}
+        for s in self.statements:
+            by_sql.setdefault(s["sql"], []).append(s["ms"])
+        sampled = sum(self.stacks.values()) or 1
+        return {
+            "id": self.id,
+            "method": self.method, "path": self.path, "query": self.query, "status": self.status,
+            "started_at": self.started_at.isoformat(), "duration_ms": round(self.duration * 1000, 2),
+            "interval_ms": round(self.interval * 1000, 2), "samples": self.samples, "idle_samples": self.idle,
+            "top_self": [{"function": fn, "samples": n, "pct": round(100.0 * n / sampled, 1)} for fn, n in self_counts.most_common(30)],
+            "top_total": [{"function": fn, "samples": n, "pct": round(100.0 * n / sampled, 1)} for fn, n in total_counts.most_common(30)],
+            "sql": {
+                "count": len(self.statements) + self.dropped,
+                "total_ms": round(sum(s["ms"] for s in self.statements), 2),
+                "dropped": self.dropped,
+                # The same statement repeated many times is the usual N+1 signature
+                "repeated": sorted(({"sql": k, "count": len(v), "total_ms": round(sum(v), 2)} for k, v in by_sql.items() if len(v) > 1),
+                                   key=lambda r: -r["total_ms"])[:20],
+                "statements": self.statements,
+            },
+            # Brendan Gregg's folded format: feed to flamegraph.pl or paste into speedscope
+            "folded": "\n".join(f"{';'.join(stack)} {n}" for stack, n in self.stacks.most_common()),
+        }
+
+# --- SQL capture: one listener pair on every Engine, filtered by the request's context
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    if current.get() is not None:
+        conn.info.setdefault("profile_t0", []).append(time.perf_counter())
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    run = current.get()
+    if run is not None and conn.info.get("profile_t0"):
+        run.threads.add(threading.get_ident())
+        run.sql(statement, parameters, (time.perf_counter() - conn.info["profile_t0"].pop()) * 1000)
+
+_installed = False
+
+def install() -> None:
+    """Hook the SQL listeners (only done when PROFILE_TOKEN is set)."""
+    global _installed
+    if not _installed:
+        event.listen(Engine, "before_cursor_execute", _before)
+        event.listen(Engine, "after_cursor_execute", _after)
+        _installed = True
+
+# --- storage
+
+def save(run: Profile, directory: str, keep: int) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{run.id}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(run.report(), f)
+    os.replace(tmp, path)
+    files = sorted((e for e in os.scandir(directory) if e.name.endswith(".json")), key=lambda e: e.stat().st_mtime)
+    for e in files[:-keep] if keep > 0 else []:
+        try:
+            os.remove(e.path)
+        except OSError:
+            pass
+    return path
+
+def load(profile_id: str, directory: str) -> Optional[Dict]:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(directory, f"{profile_id}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,113 @@
+"""Report builders shared by the /export routes and the export job workers (app.exports).
+
+Each *_frame() takes a sync Session and returns a DataFrame; build_report() renders one to XLSX bytes.
+"""
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Order, Payment, OrderBalance, OrderStatus, OrderType
+from .utils import to_xlsx_bytes
+from . import ledger
+
+REPORTS = ("cash", "accruals", "receivables")
+
+def cash_frame(db: Session, start_dt: datetime, end_dt: datetime) -> pd.DataFrame:
+    # One joined query instead of a db.get(Order) per payment
+    rows = db.execute(
+        select(Payment, Order)
+        .outerjoin(Order, Order.id == Payment.order_id)
+        .where(Payment.created_at >= start_dt, Payment.created_at <= end_dt, Payment.voided == False)
+    ).all()
+    return pd.DataFrame([{
+        "date": p.created_at.date().isoformat(),
+        "order_code": o.code if o else "",
+        "customer_name": o.customer_name if o else "",
+        "amount": float(p.amount),
+        "method": p.method.value,
+        "reference": p.reference or "",
+        "parent_order": (o.parent_order_id or "") if o else "",
+    } for p, o in rows])
+
+def accruals_frame(db: Session, as_of_dt: datetime) -> pd.DataFrame:
+    """Accrued (no-prorate) billing vs payments for every ACTIVE rental/instalment as of a date."""
+    orders = db.execute(
+        select(Order)
+        .where(Order.status == OrderStatus.ACTIVE, Order.order_type.in_([OrderType.RENTAL, OrderType.INSTALMENT]))
+        .order_by(Order.id)
+    ).scalars().all()
+    bals = ledger.get_balances(db, orders)
+    acc = ledger.accrual_arrays(orders, bals, as_of_dt)
+    df = pd.DataFrame({
+        "order_code": [o.code for o in orders],
+        "customer_name": [o.customer_name for o in orders],
+        "order_type": [o.order_type.value for o in orders],
+        "months_elapsed": acc["months"],
+        "accrued": acc["expected"],
+        "adjustments": [float(bals[o.id].adjustments_total or 0) for o in orders],
+        "paid": [float(bals[o.id].payments_total or 0) for o in orders],
+    })
+    df["outstanding"] = (df["accrued"] + df["adjustments"] - df["paid"]).clip(lower=0)
+    return df
+
+def receivables_rows(db: Session, date_from: date, date_to: date, now: Optional[datetime] = None) -> List[Dict]:
+    # Range scan on ix_order_balances_next_due_date; the due date is maintained by app.ledger on every write
+    rows = db.execute(
+        select(Order, OrderBalance)
+        .join(OrderBalance, OrderBalance.order_id == Order.id)
+        .where(OrderBalance.next_due_date >= date_from, OrderBalance.next_due_date <= date_to)
+        .order_by(OrderBalance.next_due_date, Order.id)
+    ).all()
+    now = now or datetime.now(timezone.utc)
+    out = []
+    for o, bal in rows:
+        monthly = o.rental_monthly_total if o.order_type == OrderType.RENTAL else o.instalment_monthly_amount
+        out.append({
+            "order_id": o.id,
+            "code": o.code,
+            "order_type": o.order_type.value,
+            "customer_name": o.customer_name,
+            "phone": o.phone,
+            "next_due_date": bal.next_due_date,
+            "amount_due": float(monthly or 0),
+            "outstanding_estimate": ledger.outstanding_from_balance(o, bal, now),
+        })
+    return out
+
+def normalize_params(report: str, params: Dict) -> Dict:
+    """Validate and canonicalise report parameters (ISO strings), filling defaults so equal requests hash equally."""
+    if report == "cash":
+        start, end = params.get("start"), params.get("end")
+        if not start or not end:
+            raise ValueError("cash report needs start and end")
+        return {"start": datetime.fromisoformat(start).isoformat(), "end": datetime.fromisoformat(end).isoformat()}
+    if report == "accruals":
+        as_of = params.get("as_of") or datetime.now(timezone.utc).date().isoformat()
+        return {"as_of": datetime.fromisoformat(as_of).isoformat()}
+    if report == "receivables":
+        d_from, d_to = params.get("from"), params.get("to")
+        if not d_from or not d_to:
+            raise ValueError("receivables report needs from and to")
+        # Outstanding estimates accrue daily, so the valuation day is part of the params (and of the export job hash)
+        as_of = params.get("as_of") or datetime.now(timezone.utc).date().isoformat()
+        return {"from": date.fromisoformat(d_from).isoformat(), "to": date.fromisoformat(d_to).isoformat(),
+                "as_of": datetime.fromisoformat(as_of).isoformat()}
+    raise ValueError(f"unknown report {report!r}; expected one of {', '.join(REPORTS)}")
+
+def build_report(db: Session, report: str, params: Dict) -> Tuple[bytes, str]:
+    """(xlsx bytes, download filename) for normalized params."""
+    if report == "cash":
+        df = cash_frame(db, datetime.fromisoformat(params["start"]), datetime.fromisoformat(params["end"]))
+        name = f"cash_{params['start'][:10]}_{params['end'][:10]}.xlsx"
+    elif report == "accruals":
+        df = accruals_frame(db, datetime.fromisoformat(params["as_of"]))
+        name = f"accruals_{params['as_of'][:10]}.xlsx"
+    elif report == "receivables":
+        df = pd.DataFrame(receivables_rows(db, date.fromisoformat(params["from"]), date.fromisoformat(params["to"]),
+                                           datetime.fromisoformat(params["as_of"])))
+        name = f"receivables_{params['from']}_{params['to']}.xlsx"
+    else:
+        raise ValueError(f"unknown report {report!r}")
+    return to_xlsx_bytes(df, report), name
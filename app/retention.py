@@ -0,0 +1,154 @@
+"""Message retention: compact old payloads into one compressed column, then archive them to date-partitioned files.
+
+Row states:
+  hot        text + full parsed_json
+  compacted  text NULL, payload_z = compressed {"text", "parsed"}
+  archived   payload_z NULL, payload in ARCHIVE_DIR/messages/YYYY/MM/YYYY-MM-DD.jsonl.gz
+
+Compacted and archived rows keep sha256 and a slim parsed_json (INDEX_FIELDS) so the /parse cache and
+the phone/order_code indexes still work; load_payload() returns the full payload whatever the state.
+"""
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import select, text as sql_text
+from sqlalchemy.orm import Session
+
+from .config import get_settings
+from .models import Message
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+settings = get_settings()
+
+INDEX_FIELDS = ("phone", "order_code")
+_ZLIB, _ZSTD = b"\x01", b"\x02"
+
+def compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=10).compress(data)
+    return _ZLIB + zlib.compress(data, 9)
+
+def decompress(blob: bytes) -> bytes:
+    codec, body = blob[:1], blob[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("payload is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body)
+    return zlib.decompress(body)
+
+def _slim(parsed: Optional[dict]) -> Optional[dict]:
+    if parsed is None:
+        return None
+    return {k: parsed[k] for k in INDEX_FIELDS if parsed.get(k) is not None}
+
+def _archive_file(created_at: datetime) -> str:
+    d = created_at.date()
+    return os.path.join("messages", f"{d:%Y}", f"{d:%m}", f"{d.isoformat()}.jsonl.gz")
+
+def _read_archive(rel_path: str, sha: str) -> Optional[dict]:
+    path = os.path.join(settings.archive_dir, rel_path)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get("sha256") == sha:
+                return rec
+    return None
+
+def load_payload(msg: Message) -> Tuple[Optional[str], Optional[dict]]:
+    """(text, parsed) for a message in any retention state."""
+    if msg.payload_z is not None:
+        rec = json.loads(decompress(msg.payload_z))
+        return rec.get("text"), rec.get("parsed")
+    if msg.archived_at is not None:
+        rec = _read_archive(msg.archive_path, msg.sha256)
+        if rec is None:
+            raise FileNotFoundError(f"archived message {msg.sha256} not found in {msg.archive_path}")
+        return rec.get("text"), rec.get("parsed")
+    return msg.text, msg.parsed_json
+
+def load_parsed(msg: Message) -> Optional[dict]:
+    if msg.compacted_at is None and msg.archived_at is None:
+        return msg.parsed_json
+    return load_payload(msg)[1]
+
+def has_payload(msg: Message) -> bool:
+    """False for an archived row whose archive file (or record) is gone; only a re-parse can restore it."""
+    try:
+        load_payload(msg)
+    except FileNotFoundError:
+        return False
+    return True
+
+def compact(db: Session, older_than_days: int, batch_size: int = 500) -> int:
+    """Move text/parsed_json of hot rows older than the cutoff into payload_z. Commits per batch."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    done = 0
+    while True:
+        rows = db.execute(
+            select(Message)
+            .where(Message.created_at < cutoff, Message.compacted_at.is_(None), Message.archived_at.is_(None))
+            .order_by(Message.id).limit(batch_size)
+        ).scalars().all()
+        if not rows:
+            return done
+        now = datetime.utcnow()
+        for m in rows:
+            rec = {"text": m.text, "parsed": m.parsed_json}
+            m.payload_z = compress(json.dumps(rec, ensure_ascii=False, default=str).encode("utf-8"))
+            m.text, m.parsed_json, m.compacted_at = None, _slim(m.parsed_json), now
+        db.commit()
+        done += len(rows)
+
+def archive(db: Session, older_than_days: int, batch_size: int = 500) -> List[str]:
+    """Append rows older than the cutoff to per-day JSONL.gz files and clear their payloads. Returns files written.
+
+    Files are fsynced before the rows are updated, so a crash in between only leaves duplicate lines
+    (readers take the first match) and never a row pointing at nothing.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    written = set()
+    while True:
+        rows = db.execute(
+            select(Message)
+            .where(Message.created_at < cutoff, Message.archived_at.is_(None))
+            .order_by(Message.id).limit(batch_size)
+        ).scalars().all()
+        if not rows:
+            return sorted(written)
+        by_file = {}
+        for m in rows:
+            text, parsed = load_payload(m)
+            by_file.setdefault(_archive_file(m.created_at or datetime.utcnow()), []).append((m, text, parsed))
+        now = datetime.utcnow()
+        for rel_path, group in by_file.items():
+            path = os.path.join(settings.archive_dir, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Appending adds a gzip member; gzip readers transparently concatenate members
+            with open(path, "ab") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="ab") as f:
+                    for m, text, parsed in group:
+                        rec = {"sha256": m.sha256, "id": m.id, "created_at": m.created_at, "order_id": m.order_id,
+                               "text": text, "parsed": parsed}
+                        f.write((json.dumps(rec, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                raw.flush()
+                os.fsync(raw.fileno())
+            for m, text, parsed in group:
+                m.text, m.payload_z, m.parsed_json = None, None, _slim(parsed)
+                m.compacted_at = m.compacted_at or now
+                m.archived_at, m.archive_path = now, rel_path
+            written.add(rel_path)
+        db.commit()
+
+def vacuum(engine) -> None:
+    """Give the space freed by compaction back to the planner/OS (VACUUM cannot run inside a transaction)."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(sql_text("VACUUM ANALYZE messages" if engine.dialect.name == "postgresql" else "VACUUM"))
@@ -0,0 +1,237 @@
+"""Daily rollups behind GET /dashboard, updated in the same transaction as the order/payment writes.
+
+Sales and collections are flows keyed by the day the order/payment was created, so a later edit or void
+corrects that day. The book (active rentals, instalment contract value) is a stock: each change is stored as a
+delta on the day it happened and the level is the running sum.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.orm import Session
+
+from .models import Order, Payment, DailySales, DailyCollections, DailyBook, OrderType, OrderStatus
+from .ledger import decimal_money
+
+class OrderFacts(NamedTuple):
+    """What an order contributes to the rollups; taken before and after an edit to derive the deltas."""
+    day: date
+    order_type: str
+    total: Decimal
+    active_rentals: int
+    instalment_book: Decimal
+
+def _value(v) -> str:
+    return v.value if hasattr(v, "value") else str(v)
+
+def _day(dt: Optional[datetime]) -> date:
+    return (dt or datetime.utcnow()).date()
+
+def _book(order_type: str, status: str, months, monthly) -> Tuple[int, Decimal]:
+    if status != OrderStatus.ACTIVE.value:
+        return 0, Decimal("0")
+    if order_type == OrderType.RENTAL.value:
+        return 1, Decimal("0")
+    if order_type == OrderType.INSTALMENT.value:
+        return 0, decimal_money(int(months or 0) * float(monthly or 0))
+    return 0, Decimal("0")
+
+def facts(order: Order) -> OrderFacts:
+    otype = _value(order.order_type)
+    rentals, book = _book(otype, _value(order.status), order.instalment_months_total, order.instalment_monthly_amount)
+    return OrderFacts(_day(order.created_at), otype, decimal_money(order.total), rentals, book)
+
+def _upsert_add(db: Session, model, keys: List[str], rows: Dict[tuple, Dict[str, object]]) -> None:
+    """INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col, one executemany for all rows.
+    Rows go out in key order so concurrent writers take the row locks in the same order."""
+    rows = {k: v for k, v in rows.items() if any(v.values())}
+    if not rows:
+        return
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = model.__table__
+    cols = list(next(iter(rows.values())).keys())
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=keys, set_={c: table.c[c] + stmt.excluded[c] for c in cols})
+    db.execute(stmt, [dict(zip(keys, k), **v) for k, v in sorted(rows.items())])
+
+def _apply_sales(db: Session, deltas: Iterable[Tuple[date, str, int, Decimal]]) -> None:
+    acc: Dict[tuple, Dict[str, object]] = defaultdict(lambda: {"orders": 0, "revenue": Decimal("0")})
+    for day, otype, n, revenue in deltas:
+        acc[(day, otype)]["orders"] += n
+        acc[(day, otype)]["revenue"] += revenue
+    _upsert_add(db, DailySales, ["day", "order_type"], acc)
+
+def _apply_book(db: Session, day: date, rentals: int, book: Decimal) -> None:
+    _upsert_add(db, DailyBook, ["day"], {(day,): {"active_rentals_delta": rentals, "instalment_book_delta": book}})
+
+def order_added(db: Session, order: Order) -> None:
+    """A new (flushed) order, including adjustment children."""
+    f = facts(order)
+    _apply_sales(db, [(f.day, f.order_type, 1, f.total)])
+    _apply_book(db, f.day, f.active_rentals, f.instalment_book)
+
+def order_changed(db: Session, before: OrderFacts, order: Order) -> None:
+    """An edit (PATCH, status change from return/cancel/buyback): move the order between sales buckets and book the
+    change in rentals/instalment book on today's row."""
+    after = facts(order)
+    if (before.day, before.order_type, before.total) != (after.day, after.order_type, after.total):
+        _apply_sales(db, [(before.day, before.order_type, -1, -before.total), (after.day, after.order_type, 1, after.total)])
+    _apply_book(db, _day(None), after.active_rentals - before.active_rentals, after.instalment_book - before.instalment_book)
+
+def payments_changed(db: Session, payments: Iterable[Tuple[Optional[datetime], object, object]], sign: int = 1) -> None:
+    """(created_at, method, amount) rows added (sign=1) or voided (sign=-1)."""
+    acc: Dict[tuple, Dict[str, object]] = defaultdict(lambda: {"payments": 0, "amount": Decimal("0")})
+    for created_at, method, amount in payments:
+        key = (_day(created_at), _value(method))
+        acc[key]["payments"] += sign
+        acc[key]["amount"] += sign * decimal_money(amount)
+    _upsert_add(db, DailyCollections, ["day", "method"], acc)
+
+# --- backfill / verification
+
+def compute(db: Session, batch_size: int = 5000) -> Dict[str, Dict[tuple, Dict[str, object]]]:
+    """All three rollups recomputed from orders and payments.
+
+    Book history is reconstructed from what the tables keep: an order enters the book on its created day and a
+    non-ACTIVE order leaves it on the day of its first adjustment child (return/cancel/buyback), else on its last
+    update. Terms are taken as they are now.
+    """
+    sales: Dict[tuple, Dict[str, object]] = defaultdict(lambda: {"orders": 0, "revenue": Decimal("0")})
+    collections: Dict[tuple, Dict[str, object]] = defaultdict(lambda: {"payments": 0, "amount": Decimal("0")})
+    book: Dict[tuple, Dict[str, object]] = defaultdict(lambda: {"active_rentals_delta": 0, "instalment_book_delta": Decimal("0")})
+
+    closed = dict(db.execute(
+        select(Order.parent_order_id, func.min(Order.created_at)).where(Order.parent_order_id.is_not(None)).group_by(Order.parent_order_id)
+    ).all())
+    rows = db.execute(
+        select(Order.id, Order.created_at, Order.updated_at, Order.order_type, Order.status, Order.total,
+               Order.instalment_months_total, Order.instalment_monthly_amount).execution_options(yield_per=batch_size)
+    )
+    for r in rows:
+        otype, status = _value(r.order_type), _value(r.status)
+        s = sales[(_day(r.created_at), otype)]
+        s["orders"] += 1
+        s["revenue"] += decimal_money(r.total)
+        rentals, value = _book(otype, OrderStatus.ACTIVE.value, r.instalment_months_total, r.instalment_monthly_amount)
+        if rentals or value:
+            b = book[(_day(r.created_at),)]
+            b["active_rentals_delta"] += rentals
+            b["instalment_book_delta"] += value
+            if status != OrderStatus.ACTIVE.value:
+                b = book[(_day(closed.get(r.id) or r.updated_at or r.created_at),)]
+                b["active_rentals_delta"] -= rentals
+                b["instalment_book_delta"] -= value
+
+    pays = db.execute(
+        select(Payment.created_at, Payment.method, Payment.amount).where(Payment.voided == False).execution_options(yield_per=batch_size)
+    )
+    for p in pays:
+        c = collections[(_day(p.created_at), _value(p.method))]
+        c["payments"] += 1
+        c["amount"] += decimal_money(p.amount)
+    return {"sales": sales, "collections": collections, "book": book}
+
+TABLES = {"sales": (DailySales, ["day", "order_type"]), "collections": (DailyCollections, ["day", "method"]),
+          "book": (DailyBook, ["day"])}
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Replace every rollup row with a full recomputation (one transaction). Returns rows written per table."""
+    fresh = compute(db)
+    out = {}
+    for name, (model, keys) in TABLES.items():
+        db.execute(delete(model))
+        rows = [dict(zip(keys, k), **v) for k, v in sorted(fresh[name].items()) if any(v.values())]
+        if rows:
+            db.execute(model.__table__.insert(), rows)
+        out[name] = len(rows)
+    db.commit()
+    return out
+
+def verify(db: Session) -> List[Dict]:
+    """Differences between the stored rollups and a recomputation: sales/collections per row, the book as levels
+    (its day-by-day history is approximate on rebuild, the current level is not)."""
+    fresh = compute(db)
+    diffs: List[Dict] = []
+    for name, cols in (("sales", ("orders", "revenue")), ("collections", ("payments", "amount"))):
+        model, keys = TABLES[name]
+        stored = {tuple(getattr(r, k) for k in keys): r for r in db.execute(select(model)).scalars()}
+        for key in sorted(set(stored) | set(fresh[name]), key=str):
+            for col in cols:
+                have = float(getattr(stored[key], col) or 0) if key in stored else 0.0
+                want = float(fresh[name][key][col]) if key in fresh[name] else 0.0
+                if abs(have - want) > 0.005:
+                    diffs.append({"table": name, "key": [str(k) for k in key], "column": col, "rollup": have, "actual": want})
+    levels = db.execute(select(func.coalesce(func.sum(DailyBook.active_rentals_delta), 0),
+                               func.coalesce(func.sum(DailyBook.instalment_book_delta), 0))).one()
+    want = (sum(v["active_rentals_delta"] for v in fresh["book"].values()),
+            float(sum(v["instalment_book_delta"] for v in fresh["book"].values())))
+    if int(levels[0]) != want[0] or abs(float(levels[1]) - want[1]) > 0.005:
+        diffs.append({"table": "book", "rollup": [int(levels[0]), float(levels[1])], "actual": list(want)})
+    return diffs
+
+# --- reads
+
+def dashboard(db: Session, date_from: date, date_to: date, interval: str = "day") -> Dict:
+    """Revenue by order type, collections by method and the book levels, per day or month, from the rollups only."""
+    bucket = (lambda d: d) if interval == "day" else (lambda d: d.replace(day=1))
+    buckets: Dict[date, Dict] = {}
+
+    def at(day: date) -> Dict:
+        k = bucket(day)
+        if k not in buckets:
+            buckets[k] = {"day": k, "revenue": {}, "orders": {}, "collections": {}, "payments": {},
+                          "active_rentals": 0, "instalment_book": 0.0}
+        return buckets[k]
+
+    totals = {"revenue": {}, "orders": {}, "collections": {}, "payments": {}}
+    for r in db.execute(select(DailySales).where(DailySales.day.between(date_from, date_to))).scalars():
+        if not (r.orders or r.revenue):
+            continue  # an order moved out of this bucket
+        b = at(r.day)
+        for target in (b, totals):
+            target["revenue"][r.order_type] = target["revenue"].get(r.order_type, 0.0) + float(r.revenue)
+            target["orders"][r.order_type] = target["orders"].get(r.order_type, 0) + r.orders
+    for r in db.execute(select(DailyCollections).where(DailyCollections.day.between(date_from, date_to))).scalars():
+        if not (r.payments or r.amount):
+            continue
+        b = at(r.day)
+        for target in (b, totals):
+            target["collections"][r.method] = target["collections"].get(r.method, 0.0) + float(r.amount)
+            target["payments"][r.method] = target["payments"].get(r.method, 0) + r.payments
+
+    base = db.execute(select(func.coalesce(func.sum(DailyBook.active_rentals_delta), 0),
+                             func.coalesce(func.sum(DailyBook.instalment_book_delta), 0))
+                      .where(DailyBook.day < date_from)).one()
+    rentals, book = int(base[0]), float(base[1])
+    deltas = {r.day: r for r in db.execute(select(DailyBook).where(DailyBook.day.between(date_from, date_to))).scalars()}
+
+    # Every bucket in the range is listed (zeros included) so the levels read as a continuous series
+    days, day = [], date_from
+    while day <= date_to:
+        d = deltas.get(day)
+        if d is not None:
+            rentals += d.active_rentals_delta
+            book += float(d.instalment_book_delta)
+        b = at(day)
+        b["active_rentals"], b["instalment_book"] = rentals, round(book, 2)
+        day += timedelta(days=1)
+    for b in buckets.values():
+        for k in ("revenue", "collections"):
+            b[k] = {t: round(v, 2) for t, v in b[k].items()}
+    return {
+        "from": date_from, "to": date_to, "interval": interval,
+        "revenue": {t: round(v, 2) for t, v in totals["revenue"].items()},
+        "orders": totals["orders"],
+        "collections": {m: round(v, 2) for m, v in totals["collections"].items()},
+        "payments": totals["payments"],
+        "revenue_total": round(sum(totals["revenue"].values()), 2),
+        "collections_total": round(sum(totals["collections"].values()), 2),
+        "active_rentals": rentals,
+        "instalment_book": round(book, 2),
+        "buckets": [buckets[k] for k in sorted(buckets)],
+    }
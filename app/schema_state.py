@@ -0,0 +1,37 @@
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+@lru_cache(maxsize=1)
+def expected_heads() -> Optional[List[str]]:
+    """Alembic head revision(s) shipped with this build, or None when the scripts aren't available."""
+    try:
+        from alembic.config import Config
+        from alembic.script import ScriptDirectory
+        cfg = Config(ALEMBIC_INI)
+        cfg.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+        return sorted(ScriptDirectory.from_config(cfg).get_heads())
+    except Exception as e:
+        print(f"schema_state warn: cannot read alembic scripts: {e}")
+        return None
+
+def current_revisions(engine: Engine) -> List[str]:
+    """Single cheap query against alembic_version; [] when the table is missing."""
+    try:
+        with engine.connect() as conn:
+            return sorted(r[0] for r in conn.execute(text("SELECT version_num FROM alembic_version")))
+    except Exception:
+        return []
+
+def schema_state(engine: Engine) -> Dict:
+    expected = expected_heads()
+    current = current_revisions(engine)
+    if expected is None:
+        ready = bool(current)
+    else:
+        ready = current == expected
+    return {"ready": ready, "current": current, "expected": expected}
@@ -1,6 +1,6 @@
 ﻿from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
-from datetime import datetime
+from typing import Any, Dict, List, Optional, Literal
+from datetime import date, datetime
 
 class ItemIn(BaseModel):
     text: Optional[str] = None
@@ -65,6 +65,7 @@ class OrderOut(BaseModel):
     id: int
     code: str
     parent_order_id: Optional[int]
+    customer_id: Optional[int] = None
     created_at: datetime
     order_type: str
     event_type: str
@@ -95,6 +96,21 @@ class OrderOut(BaseModel):
     class Config:
         from_attributes = True
 
+class OrderRollupOut(BaseModel):
+    orders: int
+    billed: float
+    paid: float
+    outstanding: float
+
+class OrderTreeOut(OrderOut):
+    """An order with its adjustment descendants; rollup covers the node and its whole subtree."""
+    payments_total: float
+    adjustments_total: float
+    rollup: OrderRollupOut
+    children: List["OrderTreeOut"] = Field(default_factory=list)
+
+OrderTreeOut.model_rebuild()
+
 class PaymentCreate(BaseModel):
     amount: float
     method: str = "CASH"
@@ -106,3 +122,60 @@ class ManualOrderCreate(BaseModel):
 
 
 
+
+class CustomerOut(BaseModel):
+    id: int
+    phone_e164: str
+    name: Optional[str]
+    created_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+class CustomerOrdersOut(BaseModel):
+    customer: CustomerOut
+    orders: List[OrderOut]
+    order_count: int
+    # Root orders only: a parent's outstanding already includes its adjustment children
+    outstanding_total: float
+
+class ReceivableOut(BaseModel):
+    order_id: int
+    code: str
+    order_type: str
+    customer_name: str
+    phone: Optional[str]
+    next_due_date: date
+    amount_due: float
+    outstanding_estimate: float
+
+class ParseJobOut(BaseModel):
+    id: int
+    status: str
+    attempts: int
+    error: Optional[str]
+    result: Optional[ParsedOrder]
+
+class MessageOut(BaseModel):
+    id: int
+    sha256: str
+    order_id: Optional[int]
+    created_at: Optional[datetime]
+    archived: bool = False
+    text: Optional[str] = None
+    parsed: Optional[dict]
+
+class ExportRequest(BaseModel):
+    report: Literal["cash", "accruals", "receivables"]
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+class ExportJobOut(BaseModel):
+    id: int
+    report: str
+    params: Dict[str, Any]
+    status: str
+    filename: Optional[str]
+    size: Optional[int]
+    error: Optional[str]
+    created_at: Optional[datetime]
+    finished_at: Optional[datetime]
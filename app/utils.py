@@ -1,6 +1,36 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from dateutil.relativedelta import relativedelta
-from typing import Optional
+from typing import Optional, Sequence
+import calendar
+import io
+import numpy as np
+import pandas as pd
+
+def money(v) -> float:
+    """Money as a JSON number rounded to cents (no Numeric -> float noise such as 0.30000000000000004)."""
+    return round(float(v or 0), 2)
+
+def normalize_phone(raw: Optional[str], default_cc: str = "60") -> Optional[str]:
+    """E.164 form of a free-text phone ("012-345 6789" -> "+60123456789"); None when it can't be a phone number.
+    Local numbers (leading trunk 0, or a bare subscriber number) get the default country code (Malaysia).
+    """
+    if not raw:
+        return None
+    s = str(raw).strip()
+    digits = "".join(ch for ch in s if ch.isdigit())
+    if s.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = default_cc + digits[1:]
+    elif digits.startswith(default_cc) and len(digits) >= 10:
+        pass
+    else:
+        digits = default_cc + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
 
 def months_elapsed_no_prorate(start: datetime, now: Optional[datetime] = None) -> int:
     """Compute whole months elapsed between start and now (no proration).
@@ -16,3 +46,41 @@ def months_elapsed_no_prorate(start: datetime, now: Optional[datetime] = None) -
     if n.day < s.day:
         months -= 1
     return max(months, 0)
+
+def due_date_for(start: datetime, k: int) -> date:
+    """First calendar date on which months_elapsed_no_prorate(start, d) reaches k.
+    Normally the same day-of-month k months later; when that day does not exist (e.g. the 31st),
+    the no-prorate rule only counts the month from the 1st of the following month.
+    """
+    y, m = divmod(start.month - 1 + k, 12)
+    y += start.year
+    m += 1
+    if start.day <= calendar.monthrange(y, m)[1]:
+        return date(y, m, start.day)
+    return date(y, m, 1) + relativedelta(months=1)
+
+def months_elapsed_no_prorate_many(starts: Sequence[Optional[datetime]], now: Optional[datetime] = None) -> np.ndarray:
+    """Vectorized months_elapsed_no_prorate over many start dates and one reference date.
+    Missing starts (None/NaT) give 0, like the scalar version; an unparseable start raises ValueError
+    instead of silently accruing nothing.
+    """
+    now = now or datetime.now(timezone.utc)
+    idx = pd.DatetimeIndex(pd.to_datetime(pd.Series(list(starts), dtype=object), errors="raise"))
+    if len(idx) == 0:
+        return np.zeros(0, dtype=np.int64)
+    valid = ~idx.isna()
+    years = idx.year.to_numpy(dtype=np.float64, na_value=0)
+    months = idx.month.to_numpy(dtype=np.float64, na_value=0)
+    days = idx.day.to_numpy(dtype=np.float64, na_value=0)
+    out = (now.year - years) * 12 + (now.month - months)
+    out -= (now.day < days)
+    out = np.where(valid, np.maximum(out, 0), 0)
+    return out.astype(np.int64)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def to_xlsx_bytes(df: pd.DataFrame, sheet_name: str) -> bytes:
+    bio = io.BytesIO()
+    with pd.ExcelWriter(bio, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return bio.getvalue()
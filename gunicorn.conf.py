@@ -0,0 +1,47 @@
+"""Production run mode: gunicorn managing uvicorn workers.
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Tunables (env): WEB_CONCURRENCY (workers, default = CPU count), PORT, GUNICORN_PRELOAD (1 = import the app once in
+the master and fork, sharing imports copy-on-write), MAX_REQUESTS / MAX_REQUESTS_JITTER (recycle workers gradually),
+GRACEFUL_TIMEOUT, TIMEOUT.
+"""
+import multiprocessing
+import os
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Async workers: one per core; PDF/XLSX work runs on each worker's threadpool
+workers = _env_int("WEB_CONCURRENCY", multiprocessing.cpu_count())
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").lower() in ("1", "true", "yes")
+
+# Recycle each worker after ~MAX_REQUESTS; jitter keeps them from all restarting at once
+max_requests = _env_int("MAX_REQUESTS", 2000)
+max_requests_jitter = _env_int("MAX_REQUESTS_JITTER", 200)
+graceful_timeout = _env_int("GRACEFUL_TIMEOUT", 30)
+# SSE streams idle up to 15s between keepalives; keep the worker heartbeat well above that
+timeout = _env_int("TIMEOUT", 120)
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+def post_fork(server, worker):
+    # With preload the master imported app.db; drop any pooled connections inherited across the fork
+    # without closing them (the parent still owns the sockets)
+    if not preload_app:
+        return
+    from app import db
+    db.engine.dispose(close=False)
+    if db.read_engine is not db.engine:
+        db.read_engine.dispose(close=False)
+    if db.async_engine is not None:
+        db.async_engine.sync_engine.dispose(close=False)
+    if db.async_read_engine is not None and db.async_read_engine is not db.async_engine:
+        db.async_read_engine.sync_engine.dispose(close=False)
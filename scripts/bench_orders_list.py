@@ -0,0 +1,94 @@
+"""Benchmark GET /orders on a seeded 2000-order page: response bytes and end-to-end time per representation.
+
+Runs in-process against a throwaway SQLite database:
+
+    python scripts/bench_orders_list.py --orders 2000 --repeat 5
+"""
+import os
+import sys
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def seed(n: int):
+    from app.db import Base, engine, SessionLocal
+    from app.models import Order, OrderItem, Payment, OrderType, OrderStatus, PaymentMethod
+    from app import ledger
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    start = datetime(2024, 1, 15)
+    for i in range(n):
+        rental = i % 3 == 0
+        o = Order(
+            code=f"BENCH{i:05d}",
+            order_type=OrderType.RENTAL if rental else OrderType.OUTRIGHT,
+            status=OrderStatus.ACTIVE,
+            customer_name=f"Customer {i}",
+            phone=f"01{i:08d}",
+            address=f"No. {i}, Jalan Bench {i % 50}, Taman Ujian, 43000 Kajang, Selangor",
+            subtotal=1900, discount=100.1, delivery_fee=150, total=1949.9, paid_initial=500, to_collect_initial=1449.9,
+            rental_monthly_total=250 if rental else 0,
+            rental_start_date=start + timedelta(days=i % 300) if rental else None,
+            notes="bawa dua jenis untuk customer try dulu",
+        )
+        o.items = [
+            OrderItem(sku="BED-3FUNC-MAN", name="Katil 3 Function Manual", qty=1, unit_price=1500, line_total=1500,
+                      item_type="RENTAL" if rental else "OUTRIGHT"),
+            OrderItem(sku="MATT-CANVAS", name="Tilam Canvas", qty=1, unit_price=400.3, line_total=400.3, item_type="OUTRIGHT"),
+        ]
+        o.payments = [
+            Payment(amount=500, method=PaymentMethod.CASH, reference="init"),
+            Payment(amount=0.1 + 0.2, method=PaymentMethod.TRANSFER, reference=f"TRX{i}"),
+        ]
+        db.add(o)
+        if i % 500 == 499:
+            db.flush()
+    db.flush()
+    for o in db.query(Order).all():
+        ledger.init_balance(db, o)
+    db.commit()
+    db.close()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_orders_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("PARSE_WORKERS", "0")
+    seed(args.orders)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    cases = [
+        ("full", "/orders", "identity"),
+        ("full + gzip", "/orders", "gzip"),
+        ("compact", "/orders?view=compact", "identity"),
+        ("compact + gzip", "/orders?view=compact", "gzip"),
+        ("compact+items,payments + gzip", "/orders?view=compact&include=items,payments", "gzip"),
+    ]
+    with TestClient(app) as client:
+        print(f"{'case':32} {'rows':>5} {'wire bytes':>11} {'ms (median)':>12}")
+        for name, url, enc in cases:
+            times, wire, rows = [], 0, 0
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                with client.stream("GET", url, headers={"Accept-Encoding": enc}) as r:
+                    raw = b"".join(r.iter_raw())
+                times.append((time.perf_counter() - t0) * 1000)
+                wire = len(raw)
+                rows = len(json.loads(raw)) if enc == "identity" else rows
+            times.sort()
+            print(f"{name:32} {rows or args.orders:5d} {wire:11,d} {times[len(times) // 2]:12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Offline /parse benchmark and regression check against the recorded corpus.
+
+Replays recorded LLM answers (no OpenAI key needed) with a simulated upstream latency, then reports:
+throughput and LLM calls for a cold pass, cache effectiveness for a warm pass over the same messages,
+and field / map_product accuracy against the expected outputs in fixtures/parse_corpus.jsonl.
+
+fixtures/llm holds answers recorded from the live API. Until it exists the bench replays fixtures/llm_synthetic,
+which were written by hand from the corpus expectations: throughput, call counts and map_product accuracy are
+still meaningful there, but field accuracy is circular and says nothing about the model.
+
+    python scripts/bench_parse.py --latency-ms 800 --concurrency 8 --window-ms 25
+    python scripts/bench_parse.py --window-ms 0 -v           # one LLM call per message, list mismatches
+
+Re-record the fixtures from the live API after changing SYSTEM_PROMPT or the model:
+
+    OPENAI_API_KEY=... python scripts/bench_parse.py --record --window-ms 0
+"""
+import os
+import sys
+import argparse
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCALARS = ["order_code", "event_type", "customer_name", "phone", "location_url", "delivery_date", "subtotal", "discount",
+           "delivery_fee", "return_delivery_fee", "penalty_amount", "buyback_amount", "total", "paid", "to_collect", "notes"]
+SYNTHETIC = "synthetic"  # fixture dirs named like this hold hand-written answers, not recordings
+ITEM_FIELDS = ["item_type", "qty", "unit_price", "monthly_amount", "months"]
+
+def same(expected, actual) -> bool:
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        try:
+            return abs(float(actual or 0) - float(expected)) < 0.005
+        except (TypeError, ValueError):
+            return False
+    if isinstance(expected, str) and isinstance(actual, str):
+        return actual.startswith(expected) if expected[:4].isdigit() and "T" in expected else actual.strip() == expected
+    return expected == actual
+
+def score(corpus, outputs, verbose: bool) -> None:
+    fields = hits = sku_total = sku_hits = 0
+    for case, out in zip(corpus, outputs):
+        exp, misses = case["expected"], []
+        for key in SCALARS:
+            if key in exp:
+                fields += 1
+                if same(exp[key], out.get(key)):
+                    hits += 1
+                else:
+                    misses.append(f"{key}: expected {exp[key]!r}, got {out.get(key)!r}")
+        items = out.get("items") or []
+        fields += 1
+        if len(items) == len(exp["items"]):
+            hits += 1
+        else:
+            misses.append(f"items: expected {len(exp['items'])}, got {len(items)}")
+        for i, e_item in enumerate(exp["items"]):
+            got = items[i] if i < len(items) else {}
+            for key in ITEM_FIELDS:
+                if key in e_item:
+                    fields += 1
+                    if same(e_item[key], got.get(key)):
+                        hits += 1
+                    else:
+                        misses.append(f"items[{i}].{key}: expected {e_item[key]!r}, got {got.get(key)!r}")
+            sku_total += 1
+            if got.get("sku") == e_item["sku"]:
+                sku_hits += 1
+            else:
+                misses.append(f"items[{i}].sku: {e_item['text']!r} expected {e_item['sku']}, got {got.get('sku')}")
+        if verbose and misses:
+            print(f"  {case['id']}:")
+            for m in misses:
+                print(f"    {m}")
+    print(f"field accuracy      {hits}/{fields} ({100.0 * hits / max(fields, 1):.1f}%)")
+    print(f"map_product (SKU)   {sku_hits}/{sku_total} ({100.0 * sku_hits / max(sku_total, 1):.1f}%)")
+
+def run_pass(client, texts, concurrency):
+    def one(text):
+        t0 = time.perf_counter()
+        r = client.post("/parse", content=text.encode("utf-8"), headers={"Content-Type": "text/plain"})
+        return r.status_code, r.json(), (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, texts))
+    return results, time.perf_counter() - t0
+
+def report(name, results, wall, calls, n):
+    lat = sorted(ms for _, _, ms in results)
+    errors = sum(1 for status, _, _ in results if status != 200)
+    print(f"{name:6} {n:5d} msgs  {wall:6.2f}s  {n / wall:7.1f} msg/s  p50 {lat[len(lat) // 2]:7.1f} ms  "
+          f"p95 {lat[int(len(lat) * 0.95) - 1]:7.1f} ms  LLM calls {calls:4d}  errors {errors}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", default=os.path.join(ROOT, "fixtures", "parse_corpus.jsonl"))
+    ap.add_argument("--fixtures", help="fixture dir (default fixtures/llm if recorded, else fixtures/llm_synthetic)")
+    ap.add_argument("--latency-ms", type=int, default=800, help="simulated LLM latency per request (replay)")
+    ap.add_argument("--concurrency", type=int, default=8, help="concurrent /parse clients")
+    ap.add_argument("--window-ms", type=int, default=25, help="micro-batch window (0 = one request per message)")
+    ap.add_argument("--record", action="store_true", help="call the live API and (re)write the fixtures")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    recorded = os.path.join(ROOT, "fixtures", "llm")
+    if args.fixtures is None:
+        args.fixtures = recorded if args.record or os.path.isdir(recorded) else os.path.join(ROOT, "fixtures", "llm_synthetic")
+    synthetic = not args.record and SYNTHETIC in os.path.basename(os.path.normpath(args.fixtures))
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    tmp = tempfile.mkdtemp(prefix="bench_parse_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["PARSE_WORKERS"] = "0"
+    os.environ["CACHE_DIR"] = os.path.join(tmp, "cache")
+    os.environ["LLM_BACKEND"] = "record" if args.record else "replay"
+    os.environ["LLM_FIXTURE_DIR"] = args.fixtures
+    os.environ["LLM_REPLAY_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["PARSE_BATCH_WINDOW_MS"] = str(args.window_ms)
+
+    from fastapi.testclient import TestClient
+    from app.db import Base, engine
+    from app.main import app
+    from app import parsing
+    Base.metadata.create_all(engine)
+
+    texts = [c["text"] for c in corpus]
+
+    print(f"backend {parsing.backend.name}, latency {args.latency_ms} ms, window {args.window_ms} ms, "
+          f"concurrency {args.concurrency}, {len(corpus)} corpus messages")
+    with TestClient(app) as client:
+        calls0 = parsing.backend.calls
+        cold, wall = run_pass(client, texts, args.concurrency)
+        report("cold", cold, wall, parsing.backend.calls - calls0, len(texts))
+        calls0 = parsing.backend.calls
+        warm, wall = run_pass(client, texts, args.concurrency)
+        report("warm", warm, wall, parsing.backend.calls - calls0, len(texts))
+        served = sum(1 for status, _, _ in warm if status == 200)
+        print(f"cache hit rate      {100.0 * (len(texts) - (parsing.backend.calls - calls0)) / len(texts):.1f}% "
+              f"({served}/{len(texts)} served)")
+    score(corpus, [body for _, body, _ in cold], args.verbose)
+    if synthetic:
+        print(f"WARNING: replayed {args.fixtures}, hand-written from the corpus expectations; field accuracy is circular. "
+              f"Record real answers with --record for a model accuracy figure.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark PDF rendering: documents per second for single renders of each document type, and for a
+1000-invoice run rendered as separate files vs one batch file (invoices_pdf).
+
+Uses in-memory orders, no database:
+
+    python scripts/bench_pdf.py --docs 1000 --rounds 5
+"""
+import os
+import sys
+import argparse
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.models import Order, OrderItem, Payment, OrderType, PaymentMethod
+from app import pdf
+
+NAMES = ["Katil 3 Function Manual", "Tilam Canvas", "Travel Wheelchair Aluminium", "Commode White Padded", "Katil 2 Function Manual"]
+
+def make_order(i: int, n_items: int) -> Order:
+    o = Order(
+        code=f"KP{i:05d}", order_type=OrderType.INSTALMENT, customer_name=f"Customer {i}", phone=f"01{i:08d}",
+        address=f"No. {i}, Jalan Bench {i % 50}, Taman Ujian, 43000 Kajang, Selangor",
+        subtotal=450 * n_items, discount=50, delivery_fee=150, return_delivery_fee=0, penalty_amount=0, buyback_amount=0,
+        total=450 * n_items + 100, instalment_months_total=6, instalment_monthly_amount=300,
+    )
+    o.items = [OrderItem(sku=f"SKU-{k}", name=NAMES[k % len(NAMES)], qty=1 + k % 3, unit_price=450, line_total=450 * (1 + k % 3))
+               for k in range(n_items)]
+    return o
+
+def rate(fn, n: int, rounds: int) -> float:
+    """Best-of-rounds documents per second for n calls of fn."""
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=1000, help="invoices in the batch run")
+    ap.add_argument("--single", type=int, default=200, help="renders per round for the single-document rates")
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    small, long_ = make_order(1, 3), make_order(2, 80)
+    payment = Payment(amount=300, method=PaymentMethod.TRANSFER, reference="TRX1", created_at=datetime(2026, 1, 1))
+    cases = [
+        ("invoice, 3 items", lambda: pdf.invoice_pdf(small)),
+        ("invoice, 80 items (multi-page)", lambda: pdf.invoice_pdf(long_)),
+        ("receipt", lambda: pdf.receipt_pdf(small, payment)),
+        ("instalment agreement", lambda: pdf.instalment_agreement_pdf(small)),
+    ]
+    print(f"{'single render':34} {'docs/s':>9} {'bytes':>9}")
+    for name, fn in cases:
+        print(f"{name:34} {rate(fn, args.single, args.rounds):9.1f} {len(fn()):9,d}")
+
+    orders = [make_order(i, 1 + i % 6) for i in range(args.docs)]
+    print(f"\n{args.docs}-invoice run")
+    t0 = time.perf_counter()
+    separate = sum(len(pdf.invoice_pdf(o)) for o in orders)
+    t1 = time.perf_counter()
+    batch = len(pdf.invoices_pdf(orders))
+    t2 = time.perf_counter()
+    print(f"{'separate files':34} {args.docs / (t1 - t0):9.1f} docs/s {separate:12,d} bytes")
+    print(f"{'one batch file (invoices_pdf)':34} {args.docs / (t2 - t1):9.1f} docs/s {batch:12,d} bytes")
+
+if __name__ == "__main__":
+    main()
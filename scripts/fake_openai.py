@@ -0,0 +1,112 @@
+"""Local stand-in for the OpenAI chat completions API with injectable latency and errors.
+
+Point the app at it and exercise the circuit breaker without touching the real upstream:
+
+    python scripts/fake_openai.py --port 8765 --latency 0.2 --error-rate 0.3
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=x uvicorn app.main:app
+
+Behaviour can be changed while it runs, e.g. to simulate an outage and a recovery:
+
+    curl -X POST localhost:8765/_control -d '{"latency": 30}'
+    curl -X POST localhost:8765/_control -d '{"latency": 0, "error_rate": 0}'
+    curl localhost:8765/_stats
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ORDER = {
+    "order_code": None,
+    "event_type": "DELIVERY",
+    "customer_name": "Fake Customer",
+    "phone": "0123456789",
+    "items": [{"text": "Katil 3 Function Manual (Sewa)", "item_type": "RENTAL", "qty": 1, "monthly_amount": 250}],
+    "total": 250,
+    "notes": None,
+}
+
+class State:
+    def __init__(self, latency: float, error_rate: float, error_status: int):
+        self.lock = threading.Lock()
+        self.latency, self.error_rate, self.error_status = latency, error_rate, error_status
+        self.requests = self.errors = 0
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": "fake",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+def answer(body: dict) -> str:
+    messages = body.get("messages") or []
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    if "Batch mode" in system:
+        batch = json.loads(user)
+        return json.dumps({"results": [{"index": m["index"], "order": dict(ORDER, notes=m["text"][:40])} for m in batch]})
+    return json.dumps(dict(ORDER, notes=user[:40]))
+
+def make_handler(state: State):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: dict):
+            raw = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path == "/_stats":
+                with state.lock:
+                    return self._send(200, {"requests": state.requests, "errors": state.errors, "latency": state.latency,
+                                            "error_rate": state.error_rate, "error_status": state.error_status})
+            self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if self.path == "/_control":
+                with state.lock:
+                    for key in ("latency", "error_rate", "error_status"):
+                        if key in body:
+                            setattr(state, key, type(getattr(state, key))(body[key]))
+                return self._send(200, {"ok": True})
+            if not self.path.endswith("/chat/completions"):
+                return self._send(404, {"error": {"message": f"{self.path} not supported by the fake"}})
+            with state.lock:
+                state.requests += 1
+                latency, fail, status = state.latency, random.random() < state.error_rate, state.error_status
+                state.errors += fail
+            time.sleep(latency)
+            if fail:
+                return self._send(status, {"error": {"message": "injected failure", "type": "server_error"}})
+            self._send(200, completion(answer(body)))
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every completion")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions that fail")
+    ap.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    args = ap.parse_args()
+
+    state = State(args.latency, args.error_rate, args.error_status)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"fake openai on http://{args.host}:{args.port}/v1 (latency={args.latency}s error_rate={args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+"""Bulk-load historical orders, items and payments from spreadsheets (CSV or XLSX), bypassing POST /orders.
+
+    python scripts/load_legacy.py --orders orders.csv --items items.csv --payments payments.csv
+    python scripts/load_legacy.py --xlsx legacy.xlsx            # sheets named orders / items / payments
+    python scripts/load_legacy.py --xlsx legacy.xlsx --dry-run  # validate and report SKU mapping only
+
+Columns (header names, case-insensitive; only the starred ones are required):
+  orders:   code*, created_at* (or date), parent_code, order_type, event_type, status, customer_name, phone, address,
+            location_url, delivery_date, subtotal, discount, delivery_fee, return_delivery_fee, penalty_amount,
+            buyback_amount, total, paid_initial, to_collect_initial, rental_monthly_total, rental_start_date,
+            instalment_months_total, instalment_monthly_amount, instalment_start_date, notes
+  items:    order_code*, name* (or text), sku, qty, unit_price, line_total, item_type, monthly_amount, months
+  payments: order_code*, amount*, method, reference, notes, date, voided, void_reason
+
+Missing commercials are derived the way create_order_from_parsed does (order type from the items, subtotal from the
+line totals, ...). Unlike POST /orders, paid_initial does not create a payment by itself: the ledger only counts
+payment rows, so either list the deposit in the payments sheet or pass --init-payments to add an `init` payment
+for orders that have none there. Orders whose paid_initial exceeds their sheet payments are reported. Original codes are kept and items without a SKU are mapped with map_product (each distinct name
+once). Every input row is validated before anything is written; with errors nothing is loaded unless --skip-invalid.
+
+Orders go in chunks of --chunk-size, parents before their adjustment children, each chunk (orders, items, payments,
+customer links) in one transaction: COPY on Postgres (psycopg2), executemany elsewhere. Codes already in the
+database are skipped, so an interrupted load resumes by running the same command again. The order_balances ledger
+and the dashboard rollups are rebuilt once at the end (--no-rebuild to skip).
+"""
+import os
+import sys
+import argparse
+import csv
+import io
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, insert, text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import Order, OrderItem, Payment, Customer, OrderType, EventType, OrderStatus, PaymentMethod
+from app.products import map_product
+from app.payment_import import parse_amount, parse_method
+from app import customers, ledger, rollups, changes
+
+ITEM_TYPES = ("OUTRIGHT", "RENTAL", "INSTALMENT")
+ORDER_COLS = ("code", "parent_order_id", "created_at", "updated_at", "version", "order_type", "event_type", "status",
+              "customer_id", "customer_name", "phone", "address", "location_url", "subtotal", "discount", "delivery_fee",
+              "return_delivery_fee", "penalty_amount", "buyback_amount", "total", "paid_initial", "to_collect_initial",
+              "rental_monthly_total", "rental_start_date", "instalment_months_total", "instalment_monthly_amount",
+              "instalment_start_date", "notes")
+ITEM_COLS = ("order_id", "sku", "name", "qty", "unit_price", "line_total", "item_type")
+PAYMENT_COLS = ("order_id", "created_at", "amount", "method", "reference", "notes", "voided", "void_reason", "voided_at")
+IN_BATCH = 1000
+
+# --- reading
+
+def read_rows(path: str, sheet: Optional[str] = None) -> List[Dict]:
+    """Rows of a CSV file or an XLSX sheet as dicts keyed by the lower-cased header."""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            if sheet and sheet not in wb.sheetnames:
+                return []
+            rows = (wb[sheet] if sheet else wb.worksheets[0]).iter_rows(values_only=True)
+            header = [str(h or "").strip().lower() for h in next(rows, ())]
+            return [dict(zip(header, r)) for r in rows if any(v not in (None, "") for v in r)]
+        finally:
+            wb.close()
+    with open(path, newline="", encoding="utf-8-sig") as f:  # Excel CSV exports carry a BOM
+        reader = csv.DictReader(f)
+        if reader.fieldnames is None:
+            return []
+        reader.fieldnames = [(h or "").strip().lower() for h in reader.fieldnames]
+        return [r for r in reader if any((v or "").strip() for v in r.values() if isinstance(v, str))]
+
+# --- field parsing (ValueError messages end up in the validation report)
+
+def _text(v) -> Optional[str]:
+    s = str(v).strip() if v is not None else ""
+    return s or None
+
+def _num(v, field: str, default: Optional[Decimal] = Decimal("0")) -> Optional[Decimal]:
+    if v is None or str(v).strip() == "":
+        return default
+    s = str(v).replace(",", "").strip()
+    if s.upper().startswith("RM"):
+        s = s[2:].strip()
+    try:
+        d = Decimal(s)
+    except InvalidOperation:
+        raise ValueError(f"{field}: invalid number {v!r}")
+    if not d.is_finite():
+        raise ValueError(f"{field}: invalid number {v!r}")
+    return d.quantize(Decimal("0.01"))
+
+DATE_FORMATS = ("%d/%m/%Y", "%d/%m/%Y %H:%M", "%d-%m-%Y", "%d.%m.%Y")
+
+def _when(v, field: str) -> Optional[datetime]:
+    if v is None or str(v).strip() == "":
+        return None
+    if isinstance(v, datetime):
+        return v
+    if isinstance(v, date):
+        return datetime(v.year, v.month, v.day)
+    s = str(v).strip()
+    try:
+        return datetime.fromisoformat(s)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"{field}: unrecognised date {v!r}")
+
+def _enum(enum, v, field: str, default):
+    if v is None or str(v).strip() == "":
+        return default
+    try:
+        return enum(str(v).strip().upper())
+    except ValueError:
+        raise ValueError(f"{field}: {v!r} is not one of {', '.join(m.value for m in enum)}")
+
+def _flag(v) -> bool:
+    return str(v or "").strip().lower() in ("1", "y", "yes", "true", "t", "void", "voided")
+
+# --- validation
+
+class Load:
+    """Validated rows, keyed by order code."""
+
+    def __init__(self):
+        self.orders: Dict[str, Dict] = {}
+        self.parent_code: Dict[str, Optional[str]] = {}
+        self.lines: Dict[str, int] = {}  # code -> line in the orders sheet, for the report
+        self.items: Dict[str, List[Dict]] = defaultdict(list)
+        self.payments: Dict[str, List[Dict]] = defaultdict(list)
+        self.errors: List[Tuple[str, int, Optional[str], str]] = []  # (file, line, code, message)
+        self.unmapped: Counter = Counter()
+
+def _item(r: Dict) -> Dict:
+    name = _text(r.get("name")) or _text(r.get("text"))
+    if not name:
+        raise ValueError("name is required")
+    item_type = (_text(r.get("item_type")) or "OUTRIGHT").upper()
+    if item_type not in ITEM_TYPES:
+        raise ValueError(f"item_type: {item_type!r} is not one of {', '.join(ITEM_TYPES)}")
+    qty = _num(r.get("qty"), "qty", Decimal("1"))
+    unit = _num(r.get("unit_price"), "unit_price")
+    line_total = _num(r.get("line_total"), "line_total", None)
+    return {"sku": _text(r.get("sku")), "name": name[:200], "qty": qty, "unit_price": unit,
+            "line_total": line_total if line_total is not None else (qty * unit).quantize(Decimal("0.01")),
+            "item_type": item_type, "monthly_amount": _num(r.get("monthly_amount"), "monthly_amount", None),
+            "months": int(_num(r.get("months"), "months", Decimal("0")))}
+
+def _order(r: Dict, items: List[Dict]) -> Dict:
+    """Order columns from a sheet row, filling the gaps like create_order_from_parsed (its init payment is add_init_payments)."""
+    created_at = _when(r.get("created_at"), "created_at") or _when(r.get("date"), "date")
+    if created_at is None:
+        raise ValueError("created_at (or date) is required")
+    types = {it["item_type"] for it in items}
+    derived_type = OrderType.ADJUSTMENT if _text(r.get("parent_code")) else (
+        OrderType.RENTAL if "RENTAL" in types else OrderType.INSTALMENT if "INSTALMENT" in types else OrderType.OUTRIGHT)
+    o = {
+        "created_at": created_at, "updated_at": created_at, "version": 1,
+        "order_type": _enum(OrderType, r.get("order_type"), "order_type", derived_type),
+        "event_type": _enum(EventType, r.get("event_type"), "event_type", EventType.DELIVERY),
+        "status": _enum(OrderStatus, r.get("status"), "status", OrderStatus.ACTIVE),
+        "customer_name": (_text(r.get("customer_name")) or "Unknown")[:200],
+        "phone": _text(r.get("phone")), "address": _text(r.get("address")), "location_url": _text(r.get("location_url")),
+        "notes": _text(r.get("notes")),
+    }
+    for f in ("discount", "delivery_fee", "return_delivery_fee", "penalty_amount", "buyback_amount", "paid_initial"):
+        o[f] = _num(r.get(f), f)
+    o["subtotal"] = _num(r.get("subtotal"), "subtotal", None)
+    if o["subtotal"] is None:
+        o["subtotal"] = sum((it["line_total"] for it in items), Decimal("0"))
+    o["total"] = _num(r.get("total"), "total", None)
+    if o["total"] is None:
+        o["total"] = (o["subtotal"] - o["discount"] + o["delivery_fee"] + o["return_delivery_fee"]
+                      + o["penalty_amount"] + o["buyback_amount"])
+    o["to_collect_initial"] = _num(r.get("to_collect_initial"), "to_collect_initial", None)
+    if o["to_collect_initial"] is None:
+        o["to_collect_initial"] = max(o["total"] - o["paid_initial"], Decimal("0"))
+
+    delivered = _when(r.get("delivery_date"), "delivery_date")
+    rentals = [it for it in items if it["item_type"] == "RENTAL"]
+    instalments = [it for it in items if it["item_type"] == "INSTALMENT"]
+    o["rental_monthly_total"] = _num(r.get("rental_monthly_total"), "rental_monthly_total", None)
+    if o["rental_monthly_total"] is None:
+        o["rental_monthly_total"] = sum((it["monthly_amount"] or it["unit_price"] for it in rentals), Decimal("0"))
+    o["rental_start_date"] = _when(r.get("rental_start_date"), "rental_start_date") or (delivered if rentals else None)
+    last = instalments[-1] if instalments else None
+    o["instalment_months_total"] = int(_num(r.get("instalment_months_total"), "instalment_months_total", None)
+                                       or (last["months"] if last else 0))
+    o["instalment_monthly_amount"] = _num(r.get("instalment_monthly_amount"), "instalment_monthly_amount", None)
+    if o["instalment_monthly_amount"] is None:
+        o["instalment_monthly_amount"] = (last["monthly_amount"] or last["unit_price"]) if last else Decimal("0")
+    o["instalment_start_date"] = _when(r.get("instalment_start_date"), "instalment_start_date") or (delivered if instalments else None)
+    return o
+
+def validate(order_rows: List[Dict], item_rows: List[Dict], payment_rows: List[Dict], files: Dict[str, str],
+             default_method: PaymentMethod, min_score: int) -> Load:
+    load = Load()
+
+    codes = Counter(_text(r.get("code")) for r in order_rows)
+    items_by_code: Dict[str, List[Dict]] = defaultdict(list)
+    for n, r in enumerate(item_rows, 2):
+        code = _text(r.get("order_code"))
+        try:
+            if not code:
+                raise ValueError("order_code is required")
+            if code not in codes:
+                raise ValueError(f"order_code {code!r} is not in the orders sheet")
+            items_by_code[code].append(_item(r))
+        except ValueError as e:
+            load.errors.append((files["items"], n, code, str(e)))
+
+    # map_product once per distinct name, not per row
+    names = {it["name"] for its in items_by_code.values() for it in its if not it["sku"]}
+    skus = {name: map_product(name, score_cutoff=min_score)["sku"] for name in names}
+    for its in items_by_code.values():
+        for it in its:
+            if not it["sku"]:
+                it["sku"] = skus[it["name"]]
+                if it["sku"] is None:
+                    load.unmapped[it["name"]] += 1
+
+    for n, r in enumerate(order_rows, 2):
+        code = _text(r.get("code"))
+        try:
+            if not code:
+                raise ValueError("code is required")
+            if len(code) > 32:
+                raise ValueError("code is longer than 32 characters")
+            if codes[code] > 1:
+                raise ValueError(f"code {code!r} appears {codes[code]} times")
+            o = _order(r, items_by_code.get(code, []))
+        except ValueError as e:
+            load.errors.append((files["orders"], n, code, str(e)))
+            continue
+        o["code"] = code
+        load.orders[code] = o
+        load.lines[code] = n
+        load.parent_code[code] = _text(r.get("parent_code"))
+        load.items[code] = [{c: it[c] for c in ITEM_COLS if c != "order_id"} for it in items_by_code.get(code, [])]
+
+    for n, r in enumerate(payment_rows, 2):
+        code = _text(r.get("order_code"))
+        try:
+            if not code:
+                raise ValueError("order_code is required")
+            if code not in codes:
+                raise ValueError(f"order_code {code!r} is not in the orders sheet")
+            voided = _flag(r.get("voided"))
+            created_at = _when(r.get("date"), "date") or (load.orders[code]["created_at"] if code in load.orders else None)
+            load.payments[code].append({
+                "created_at": created_at or datetime.utcnow(), "amount": parse_amount(r.get("amount")),
+                "method": parse_method(r.get("method"), default_method), "reference": _text(r.get("reference")),
+                "notes": _text(r.get("notes")), "voided": voided,
+                "void_reason": _text(r.get("void_reason")) if voided else None, "voided_at": created_at if voided else None,
+            })
+        except ValueError as e:
+            load.errors.append((files["payments"], n, code, str(e)))
+    return load
+
+def short_paid(load: Load) -> List[str]:
+    """Codes whose paid_initial is more than their non-void sheet payments (the ledger would miss the difference)."""
+    return [code for code, o in load.orders.items()
+            if o["paid_initial"] > sum((p["amount"] for p in load.payments.get(code, []) if not p["voided"]), Decimal("0"))]
+
+def add_init_payments(load: Load, codes: List[str]) -> int:
+    """The `init` payment create_order_from_parsed writes, for the given orders that have no sheet payments."""
+    n = 0
+    for code in codes:
+        o = load.orders[code]
+        if not load.payments.get(code) and o["paid_initial"] > 0:
+            load.payments[code] = [{"created_at": o["created_at"], "amount": o["paid_initial"], "method": PaymentMethod.CASH,
+                                    "reference": "init", "notes": None, "voided": False, "void_reason": None, "voided_at": None}]
+            n += 1
+    return n
+
+def drop_invalid(load: Load, db: Session, orders_file: str) -> None:
+    """Forget orders with a bad row of their own, a bad item/payment row, or a parent that cannot be resolved."""
+    bad = {code for _, _, code, _ in load.errors if code}
+    parents = {p for p in load.parent_code.values() if p and p not in load.orders}
+    known = set(_existing(db, parents))
+    for code, parent in load.parent_code.items():
+        if parent and parent not in load.orders and parent not in known:
+            load.errors.append((orders_file, load.lines.get(code, 0), code, f"parent_code {parent!r} is neither in the sheet nor in the database"))
+            bad.add(code)
+            continue
+        seen, p = {code}, parent
+        while p in load.orders:
+            if p in seen:
+                load.errors.append((orders_file, load.lines[code], code, "parent_code chain loops back on itself"))
+                bad.add(code)
+                break
+            seen.add(p)
+            p = load.parent_code.get(p)
+    changed = True
+    while changed:  # children of dropped parents go too
+        changed = False
+        for code, parent in load.parent_code.items():
+            if code not in bad and parent in bad:
+                bad.add(code)
+                changed = True
+    for code in bad:
+        load.orders.pop(code, None)
+        load.items.pop(code, None)
+        load.payments.pop(code, None)
+
+# --- loading
+
+def _existing(db: Session, codes) -> Dict[str, Tuple[int, Optional[int]]]:
+    """code -> (id, customer_id) for the codes already in the database."""
+    codes, out = list(codes), {}
+    for i in range(0, len(codes), IN_BATCH):
+        for oid, code, cid in db.execute(select(Order.id, Order.code, Order.customer_id).where(Order.code.in_(codes[i:i + IN_BATCH]))):
+            out[code] = (oid, cid)
+    return out
+
+def _copy_value(v):
+    if v is None:
+        return None
+    if isinstance(v, (OrderType, EventType, OrderStatus, PaymentMethod)):
+        return v.value
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, datetime):
+        return v.isoformat(sep=" ")
+    return v
+
+def bulk_insert(db: Session, model, cols, rows: List[Dict]) -> None:
+    """COPY ... FROM STDIN on Postgres/psycopg2, otherwise one executemany INSERT; in the session's transaction."""
+    if not rows:
+        return
+    table = model.__table__
+    if db.bind.dialect.name == "postgresql" and db.bind.dialect.driver == "psycopg2":
+        buf = io.StringIO()
+        w = csv.writer(buf)  # None -> unquoted empty field -> NULL in CSV COPY
+        for r in rows:
+            w.writerow([_copy_value(r[c]) for c in cols])
+        buf.seek(0)
+        cur = db.connection().connection.cursor()
+        try:
+            cur.copy_expert(f"COPY {table.name} ({', '.join(cols)}) FROM STDIN WITH (FORMAT csv)", buf)
+        finally:
+            cur.close()
+    else:
+        db.execute(insert(table), [{c: r[c] for c in cols} for r in rows])
+
+def link_customers(db: Session, rows: List[Dict]) -> None:
+    """customer_id for top-level orders by E.164 phone: one IN read, one insert of the new phones, one re-read."""
+    names: Dict[str, str] = {}
+    for r in sorted(rows, key=lambda r: r["created_at"]):  # the latest non-empty name wins, as in get_or_create
+        e164 = customers.normalize(r["phone"])
+        r["_e164"] = e164
+        if e164 and (r["customer_name"] != "Unknown" or e164 not in names):
+            names[e164] = r["customer_name"]
+    if not names:
+        return
+    found = dict(db.execute(select(Customer.phone_e164, Customer.id).where(Customer.phone_e164.in_(list(names)))).all())
+    new = [p for p in names if p not in found]
+    if new:
+        now = datetime.utcnow()
+        db.execute(insert(Customer), [{"phone_e164": p, "name": names[p] if names[p] != "Unknown" else None,
+                                       "created_at": now, "updated_at": now} for p in new])
+        found.update(db.execute(select(Customer.phone_e164, Customer.id).where(Customer.phone_e164.in_(new))).all())
+    for r in rows:
+        r["customer_id"] = found.get(r.pop("_e164"))
+
+def depth_order(load: Load) -> List[str]:
+    """Codes with every parent before its children (stable by creation time otherwise)."""
+    depth: Dict[str, int] = {}
+
+    def d(start: str) -> int:
+        code, seen = start, []
+        while code not in depth:
+            parent = load.parent_code.get(code)
+            if parent not in load.orders or parent in seen:
+                depth[code] = 0
+                break
+            seen.append(code)
+            code = parent
+        for c in reversed(seen):
+            depth[c] = depth[load.parent_code[c]] + 1
+        return depth[start]
+
+    return sorted(load.orders, key=lambda c: (d(c), load.orders[c]["created_at"], c))
+
+def load_chunk(db: Session, load: Load, codes: List[str], ids: Dict[str, Tuple[int, Optional[int]]]) -> Tuple[int, int]:
+    """Insert one chunk (already depth-ordered) in the session's transaction; ids gains the new orders."""
+    rows = [dict(load.orders[code], parent_order_id=None, customer_id=None) for code in codes]
+    in_chunk = set(codes)
+    # Parents loaded before this chunk (earlier chunks or the live database) whose trees and balances now change
+    adopted = [(code, load.parent_code[code]) for code in codes
+               if load.parent_code[code] and load.parent_code[code] not in in_chunk]
+    link_customers(db, [r for r in rows if not load.parent_code[r["code"]]])
+
+    # Parents that sit in this same chunk need their ids first, so insert level by level
+    pending = rows
+    while pending:
+        level = [r for r in pending if not load.parent_code[r["code"]] or load.parent_code[r["code"]] in ids]
+        if not level:
+            raise RuntimeError(f"unresolved parent_code for {pending[0]['code']!r}")
+        for r in level:
+            parent = load.parent_code[r["code"]]
+            if parent:
+                r["parent_order_id"], r["customer_id"] = ids[parent]  # children inherit the parent's customer
+        bulk_insert(db, Order, ORDER_COLS, level)
+        ids.update(_existing(db, [r["code"] for r in level]))
+        done = {r["code"] for r in level}
+        pending = [r for r in pending if r["code"] not in done]
+
+    items = [dict(it, order_id=ids[code][0]) for code in codes for it in load.items.get(code, [])]
+    payments = [dict(p, order_id=ids[code][0]) for code in codes for p in load.payments.get(code, [])]
+    bulk_insert(db, OrderItem, ITEM_COLS, items)
+    bulk_insert(db, Payment, PAYMENT_COLS, payments)
+    # Bump those parents (and their ancestors) so their ETags and cached PDFs move on, as an adjustment would
+    changes.record_many(db, "order.adjusted", [(ids[parent][0], None, {"child_id": ids[code][0], "child_code": code,
+                                                                       "source": "legacy_import"})
+                                               for code, parent in adopted])
+    # One feed event per chunk: moves the list ETags on without flooding /changes subscribers with history
+    changes.record(db, "orders.imported", None, count=len(codes), first=codes[0], last=codes[-1])
+    return len(items), len(payments)
+
+def main():
+    ap = argparse.ArgumentParser(description="Bulk-load legacy orders/items/payments from CSV or XLSX.")
+    ap.add_argument("--xlsx", help="workbook with sheets named orders, items, payments")
+    ap.add_argument("--orders", help="orders CSV/XLSX")
+    ap.add_argument("--items", help="items CSV/XLSX")
+    ap.add_argument("--payments", help="payments CSV/XLSX")
+    ap.add_argument("--chunk-size", type=int, default=2000, help="orders per transaction")
+    ap.add_argument("--default-method", default="CASH", help="payment method for rows that leave it blank")
+    ap.add_argument("--min-score", type=int, default=75, help="map_product score cutoff for SKU mapping")
+    ap.add_argument("--init-payments", action="store_true",
+                    help="add an `init` payment of paid_initial for orders with no rows in the payments sheet")
+    ap.add_argument("--dry-run", action="store_true", help="validate and report only")
+    ap.add_argument("--skip-invalid", action="store_true", help="load the valid orders even if some rows have errors")
+    ap.add_argument("--no-rebuild", action="store_true", help="leave the ledger/rollup rebuild for later")
+    args = ap.parse_args()
+
+    if not (args.xlsx or args.orders):
+        ap.error("give --xlsx or at least --orders")
+    files = {"orders": args.orders or f"{args.xlsx}[orders]", "items": args.items or f"{args.xlsx}[items]",
+             "payments": args.payments or f"{args.xlsx}[payments]"}
+    t0 = time.perf_counter()
+    order_rows = read_rows(args.orders) if args.orders else read_rows(args.xlsx, "orders")
+    item_rows = read_rows(args.items) if args.items else (read_rows(args.xlsx, "items") if args.xlsx else [])
+    payment_rows = read_rows(args.payments) if args.payments else (read_rows(args.xlsx, "payments") if args.xlsx else [])
+    print(f"Read {len(order_rows)} orders, {len(item_rows)} items, {len(payment_rows)} payments in {time.perf_counter() - t0:.1f}s")
+
+    load = validate(order_rows, item_rows, payment_rows, files, parse_method(args.default_method, PaymentMethod.CASH), args.min_score)
+    db = SessionLocal()
+    try:
+        drop_invalid(load, db, files["orders"])
+        for file, line, code, msg in load.errors[:50]:
+            print(f"  {file}:{line} {code or '-'}: {msg}")
+        if len(load.errors) > 50:
+            print(f"  ... and {len(load.errors) - 50} more")
+        n_items = sum(len(v) for v in load.items.values())
+        print(f"Valid: {len(load.orders)} orders, {n_items} items, {sum(len(v) for v in load.payments.values())} payments; "
+              f"{len(load.errors)} errors")
+        if load.unmapped:
+            print(f"No SKU for {sum(load.unmapped.values())} of {n_items} items; most common names:")
+            for name, n in load.unmapped.most_common(10):
+                print(f"  {n:6d}  {name}")
+        short = short_paid(load)
+        if short and args.init_payments:
+            print(f"Adding an init payment for {add_init_payments(load, short)} orders with paid_initial and no sheet payments")
+            short = short_paid(load)
+        if short:
+            print(f"Warning: {len(short)} orders have paid_initial above their sheet payments, which the ledger will not "
+                  f"count (e.g. {', '.join(short[:5])}); add payment rows or use --init-payments")
+        if args.dry_run:
+            sys.exit(1 if load.errors else 0)
+        if load.errors and not args.skip_invalid:
+            print("Nothing loaded: fix the rows above or pass --skip-invalid.")
+            sys.exit(1)
+
+        ids = _existing(db, load.orders)
+        todo = [c for c in depth_order(load) if c not in ids]
+        if ids:
+            print(f"Skipping {len(ids)} orders already in the database (resumed load)")
+        parents = {p for p in load.parent_code.values() if p} - set(ids) - set(load.orders)
+        ids.update(_existing(db, parents))
+
+        t0, done_orders, done_items, done_pays = time.perf_counter(), 0, 0, 0
+        for i in range(0, len(todo), args.chunk_size):
+            chunk = todo[i:i + args.chunk_size]
+            try:
+                n_i, n_p = load_chunk(db, load, chunk, ids)
+                db.commit()
+            except Exception:
+                db.rollback()
+                print(f"Chunk starting at {chunk[0]} failed; committed chunks are kept, rerun to resume.", file=sys.stderr)
+                raise
+            done_orders, done_items, done_pays = done_orders + len(chunk), done_items + n_i, done_pays + n_p
+            rate = done_orders / max(time.perf_counter() - t0, 1e-9)
+            print(f"  {done_orders}/{len(todo)} orders ({100.0 * done_orders / len(todo):.1f}%), {done_items} items, "
+                  f"{done_pays} payments, {rate:.0f} orders/s, eta {(len(todo) - done_orders) / rate:.0f}s", flush=True)
+        print(f"Loaded {done_orders} orders, {done_items} items, {done_pays} payments in {time.perf_counter() - t0:.1f}s")
+
+        if db.bind.dialect.name == "postgresql" and done_orders:
+            db.execute(text("ANALYZE orders, order_items, payments, customers"))
+            db.commit()
+        if not args.no_rebuild:
+            t0 = time.perf_counter()
+            fixed = ledger.rebuild_ledger(db, fix=True)
+            written = rollups.rebuild(db)
+            print(f"Rebuilt {len(fixed)} ledger rows and the rollups ({', '.join(f'{k} {v}' for k, v in written.items())}) "
+                  f"in {time.perf_counter() - t0:.1f}s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
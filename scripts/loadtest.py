@@ -0,0 +1,63 @@
+"""Closed-loop load test for the read-heavy routes.
+
+Compare the sync and async stacks by starting the API twice (ASYNC_DB=0 / ASYNC_DB=1) on different ports:
+
+    python scripts/loadtest.py --url http://localhost:8000 --url http://localhost:8001 --path /orders -c 64 -d 20
+"""
+import argparse
+import asyncio
+from collections import Counter
+import statistics
+import time
+
+import httpx
+
+async def run(url: str, path: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = Counter()
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        async def worker():
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.get(path)
+                    if r.status_code >= 400:
+                        errors[str(r.status_code)] += 1
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] += 1
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "url": url + path,
+        "requests": n,
+        "errors": dict(errors),
+        "rps": n / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if n else 0.0,
+        "p95_ms": latencies[int(n * 0.95) - 1] * 1000 if n else 0.0,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", action="append", required=True, help="base URL; repeat to compare stacks")
+    ap.add_argument("--path", default="/orders")
+    ap.add_argument("-c", "--concurrency", type=int, default=32)
+    ap.add_argument("-d", "--duration", type=float, default=15.0, help="seconds per URL")
+    args = ap.parse_args()
+
+    for url in args.url:
+        res = asyncio.run(run(url.rstrip("/"), args.path, args.concurrency, args.duration))
+        print(f"{res['url']:50} req={res['requests']:6d} err={sum(res['errors'].values()):4d} "
+              f"rps={res['rps']:8.1f} p50={res['p50_ms']:7.1f}ms p95={res['p95_ms']:7.1f}ms"
+              + (f" {res['errors']}" if res["errors"] else ""))
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,45 @@
 import os
 import sys
+import argparse
 from sqlalchemy import create_engine, inspect, text
 from alembic.config import Config
 from alembic import command
 from alembic.script import ScriptDirectory
 
+def repair_legacy_columns(engine):
+    # Formerly done by every worker at startup; now runs once per deploy before upgrading.
+    insp = inspect(engine)
+    if "orders" not in insp.get_table_names():
+        return
+    cols = {c["name"] for c in insp.get_columns("orders")}
+    if "code" not in cols:
+        print("Repair: adding orders.code")
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE orders ADD COLUMN code VARCHAR(50)'))
+            # non-unique index is fine; unique can be added later when data is clean
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_orders_code ON orders(code)'))
+
+def check(cfg, url):
+    # Readiness mode: report whether alembic_version matches the repo head; no writes.
+    script = ScriptDirectory.from_config(cfg)
+    heads = sorted(script.get_heads())
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            current = sorted(r[0] for r in conn.execute(text("select version_num from alembic_version")))
+    except Exception:
+        current = []
+    print(f"Repo head: {heads}; DB version: {current}")
+    if current != heads:
+        print("NOT READY: run `python scripts/migrate.py` (see scripts/inspect_schema.py for a column diff).")
+        sys.exit(1)
+    print("READY")
+
 def main():
+    ap = argparse.ArgumentParser(description="One-shot schema migration (run once per deploy, not per worker).")
+    ap.add_argument("--check", action="store_true", help="only report schema readiness; exit 1 if behind head")
+    args = ap.parse_args()
+
     url = os.getenv("DATABASE_URL")
     if not url:
         print("ERROR: DATABASE_URL not set.", file=sys.stderr)
@@ -14,6 +48,10 @@ def main():
     cfg = Config("alembic.ini")
     cfg.set_main_option("sqlalchemy.url", url)
 
+    if args.check:
+        check(cfg, url)
+        return
+
     script = ScriptDirectory.from_config(cfg)
     head = script.get_current_head()
     print(f"Repo head: {head}")
@@ -31,6 +69,7 @@ def main():
 
     if has_version_tbl:
         # already tracked by alembic; just upgrade
+        repair_legacy_columns(engine)
         command.upgrade(cfg, "head")
         return
 
@@ -0,0 +1,25 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.parse_jobs import start_workers
+
+def main():
+    ap = argparse.ArgumentParser(description="Drain the parse_jobs queue (run with PARSE_WORKERS=0 on the web service).")
+    ap.add_argument("--workers", type=int, default=4, help="concurrent LLM calls in this process")
+    ap.add_argument("--poll", type=float, default=1.0, help="seconds between polls when the queue is empty")
+    args = ap.parse_args()
+
+    stop = start_workers(args.workers, poll_seconds=args.poll)
+    print(f"parse worker: {args.workers} threads")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop.set()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal
+from app.ledger import rebuild_ledger
+
+def main():
+    ap = argparse.ArgumentParser(description="Verify (and optionally rebuild) the order_balances ledger.")
+    ap.add_argument("--verify", action="store_true", help="only report mismatches, do not write")
+    ap.add_argument("--batch-size", type=int, default=500)
+    args = ap.parse_args()
+
+    db = SessionLocal()
+    try:
+        mismatches = rebuild_ledger(db, fix=not args.verify, batch_size=args.batch_size)
+    finally:
+        db.close()
+
+    for m in mismatches:
+        print(m)
+    if not mismatches:
+        print("OK: ledger matches a full recomputation.")
+        sys.exit(0)
+    if args.verify:
+        print(f"Found {len(mismatches)} ledger mismatches.")
+        sys.exit(1)
+    print(f"Rebuilt {len(mismatches)} ledger rows.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal
+from app import rollups
+
+def main():
+    ap = argparse.ArgumentParser(description="Backfill (or verify) the daily_sales / daily_collections / daily_book rollups.")
+    ap.add_argument("--verify", action="store_true", help="only report differences, do not write")
+    args = ap.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.verify:
+            diffs = rollups.verify(db)
+        else:
+            written = rollups.rebuild(db)
+    finally:
+        db.close()
+
+    if not args.verify:
+        print("Rebuilt rollups: " + ", ".join(f"{name} {n} rows" for name, n in written.items()))
+        return
+    for d in diffs:
+        print(d)
+    if diffs:
+        print(f"Found {len(diffs)} rollup differences.")
+        sys.exit(1)
+    print("OK: rollups match a full recomputation.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Compact and archive old messages.
+
+    python scripts/retention.py                      # use MESSAGE_COMPACT_AFTER_DAYS / MESSAGE_ARCHIVE_AFTER_DAYS
+    python scripts/retention.py --compact-after 7 --archive-after 90 --vacuum
+
+Run it from cron; each step only touches rows it has not processed yet, so reruns are cheap.
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import get_settings
+from app.db import SessionLocal, engine
+from app import retention
+
+def main():
+    settings = get_settings()
+    ap = argparse.ArgumentParser(description="Compress and archive old messages.")
+    ap.add_argument("--compact-after", type=int, default=settings.message_compact_after_days, help="days")
+    ap.add_argument("--archive-after", type=int, default=settings.message_archive_after_days, help="days")
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to reclaim space")
+    args = ap.parse_args()
+
+    db = SessionLocal()
+    try:
+        files = retention.archive(db, args.archive_after, batch_size=args.batch_size)
+        compacted = retention.compact(db, args.compact_after, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Archived into {len(files)} file(s) under {settings.archive_dir}; compacted {compacted} message(s).")
+    for f in files:
+        print(f"  {f}")
+    if args.vacuum:
+        retention.vacuum(engine)
+
+if __name__ == "__main__":
+    main()
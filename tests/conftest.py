@@ -0,0 +1,40 @@
+"""Shared test setup. Settings, engines and the LLM backend are read once at import, so the environment is fixed
+here before anything under app/ is imported: a throwaway primary and replica SQLite pair, replayed LLM answers and
+no background workers."""
+import os
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix="orderops_tests_")
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(TMP, 'primary.db')}",
+    "READ_DATABASE_URL": f"sqlite:///{os.path.join(TMP, 'replica.db')}",
+    "OPENAI_API_KEY": "test",
+    "LLM_BACKEND": "replay",
+    "LLM_FIXTURE_DIR": os.path.join(ROOT, "fixtures", "llm_synthetic"),
+    "LLM_REPLAY_LATENCY_MS": "0",
+    "PARSE_WORKERS": "0",
+    "PARSE_BATCH_WINDOW_MS": "25",
+    "CACHE_DIR": os.path.join(TMP, "cache"),
+    "ARCHIVE_DIR": os.path.join(TMP, "archive"),
+    "EXPORT_DIR": os.path.join(TMP, "exports"),
+    "PROFILE_DIR": os.path.join(TMP, "profiles"),
+})
+
+@pytest.fixture(scope="session")
+def api():
+    import app.models  # noqa: F401  (registers the tables)
+    from app.db import Base, engine, read_engine
+    from app.main import app as fastapi_app
+    Base.metadata.create_all(engine)
+    Base.metadata.create_all(read_engine)
+    return fastapi_app
+
+@pytest.fixture
+def client(api):
+    from fastapi.testclient import TestClient
+    with TestClient(api) as c:
+        yield c
@@ -0,0 +1,60 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils import months_elapsed_no_prorate, months_elapsed_no_prorate_many, due_date_for
+
+
+def _random_dt(rng: random.Random) -> datetime:
+    return datetime(2019, 1, 1) + timedelta(days=rng.randrange(0, 365 * 8), hours=rng.randrange(0, 24))
+
+
+def test_vectorized_matches_scalar_on_random_dates():
+    rng = random.Random(20240229)
+    for _ in range(200):
+        now = _random_dt(rng)
+        starts = [_random_dt(rng) for _ in range(50)]
+        expected = [months_elapsed_no_prorate(s, now) for s in starts]
+        assert months_elapsed_no_prorate_many(starts, now).tolist() == expected
+
+
+def test_vectorized_matches_scalar_around_month_ends():
+    # Every start/now pair on the last three days of each month over a leap and a common year
+    ends = [datetime(y, m, 1) - timedelta(days=d) for y in (2023, 2024, 2025) for m in range(1, 13) for d in (1, 2, 3)]
+    for now in ends:
+        expected = [months_elapsed_no_prorate(s, now) for s in ends]
+        assert months_elapsed_no_prorate_many(ends, now).tolist() == expected
+
+
+@pytest.mark.parametrize("start, now, months", [
+    (datetime(2023, 1, 31), datetime(2023, 2, 28), 0),
+    (datetime(2024, 1, 31), datetime(2024, 2, 29), 0),
+    (datetime(2024, 1, 31), datetime(2024, 3, 1), 1),
+    (datetime(2024, 3, 31), datetime(2024, 4, 30), 0),
+    (datetime(2024, 3, 31), datetime(2024, 5, 1), 1),
+    (datetime(2024, 2, 29), datetime(2025, 2, 28), 11),
+    (datetime(2024, 2, 29), datetime(2025, 3, 1), 12),
+    (datetime(2024, 1, 15), datetime(2024, 1, 14), 0),
+    (datetime(2024, 1, 15), datetime(2024, 2, 15), 1),
+])
+def test_fixed_cases(start, now, months):
+    assert months_elapsed_no_prorate(start, now) == months
+    assert months_elapsed_no_prorate_many([start], now).tolist() == [months]
+
+
+@pytest.mark.parametrize("start, k", [(datetime(2024, 1, 31), 1), (datetime(2024, 2, 29), 12), (datetime(2024, 3, 31), 1)])
+def test_due_date_is_first_day_reaching_k(start, k):
+    due = datetime.combine(due_date_for(start, k), datetime.min.time())
+    assert months_elapsed_no_prorate(start, due) == k
+    assert months_elapsed_no_prorate(start, due - timedelta(days=1)) == k - 1
+
+
+def test_missing_starts_count_zero():
+    assert months_elapsed_no_prorate_many([None, datetime(2024, 1, 1)], datetime(2024, 3, 1)).tolist() == [0, 2]
+    assert months_elapsed_no_prorate_many([], datetime(2024, 3, 1)).tolist() == []
+
+
+def test_unparseable_start_raises():
+    with pytest.raises(ValueError):
+        months_elapsed_no_prorate_many(["not a date"], datetime(2024, 3, 1))
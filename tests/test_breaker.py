@@ -0,0 +1,178 @@
+"""The OpenAI circuit breaker against scripts/fake_openai.py: latency budget, tripping, half-open probes, the 503 on
+/parse, and that nothing degraded is cached. The fake runs as a subprocess on a free port."""
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+
+import pytest
+
+from conftest import ROOT
+
+BUDGET = 2.0
+RESET = 0.6
+
+@pytest.fixture(scope="module")
+def fake_openai():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "scripts", "fake_openai.py"), "--port", str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            urllib.request.urlopen(f"{base}/_stats", timeout=1).read()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                proc.kill()
+                raise
+            time.sleep(0.1)
+    yield base
+    proc.kill()
+    proc.wait()
+
+def control(base, **kw):
+    req = urllib.request.Request(f"{base}/_control", data=json.dumps(kw).encode(), method="POST")
+    urllib.request.urlopen(req, timeout=5).read()
+
+def requests_seen(base) -> int:
+    return json.loads(urllib.request.urlopen(f"{base}/_stats", timeout=5).read())["requests"]
+
+@pytest.fixture
+def live(api, fake_openai, monkeypatch):
+    """The app's parsing wired to the fake with a short budget and a 2-failure breaker; restored afterwards."""
+    from app import parsing
+    monkeypatch.setattr(parsing.settings, "openai_base_url", f"{fake_openai}/v1")
+    monkeypatch.setattr(parsing.settings, "openai_timeout_seconds", BUDGET)
+    monkeypatch.setattr(parsing.settings, "parse_batch_window_ms", 0)
+    monkeypatch.setattr(parsing, "backend", parsing.OpenAIBackend())
+    monkeypatch.setattr(parsing.breaker, "threshold", 2)
+    monkeypatch.setattr(parsing.breaker, "reset_seconds", RESET)
+    parsing.breaker.record_success()
+    control(fake_openai, latency=0, error_rate=0)
+    yield fake_openai
+    parsing.breaker.record_success()
+    control(fake_openai, latency=0, error_rate=0)
+
+def post(client, text):
+    t0 = time.monotonic()
+    r = client.post("/parse", content=text.encode("utf-8"), headers={"Content-Type": "text/plain"})
+    return r, time.monotonic() - t0
+
+def stored(text) -> bool:
+    from app.db import SessionLocal
+    from app.models import Message
+    db = SessionLocal()
+    try:
+        sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return db.query(Message).filter(Message.sha256 == sha).first() is not None
+    finally:
+        db.close()
+
+def fresh() -> str:
+    return f"KP{uuid.uuid4().hex[:6]} Katil 3 Function Manual (Sewa) RM 250/bulanan"
+
+def test_healthy_upstream_parses_and_caches(client, live):
+    text = fresh()
+    r, _ = post(client, text)
+    assert r.status_code == 200
+    assert r.json()["items"] and stored(text)
+
+def test_outage_trips_breaker_then_probe_recovers(client, live):
+    from app import parsing
+    control(live, latency=6)
+    texts = [fresh() for _ in range(3)]
+
+    # The latency budget caps each call well under the upstream's 5 s
+    for text in texts[:2]:
+        r, elapsed = post(client, text)
+        assert elapsed < BUDGET + 1.5
+        assert parsing.is_degraded(r.json())
+    assert parsing.breaker.state == "open"
+
+    # Open: /parse answers 503 with Retry-After at once, without reaching the upstream
+    seen = requests_seen(live)
+    r, elapsed = post(client, texts[2])
+    assert r.status_code == 503
+    assert 1 <= int(r.headers["Retry-After"]) <= RESET + 1
+    assert elapsed < 0.3
+    assert requests_seen(live) == seen
+    assert not any(stored(t) for t in texts), "degraded results must never be cached"
+
+    # Half-open after the reset period: one probe goes out, its success closes the breaker
+    control(live, latency=0)
+    time.sleep(RESET + 0.1)
+    assert parsing.breaker.state == "half_open"
+    r, _ = post(client, texts[2])
+    assert r.status_code == 200 and not parsing.is_degraded(r.json())
+    assert parsing.breaker.state == "closed"
+    assert stored(texts[2])
+
+def test_failed_probe_reopens(client, live):
+    from app import parsing
+    control(live, error_rate=1)
+    for _ in range(2):
+        post(client, fresh())
+    assert parsing.breaker.state == "open"
+    time.sleep(RESET + 0.1)
+    trips = parsing.breaker.trips
+    r, _ = post(client, fresh())
+    assert parsing.is_degraded(r.json())
+    assert parsing.breaker.state == "open" and parsing.breaker.trips == trips + 1
+
+def test_single_probe_while_half_open(live):
+    from app import parsing
+    from app.breaker import CircuitOpenError
+    b = parsing.breaker
+    for _ in range(2):
+        b.record_failure(TimeoutError("down"))
+    assert not b.admits()
+    time.sleep(RESET + 0.1)
+    assert b.admits()
+    b.before_call()  # the probe
+    assert not b.is_open() and not b.admits()
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+    b.record_success()
+    assert b.admits()
+
+def test_workers_do_not_claim_while_probe_in_flight(api, live):
+    from app import parse_jobs, parsing
+    from app.db import SessionLocal
+    from app.models import ParseJob
+    b = parsing.breaker
+    for _ in range(2):
+        b.record_failure(TimeoutError("down"))
+    time.sleep(RESET + 0.1)
+    b.before_call()  # another request's probe is in flight
+    db = SessionLocal()
+    try:
+        job = parse_jobs.enqueue(db, fresh())
+        stop = threading.Event()
+        worker = threading.Thread(target=parse_jobs._worker_loop, args=(stop, 0.05), daemon=True)
+        worker.start()
+        time.sleep(0.5)
+        db.refresh(job)
+        assert (job.status, job.attempts) == ("queued", 0)
+        # The probe succeeds: the worker picks the job up
+        b.record_success()
+        parse_jobs._wakeup.set()
+        deadline = time.monotonic() + 10
+        while job.status != "done" and time.monotonic() < deadline:
+            time.sleep(0.1)
+            db.expire_all()
+            job = db.get(ParseJob, job.id)
+        stop.set()
+        worker.join(5)
+        assert (job.status, job.attempts) == ("done", 1)
+    finally:
+        db.close()
@@ -0,0 +1,71 @@
+"""The parse corpus through POST /parse on replayed LLM answers (fixtures/llm_synthetic, offline).
+
+The replayed answers were written from the corpus expectations, so only what happens after the LLM is checked
+here: map_product SKU mapping, the message cache and micro-batching call counts."""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import ROOT
+
+# map_product misses on the current corpus: raise this when the catalogue or matcher improves, never lower it
+MIN_SKU_HITS = 25
+
+@pytest.fixture(scope="module")
+def corpus():
+    with open(os.path.join(ROOT, "fixtures", "parse_corpus.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+@pytest.fixture
+def no_messages(api):
+    from app.db import SessionLocal
+    from app.models import Message
+    db = SessionLocal()
+    try:
+        db.query(Message).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def post(client, text):
+    r = client.post("/parse", content=text.encode("utf-8"), headers={"Content-Type": "text/plain"})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def test_corpus_batched_cached_and_mapped(client, corpus, no_messages, monkeypatch):
+    from app import parsing
+    assert parsing.backend.name == "replay"
+    # A wide window so every concurrent request of the cold pass lands in a full batch even on a slow machine
+    monkeypatch.setattr(parsing.batcher, "window", 0.5)
+    texts = [c["text"] for c in corpus]
+
+    calls0 = parsing.backend.calls
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        cold = list(pool.map(lambda t: post(client, t), texts))
+    cold_calls = parsing.backend.calls - calls0
+    max_size = parsing.batcher.max_size
+    assert -(-len(texts) // max_size) <= cold_calls <= len(texts) // 2
+
+    calls0 = parsing.backend.calls
+    warm = [post(client, t) for t in texts]
+    assert parsing.backend.calls == calls0, "a repeated message must be answered from the messages table"
+    assert warm == cold
+
+    hits = total = 0
+    for case, out in zip(corpus, cold):
+        items = out.get("items") or []
+        assert len(items) == len(case["expected"]["items"]), case["id"]
+        for exp, got in zip(case["expected"]["items"], items):
+            total += 1
+            hits += got.get("sku") == exp["sku"]
+    assert hits >= MIN_SKU_HITS, f"map_product matched {hits}/{total} corpus items"
+
+def test_unbatched_is_one_call_per_message(client, corpus, no_messages, monkeypatch):
+    from app import parsing
+    monkeypatch.setattr(parsing.settings, "parse_batch_window_ms", 0)
+    calls0 = parsing.backend.calls
+    for case in corpus[:3]:
+        assert not parsing.is_degraded(post(client, case["text"]))
+    assert parsing.backend.calls - calls0 == 3
@@ -0,0 +1,42 @@
+"""Read-your-writes routing between the primary and the replica (two separate SQLite files from conftest, with no
+replication between them, so which one served a read is visible in the result)."""
+import uuid
+
+from app.db import RYW_COOKIE
+
+def create(client) -> str:
+    code = f"RR{uuid.uuid4().hex[:8].upper()}"
+    r = client.post("/orders", json={"parsed": {"order_code": code, "customer_name": "A", "paid": 0,
+                                                "items": [{"item_type": "OUTRIGHT", "name": "Bed", "unit_price": 250, "line_total": 250}]}})
+    assert r.status_code == 200, r.text
+    return code
+
+def codes(client, **headers):
+    r = client.get("/orders", headers=headers)
+    assert r.status_code == 200
+    return {o["code"] for o in r.json()}
+
+def test_write_pins_reads_to_primary(client):
+    client.cookies.clear()
+    code = create(client)
+    assert RYW_COOKIE in client.cookies
+    assert code in codes(client)
+
+def test_reads_without_cookie_go_to_replica(client):
+    client.cookies.clear()
+    code = create(client)
+    client.cookies.clear()
+    assert code not in codes(client)
+    assert code in codes(client, **{"X-Read-Primary": "1"})
+
+def test_expired_cookie_reads_replica(client):
+    client.cookies.clear()
+    code = create(client)
+    client.cookies.set(RYW_COOKIE, "0")
+    assert code not in codes(client)
+
+def test_failed_write_sets_no_cookie(client):
+    client.cookies.clear()
+    r = client.post("/orders/999999/payments", json={"amount": 1})
+    assert r.status_code == 404
+    assert RYW_COOKIE not in client.cookies